@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import Line, Location, Animal, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment, FinancialTransaction, FeedingLog, FeedInventory, FeedRation, RationComponent
+from .models import Line, Location, Animal, AnimalHistory, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment, FinancialTransaction, FeedingLog, FeedInventory, FeedStockMovement, FeedRation, RationComponent
 
 admin.site.register(Line)
 admin.site.register(Location)
 admin.site.register(Animal)
+admin.site.register(AnimalHistory)
 admin.site.register(WeightLog)
 admin.site.register(ReproductionEvent)
 admin.site.register(HealthLog)
@@ -12,5 +13,6 @@ admin.site.register(Treatment)
 admin.site.register(FinancialTransaction)
 admin.site.register(FeedingLog)
 admin.site.register(FeedInventory)
+admin.site.register(FeedStockMovement)
 admin.site.register(FeedRation)
 admin.site.register(RationComponent)
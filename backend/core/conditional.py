@@ -0,0 +1,98 @@
+import hashlib
+import json
+from datetime import date, datetime, time
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import serializers, status
+from .versioning import get_versions
+
+
+def validators(request, versions, daily=False):
+    """
+    ETag and Last-Modified of a GET response built from the tables in
+    `versions` (as returned by get_versions()). Any write to one of those
+    tables changes both. `daily` responses also depend on today's date (ages,
+    alert windows), so they change at midnight as well.
+    """
+    payload = [
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        [(label, version) for label, (version, _) in sorted(versions.items())],
+    ]
+    stamps = [last_modified for _, last_modified in versions.values()]
+    if daily:
+        today = date.today()
+        payload.append(today.isoformat())
+        stamps.append(timezone.make_aware(datetime.combine(today, time.min)))
+    etag = quote_etag(hashlib.sha1(json.dumps(payload).encode()).hexdigest())
+    # Tables never written since versioning started have no timestamp to offer
+    last_modified = max(stamps) if stamps and None not in stamps else None
+    return etag, last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response when the request's If-None-Match/If-Modified-Since still hold, else None."""
+    return get_conditional_response(request, etag=etag, last_modified=last_modified and int(last_modified.timestamp()))
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code not in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        return response
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep the response but must revalidate it before each use
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def serializer_models(serializer):
+    """
+    Models whose rows `serializer` renders: its own, those of nested
+    serializers and those reached by dotted sources such as 'feed_item.product_name'.
+    """
+    models = {serializer.Meta.model}
+    for field in serializer.fields.values():
+        nested = getattr(field, 'child', field)
+        if isinstance(nested, serializers.ModelSerializer):
+            models |= serializer_models(nested)
+            continue
+        current = serializer.Meta.model
+        for part in field.source.split('.')[:-1]:
+            try:
+                current = current._meta.get_field(part).related_model
+            except FieldDoesNotExist:
+                break
+            if current is None:
+                break
+            models.add(current)
+    return models
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin answering list and retrieve requests with ETag and
+    Last-Modified headers derived from core.versioning, and with 304 Not
+    Modified, before any query runs, when the client's copy is current.
+    Tables read beyond those the serializer renders (see serializer_models()),
+    such as the stock movements behind a balance, go in `source_models`.
+    """
+    source_models = ()
+
+    def get_source_models(self):
+        return serializer_models(self.get_serializer()) | set(self.source_models)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = validators(request, get_versions(self.get_source_models()))
+        response = not_modified(request, etag, last_modified) or handler(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,179 @@
+import sys
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def parse_fieldset(value):
+    """'id,location.name,location.type' -> {'id': {}, 'location': {'name': {}, 'type': {}}}"""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class FieldsetSerializerMixin:
+    """
+    ModelSerializer mixin for sparse fieldsets and inline relations.
+
+    `fieldset` (a parse_fieldset() tree, empty for every field) keeps only the
+    listed fields. `expand` (same shape) replaces the listed relations with
+    their nested representation, as named in Meta.expandable, e.g.
+    {'location': 'LocationSerializer'}; a field with subfields in the
+    fieldset, such as 'location.name', is expanded too.
+    """
+
+    def __init__(self, *args, fieldset=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldset = fieldset or {}
+        self.expand = dict(expand or {})
+        for name, subfields in self.fieldset.items():
+            if subfields:
+                self.expand.setdefault(name, {})
+
+        expandable = getattr(self.Meta, 'expandable', {})
+        unknown = [name for name in self.expand if name not in expandable]
+        if unknown:
+            raise ValidationError({'error': f"Cannot expand {', '.join(unknown)}. Expandable: {', '.join(expandable) or 'none'}."})
+        unknown = [name for name in self.fieldset if name not in self.fields]
+        if unknown:
+            raise ValidationError({'error': f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(self.fields)}."})
+
+        module = sys.modules[type(self).__module__]
+        for name, nested_expand in self.expand.items():
+            serializer_class = getattr(module, expandable[name])
+            self.fields[name] = serializer_class(read_only=True, fieldset=self.fieldset.get(name), expand=nested_expand)
+        if self.fieldset:
+            for name in list(self.fields):
+                if name not in self.fieldset and name not in self.expand:
+                    self.fields.pop(name)
+
+
+def resolve_source(model, source):
+    """
+    Classifies a serializer field source on `model`: ('column', path, field)
+    for a model field reached through forward relations, ('many', path,
+    field) for a reverse or many-to-many relation, (None, None, None) for
+    anything else (properties, annotations...).
+    """
+    path = source.split('.')
+    current = model
+    for position, part in enumerate(path):
+        try:
+            field = current._meta.get_field(part)
+        except FieldDoesNotExist:
+            # Reverse relations are also reachable by their accessor, e.g. 'rationcomponent_set'
+            accessors = {rel.get_accessor_name(): rel for rel in current._meta.related_objects}
+            if part not in accessors:
+                return None, None, None
+            field = accessors[part]
+        last = position == len(path) - 1
+        if field.many_to_many or field.one_to_many:
+            return ('many', path, field) if last and position == 0 else (None, None, None)
+        if not last:
+            if not (field.many_to_one or field.one_to_one) or not field.concrete:
+                return None, None, None
+            current = field.related_model
+        elif not field.concrete:
+            return None, None, None
+    return 'column', path, field
+
+
+def queryset_plan(serializer, model, prefix=''):
+    """
+    What `serializer` reads from `model`: (only, select_related, prefetch_related).
+
+    `only` lists the columns used, or is None when some field reads more than
+    model fields (a method, an annotation...) and every column must be
+    loaded. Forward relations serialized inline are joined with
+    select_related; reverse and many-to-many ones are prefetched.
+    """
+    only, select, prefetch = [], [], []
+    for field in serializer.fields.values():
+        nested = getattr(field, 'child', field)
+        kind, path, model_field = (None, None, None) if field.source == '*' else resolve_source(model, field.source)
+        if kind is None or isinstance(field, serializers.SerializerMethodField):
+            only = None
+            continue
+        lookup = prefix + '__'.join(path)
+
+        if kind == 'many':
+            queryset = model_field.related_model._default_manager.all()
+            if isinstance(nested, FieldsetSerializerMixin):
+                nested_only, nested_select, nested_prefetch = queryset_plan(nested, model_field.related_model)
+                queryset = queryset.select_related(*nested_select).prefetch_related(*nested_prefetch)
+                if nested_only is not None and model_field.one_to_many:
+                    # The prefetch matches rows back to their parent through the foreign key
+                    queryset = queryset.only(*nested_only, model_field.field.name)
+            prefetch.append(Prefetch(lookup, queryset=queryset))
+            continue
+
+        if len(path) > 1:
+            select.append(prefix + '__'.join(path[:-1]))
+            if only is not None:
+                only.extend(prefix + '__'.join(path[:length]) for length in range(1, len(path)))
+        if not isinstance(nested, serializers.BaseSerializer):
+            if only is not None:
+                only.append(lookup)
+            continue
+
+        # A forward relation serialized inline
+        select.append(lookup)
+        if not isinstance(nested, FieldsetSerializerMixin):
+            only = None
+            continue
+        nested_only, nested_select, nested_prefetch = queryset_plan(nested, model_field.related_model, lookup + '__')
+        select.extend(nested_select)
+        prefetch.extend(nested_prefetch)
+        if only is not None and nested_only is not None:
+            only.extend([lookup, *nested_only])
+        else:
+            only = None
+    return only, select, prefetch
+
+
+class FieldsetMixin:
+    """
+    ViewSet mixin: `?fields=id,unique_tag,location.name` trims both the output
+    and the columns selected, and `?expand=location,line` inlines relations,
+    joining them in the same query. Only applies to list and retrieve.
+    """
+
+    def fieldset_params(self):
+        if getattr(self, 'action', None) not in ('list', 'retrieve'):
+            return None
+        params = self.request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        return parse_fieldset(params.get('fields')), parse_fieldset(params.get('expand'))
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset_params = self.fieldset_params()
+        if fieldset_params:
+            kwargs.setdefault('fieldset', fieldset_params[0])
+            kwargs.setdefault('expand', fieldset_params[1])
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset_params = self.fieldset_params()
+        if not fieldset_params:
+            return queryset
+        serializer = self.get_serializer_class()(fieldset=fieldset_params[0], expand=fieldset_params[1], context=self.get_serializer_context())
+        only, select, prefetch = queryset_plan(serializer, queryset.model)
+        # The plan replaces the view's own joins and prefetches, which may cover fields left out
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if only is not None:
+            # Keyset pagination reads the ordering fields of each page's edges
+            ordering = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', ())]
+            queryset = queryset.only(*only, *ordering)
+        return queryset
@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.db import transaction
+from .models import Animal, AnimalHistory
+from .signals import notify_bulk_write
+
+
+def sync_history(animal_ids, today=None):
+    """
+    Brings the AnimalHistory of the given animals in line with their current
+    status and location: where either changed, the open row is closed at
+    `today` and a new one opened. A second change on the same day replaces
+    that day's row. An animal's first row starts at its birth date.
+    Returns how many rows were opened.
+    """
+    today = today or date.today()
+    with transaction.atomic():
+        # Locks the animals, so concurrent writers cannot both open a row for one
+        current = Animal.objects.filter(id__in=animal_ids).select_for_update().values_list('id', 'status', 'location_id', 'birth_date')
+        open_rows = {row.animal_id: row for row in AnimalHistory.objects.filter(animal_id__in=animal_ids, valid_to__isnull=True)}
+
+        to_create, to_close, to_replace = [], [], []
+        for animal_id, status, location_id, birth_date in current:
+            row = open_rows.get(animal_id)
+            if row is None:
+                to_create.append(AnimalHistory(animal_id=animal_id, status=status, location_id=location_id, valid_from=min(birth_date, today)))
+            elif (row.status, row.location_id) == (status, location_id):
+                continue
+            elif row.valid_from >= today:
+                row.status, row.location_id = status, location_id
+                to_replace.append(row)
+            else:
+                row.valid_to = today
+                to_close.append(row)
+                to_create.append(AnimalHistory(animal_id=animal_id, status=status, location_id=location_id, valid_from=today))
+
+        if to_close:
+            AnimalHistory.objects.bulk_update(to_close, ['valid_to'])
+        if to_replace:
+            AnimalHistory.objects.bulk_update(to_replace, ['status', 'location'])
+        if to_create:
+            AnimalHistory.objects.bulk_create(to_create)
+        if to_close or to_replace or to_create:
+            notify_bulk_write(AnimalHistory)
+    return len(to_create)
@@ -0,0 +1,436 @@
+import csv
+import hashlib
+import io
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from .models import (
+    Animal, FeedingLog, FeedInventory, FeedStockMovement, ImportCheckpoint, Line, Location, ReproductionEvent, WeightLog,
+)
+from .pedigree import update_pedigrees
+from .signals import notify_bulk_write
+
+DEFAULT_BATCH_SIZE = 5000
+# Errors listed per file; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class Row:
+    """A CSV row with typed accessors that collect validation errors instead of raising."""
+
+    def __init__(self, values):
+        self.values = values
+        self.errors = []
+
+    def text(self, column, required=False, max_length=None):
+        value = (self.values.get(column) or '').strip()
+        if not value:
+            if required:
+                self.errors.append(f'{column} is required.')
+            return None
+        if max_length and len(value) > max_length:
+            self.errors.append(f'{column} must be at most {max_length} characters.')
+        return value
+
+    def date(self, column, required=False):
+        value = self.text(column, required)
+        if value is None:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            self.errors.append(f'Invalid {column} format. Use YYYY-MM-DD.')
+
+    def decimal(self, column, required=False, maximum=1000):
+        value = self.text(column, required)
+        if value is None:
+            return None
+        try:
+            number = Decimal(value)
+            if not number.is_finite() or number <= 0 or number >= maximum:
+                raise InvalidOperation
+            return number.quantize(Decimal('0.01'))
+        except InvalidOperation:
+            self.errors.append(f'{column} must be a positive number below {maximum}.')
+
+    def integer(self, column, required=False):
+        value = self.text(column, required)
+        if value is None:
+            return None
+        try:
+            number = int(value)
+            if number < 0:
+                raise ValueError
+            return number
+        except ValueError:
+            self.errors.append(f'{column} must be a non-negative integer.')
+
+    def choice(self, column, choices, default=None):
+        value = self.text(column, required=default is None)
+        if value is None:
+            return default
+        allowed = [key for key, _ in choices]
+        if value not in allowed:
+            self.errors.append(f"{column} must be one of: {', '.join(allowed)}.")
+        return value
+
+
+class References:
+    """
+    Natural keys (line and location names, animal tags, feed product names)
+    mapped to IDs, loaded once and extended as rows are imported. While
+    validating, keys defined by the files themselves map to None.
+    """
+
+    def __init__(self):
+        self.lines = dict(Line.objects.values_list('name', 'id'))
+        self.locations = dict(Location.objects.values_list('name', 'id'))
+        self.animals = dict(Animal.objects.values_list('unique_tag', 'id'))
+        self.feed_items = dict(FeedInventory.objects.values_list('product_name', 'id'))
+
+    def resolve(self, row, column, kind, required=False):
+        value = row.text(column, required)
+        if value is None:
+            return None
+        mapping = getattr(self, kind)
+        if value not in mapping:
+            row.errors.append(f'{column} {value!r} not found.')
+            return None
+        return mapping[value]
+
+
+def insert_rows(model, objs):
+    """
+    Inserts unsaved instances and sets their primary keys. On PostgreSQL the
+    keys are reserved from the table's sequence and the rows are streamed with
+    COPY; elsewhere bulk_create() is used.
+    """
+    if not objs or connection.vendor != 'postgresql':
+        return model.objects.bulk_create(objs)
+
+    opts = model._meta
+    quote_name = connection.ops.quote_name
+    fields = opts.concrete_fields
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [opts.db_table, opts.pk.column, len(objs)],
+        )
+        for obj, (pk,) in zip(objs, cursor.fetchall()):
+            obj.pk = pk
+
+        buffer = io.StringIO()
+        for obj in objs:
+            values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+            # Unquoted empty fields are NULL in COPY's CSV format, quoted ones are values
+            buffer.write(','.join('' if value is None else '"%s"' % str(value).replace('"', '""') for value in values))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(quote_name(field.column) for field in fields)
+        cursor.copy_expert(f'COPY {quote_name(opts.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = connection.alias
+    return objs
+
+
+def parse_line(row, refs):
+    name = row.text('name', required=True, max_length=100)
+    return name, {'name': name, 'description': row.text('description')}
+
+
+def parse_location(row, refs):
+    name = row.text('name', required=True, max_length=100)
+    return name, {
+        'name': name,
+        'type': row.choice('type', Location.LOCATION_TYPES),
+        'capacity': row.integer('capacity', required=True),
+        'last_cleaned_date': row.date('last_cleaned_date'),
+    }
+
+
+def parse_animal(row, refs):
+    unique_tag = row.text('unique_tag', required=True, max_length=100)
+    return unique_tag, {
+        'unique_tag': unique_tag,
+        'birth_date': row.date('birth_date', required=True),
+        'sex': row.choice('sex', Animal.SEX_CHOICES),
+        'status': row.choice('status', Animal.STATUS_CHOICES, default='Active'),
+        'line_id': refs.resolve(row, 'line', 'lines'),
+        'location_id': refs.resolve(row, 'location', 'locations'),
+        # Founder until its parents are linked, as in Animal.save()
+        'inbreeding_coefficient': 0,
+    }
+
+
+def parse_weight(row, refs):
+    return None, {
+        'animal_id': refs.resolve(row, 'unique_tag', 'animals', required=True),
+        'log_date': row.date('log_date', required=True),
+        'weight_kg': row.decimal('weight_kg', required=True),
+    }
+
+
+def parse_feeding(row, refs):
+    feed_type = row.text('feed_type', required=True, max_length=100)
+    return None, {
+        'location_id': refs.resolve(row, 'location', 'locations', required=True),
+        'log_date': row.date('log_date', required=True),
+        'feed_type': feed_type,
+        # Unknown feed types are logged without touching the inventory, as in FeedingLog.save()
+        'feed_item_id': refs.feed_items.get(feed_type),
+        'quantity_kg': row.decimal('quantity_kg', required=True),
+    }
+
+
+def parse_reproduction(row, refs):
+    mating_date = row.date('mating_date', required=True)
+    expected_birth_date = row.date('expected_birth_date')
+    if mating_date and not expected_birth_date:
+        expected_birth_date = mating_date + timedelta(days=ReproductionEvent.GESTATION_DAYS)
+    return None, {
+        'female_id': refs.resolve(row, 'female', 'animals', required=True),
+        'male_id': refs.resolve(row, 'male', 'animals'),
+        'mating_date': mating_date,
+        'expected_birth_date': expected_birth_date,
+        'actual_birth_date': row.date('actual_birth_date'),
+        'live_births': row.integer('live_births'),
+        'dead_births': row.integer('dead_births'),
+    }
+
+
+def load_plain(model):
+    def load(objs, refs):
+        created = insert_rows(model, objs)
+        notify_bulk_write(model, created=created)
+        return created
+    return load
+
+
+def load_weights(objs, refs):
+    created = insert_rows(WeightLog, objs)
+    Animal.objects.filter(pk__in={log.animal_id for log in created}).refresh_current_weights()
+    notify_bulk_write(WeightLog, created=created)
+    return created
+
+
+def load_feedings(objs, refs):
+    created = insert_rows(FeedingLog, objs)
+    movements = insert_rows(FeedStockMovement, [FeedStockMovement.for_feeding(log) for log in created if log.feed_item_id])
+    notify_bulk_write(FeedingLog, created=created)
+    notify_bulk_write(FeedStockMovement, created=movements)
+    return created
+
+
+def link_parents(links, refs, batch_size):
+    """
+    Second pass over the animals file: sets sire/dam from the tags once every
+    animal exists. Parents already recorded are kept, so the pass can be
+    repeated. Returns the number of animals updated.
+    """
+    parents_by_id = {refs.animals[tag]: parents for tag, parents in links.items()}
+    changed = []
+    for animal in Animal.objects.filter(id__in=parents_by_id).only('id', 'sire_id', 'dam_id'):
+        updated = False
+        for field, tag in parents_by_id[animal.id].items():
+            if tag and getattr(animal, f'{field}_id') is None:
+                setattr(animal, f'{field}_id', refs.animals[tag])
+                updated = True
+        if updated:
+            changed.append(animal)
+
+    with transaction.atomic():
+        Animal.objects.bulk_update(changed, ['sire', 'dam'], batch_size=batch_size)
+        update_pedigrees([animal.id for animal in changed])
+        notify_bulk_write(Animal)
+    return len(changed)
+
+
+class Importer:
+    """
+    How one CSV file is parsed and loaded.
+
+    `parse(row, refs)` returns (natural key or None, model field values);
+    rows whose key already exists are skipped. `deferred` columns hold
+    references resolved by `link(links, refs, batch_size)` once the whole
+    file is loaded.
+    """
+
+    def __init__(self, model, refs_attr, columns, parse, load, deferred=(), link=None):
+        self.model = model
+        self.refs_attr = refs_attr
+        self.columns = columns
+        self.parse = parse
+        self.load = load
+        self.deferred = deferred
+        self.link = link
+
+
+# In import order, so every reference points to rows imported before it
+IMPORTERS = {
+    'lines': Importer(Line, 'lines', ('name',), parse_line, load_plain(Line)),
+    'locations': Importer(Location, 'locations', ('name', 'type', 'capacity'), parse_location, load_plain(Location)),
+    'animals': Importer(
+        Animal, 'animals', ('unique_tag', 'birth_date', 'sex'), parse_animal, load_plain(Animal),
+        deferred=('sire', 'dam'), link=link_parents,
+    ),
+    'weights': Importer(WeightLog, None, ('unique_tag', 'log_date', 'weight_kg'), parse_weight, load_weights),
+    'feedings': Importer(FeedingLog, None, ('location', 'log_date', 'feed_type', 'quantity_kg'), parse_feeding, load_feedings),
+    'reproduction': Importer(ReproductionEvent, None, ('female', 'mating_date'), parse_reproduction, load_plain(ReproductionEvent)),
+}
+
+
+def file_checksum(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def read_csv(file):
+    """Yields (line number, row dict) from a binary CSV file, with normalized headers."""
+    file.seek(0)
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.DictReader(text)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        yield 1, reader.fieldnames
+        for values in reader:
+            yield reader.line_num, values
+    finally:
+        # Leave the underlying file open for the next pass
+        text.detach()
+
+
+def validate_file(importer, file, refs):
+    """Checks every row of a file; returns ({line number: [messages]}, error count)."""
+    errors, error_count = {}, 0
+
+    def add(line_num, messages):
+        nonlocal error_count
+        if line_num in errors:
+            errors[line_num].extend(messages)
+            return
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors[line_num] = messages
+
+    rows = read_csv(file)
+    _, header = next(rows)
+    missing = [column for column in importer.columns if column not in header]
+    if missing:
+        rows.close()
+        add(1, [f"Missing columns: {', '.join(missing)}."])
+        return errors, error_count
+
+    keys = getattr(refs, importer.refs_attr) if importer.refs_attr else None
+    links = []
+    for line_num, values in rows:
+        row = Row(values)
+        key, _ = importer.parse(row, refs)
+        if key is not None and not row.errors:
+            if key in keys and keys[key] is None:
+                row.errors.append(f'Duplicate {key!r} in the file.')
+            elif key not in keys:
+                keys[key] = None
+        links.extend((line_num, row, column) for column in importer.deferred if row.text(column))
+        if row.errors:
+            add(line_num, row.errors)
+
+    # Deferred references may point to any row of the file
+    for line_num, row, column in links:
+        row.errors = []
+        refs.resolve(row, column, importer.refs_attr)
+        if row.errors:
+            add(line_num, row.errors)
+    return errors, error_count
+
+
+def load_file(kind, importer, file, refs, batch_size):
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(kind=kind, checksum=file_checksum(file))
+    result = {'rows': 0, 'created': 0, 'skipped': 0, 'resumed_from': checkpoint.rows_imported}
+    if checkpoint.completed:
+        result.update(rows=checkpoint.rows_imported, status='already imported')
+        return result
+
+    keys = getattr(refs, importer.refs_attr) if importer.refs_attr else None
+    links = {}
+    batch = []
+
+    def flush(position):
+        with transaction.atomic():
+            created = importer.load([obj for _, obj in batch], refs) if batch else []
+            checkpoint.rows_imported = position
+            checkpoint.save(update_fields=['rows_imported', 'updated_at'])
+        for key, obj in batch:
+            if key is not None:
+                keys[key] = obj.pk
+        result['created'] += len(created)
+        batch.clear()
+
+    rows = read_csv(file)
+    next(rows)
+    position = 0
+    for position, (line_num, values) in enumerate(rows, 1):
+        row = Row(values)
+        if importer.deferred:
+            # Collected for every row: the link pass covers batches committed by an earlier run
+            parents = {column: row.text(column) for column in importer.deferred}
+            if any(parents.values()):
+                links[row.text('unique_tag')] = parents
+        if position <= checkpoint.rows_imported:
+            continue
+
+        key, fields = importer.parse(row, refs)
+        if row.errors:
+            raise ValueError(f'{kind}, line {line_num}: {" ".join(row.errors)}')
+        if key is not None and key in keys:
+            result['skipped'] += 1
+            continue
+        batch.append((key, importer.model(**fields)))
+        if len(batch) >= batch_size:
+            flush(position)
+    flush(position)
+    result['rows'] = position
+
+    if importer.link and links:
+        result['linked'] = importer.link(links, refs, batch_size)
+    checkpoint.completed = True
+    checkpoint.save(update_fields=['completed', 'updated_at'])
+    result['status'] = 'imported'
+    return result
+
+
+def import_herd(files, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Imports herd CSV files, given as {kind: binary file} with kinds from
+    IMPORTERS. Every file is validated first and nothing is written if any
+    row is invalid. Rows are then loaded in batches, each committed with the
+    file's checkpoint, so re-running an interrupted import resumes it.
+
+    Returns (results, errors): results per kind, and {kind: {'count': n,
+    'rows': {line number: [messages]}}} for the files with invalid rows.
+    """
+    unknown = set(files) - set(IMPORTERS)
+    if unknown:
+        raise ValueError(f"Unknown import files: {', '.join(sorted(unknown))}. Expected: {', '.join(IMPORTERS)}.")
+    kinds = [kind for kind in IMPORTERS if kind in files]
+
+    refs = References()
+    results, errors = {}, {}
+    for kind in kinds:
+        rows, count = validate_file(IMPORTERS[kind], files[kind], refs)
+        if count:
+            errors[kind] = {'count': count, 'rows': rows}
+        results[kind] = {'status': 'invalid' if count else 'valid'}
+    if errors or dry_run:
+        return results, errors
+
+    refs = References()
+    for kind in kinds:
+        results[kind] = load_file(kind, IMPORTERS[kind], files[kind], refs, batch_size)
+    return results, {}
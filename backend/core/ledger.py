@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F
+from .models import FeedingLog, FeedInventory, FeedStockMovement, Location
+from .signals import notify_bulk_write
+
+
+def compact_feed_ledger(batch_size=5000):
+    """
+    Folds pending movements into FeedInventory.quantity_kg.
+
+    Each batch is locked as it is read, and rows locked by an overlapping run
+    are skipped, so no movement is folded twice. Rows committed concurrently
+    are simply left for the next run.
+    """
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            pending = list(
+                FeedStockMovement.objects.select_for_update(skip_locked=True).filter(compacted=False).order_by('id')
+                .values_list('id', 'feed_item_id', 'quantity_kg')[:batch_size]
+            )
+            if not pending:
+                return compacted
+
+            totals = defaultdict(Decimal)
+            for _, feed_item_id, quantity_kg in pending:
+                totals[feed_item_id] += quantity_kg
+            for feed_item_id, total in totals.items():
+                FeedInventory.objects.filter(pk=feed_item_id).update(quantity_kg=F('quantity_kg') + total)
+            FeedStockMovement.objects.filter(id__in=[movement_id for movement_id, _, _ in pending], compacted=False).update(compacted=True)
+            notify_bulk_write(FeedInventory, FeedStockMovement)
+            compacted += len(pending)
+
+
+def record_feedings(entries, default_log_date=None):
+    """
+    Validates and posts a batch of feedings in one transaction.
+
+    Locations and feed items are resolved with one query each; feeding logs and
+    their ledger movements are inserted with bulk_create. Returns
+    (created_logs, errors) where errors maps entry index to messages; nothing is
+    written when any entry is invalid.
+    """
+    errors = {}
+    parsed = []
+    location_ids, item_ids, item_names = set(), set(), set()
+
+    for index, entry in enumerate(entries):
+        entry_errors = []
+        if not isinstance(entry, dict):
+            errors[index] = ['Each entry must be an object.']
+            continue
+
+        try:
+            quantity = Decimal(str(entry.get('quantity_kg'))).quantize(Decimal('0.01'))
+            if not quantity.is_finite() or quantity <= 0 or quantity >= 1000:
+                raise InvalidOperation
+        except InvalidOperation:
+            entry_errors.append('quantity_kg must be a positive number below 1000.')
+            quantity = None
+
+        log_date = default_log_date
+        if entry.get('log_date'):
+            try:
+                log_date = datetime.strptime(entry['log_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                entry_errors.append('Invalid log_date format. Use YYYY-MM-DD.')
+        elif log_date is None:
+            entry_errors.append('log_date is required.')
+
+        try:
+            location_id = int(entry.get('location'))
+            location_ids.add(location_id)
+        except (TypeError, ValueError):
+            entry_errors.append('location must be an integer ID.')
+            location_id = None
+
+        feed_item_id = entry.get('feed_item')
+        feed_type = entry.get('feed_type')
+        if feed_item_id:
+            try:
+                feed_item_id = int(feed_item_id)
+                item_ids.add(feed_item_id)
+            except (TypeError, ValueError):
+                entry_errors.append('feed_item must be an integer ID.')
+        elif feed_type:
+            item_names.add(feed_type)
+        else:
+            entry_errors.append('feed_type or feed_item is required.')
+
+        if entry_errors:
+            errors[index] = entry_errors
+        else:
+            parsed.append((index, location_id, feed_item_id, feed_type, quantity, log_date))
+
+    locations = set(Location.objects.filter(id__in=location_ids).values_list('id', flat=True))
+    items_by_id, items_by_name = {}, {}
+    for item_id, product_name in FeedInventory.objects.filter(id__in=item_ids).values_list('id', 'product_name'):
+        items_by_id[item_id] = product_name
+    for item_id, product_name in FeedInventory.objects.filter(product_name__in=item_names).values_list('id', 'product_name'):
+        items_by_name[product_name] = item_id
+
+    logs = []
+    for index, location_id, feed_item_id, feed_type, quantity, log_date in parsed:
+        if location_id not in locations:
+            errors.setdefault(index, []).append('Location not found.')
+            continue
+        if feed_item_id:
+            if feed_item_id not in items_by_id:
+                errors.setdefault(index, []).append('Feed item not found.')
+                continue
+            feed_type = items_by_id[feed_item_id]
+        else:
+            # Unknown feed types are logged without touching the inventory, as in FeedingLog.save()
+            feed_item_id = items_by_name.get(feed_type)
+        logs.append(FeedingLog(
+            location_id=location_id, feed_item_id=feed_item_id, feed_type=feed_type,
+            quantity_kg=quantity, log_date=log_date,
+        ))
+
+    if errors:
+        return [], dict(sorted(errors.items()))
+
+    with transaction.atomic():
+        created = FeedingLog.objects.bulk_create(logs)
+        movements = FeedStockMovement.objects.bulk_create([
+            FeedStockMovement.for_feeding(log) for log in created if log.feed_item_id
+        ])
+        notify_bulk_write(FeedingLog, created=created)
+        notify_bulk_write(FeedStockMovement, created=movements)
+    return created, {}
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.ledger import compact_feed_ledger
+
+
+class Command(BaseCommand):
+    help = "Folds pending feed stock movements into each FeedInventory balance (run periodically, e.g. nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Movements folded per transaction.')
+
+    def handle(self, *args, **options):
+        count = compact_feed_ledger(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Compacted {count} feed stock movements.'))
@@ -0,0 +1,45 @@
+import os
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from core.importer import DEFAULT_BATCH_SIZE, IMPORTERS, import_herd
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports lines, locations, animals, weights, feedings and reproduction events from CSV files. '
+        'Every file is validated before anything is written; re-running an interrupted import resumes it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', nargs='?', help='Directory holding any of ' + ', '.join(f'{kind}.csv' for kind in IMPORTERS) + '.')
+        for kind in IMPORTERS:
+            parser.add_argument(f'--{kind}', metavar='CSV', help=f'{kind.capitalize()} file (overrides the directory).')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the files.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per committed batch.')
+
+    def handle(self, *args, **options):
+        paths = {}
+        if options['directory']:
+            for kind in IMPORTERS:
+                path = os.path.join(options['directory'], f'{kind}.csv')
+                if os.path.exists(path):
+                    paths[kind] = path
+        paths.update((kind, options[kind]) for kind in IMPORTERS if options[kind])
+        if not paths:
+            raise CommandError('No CSV files given.')
+
+        with ExitStack() as stack:
+            files = {kind: stack.enter_context(open(path, 'rb')) for kind, path in paths.items()}
+            results, errors = import_herd(files, dry_run=options['dry_run'], batch_size=options['batch_size'])
+
+        for kind, file_errors in errors.items():
+            self.stderr.write(f"{paths[kind]}: {file_errors['count']} invalid rows")
+            for line_num, messages in file_errors['rows'].items():
+                self.stderr.write(f"  line {line_num}: {' '.join(messages)}")
+        if errors:
+            raise CommandError('Nothing was imported.')
+
+        for kind, result in results.items():
+            details = ', '.join(f'{key}: {value}' for key, value in result.items() if key != 'status')
+            self.stdout.write(self.style.SUCCESS(f"{kind}: {result['status']}" + (f' ({details})' if details else '')))
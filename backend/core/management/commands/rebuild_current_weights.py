@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from core.models import Animal
+
+
+class Command(BaseCommand):
+    help = "Rebuilds each animal's denormalized current weight and last weigh date from its WeightLog history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--animal', type=int, action='append', dest='animal_ids', help='Only rebuild this animal ID (repeatable).')
+
+    def handle(self, *args, **options):
+        animals = Animal.objects.all()
+        if options['animal_ids']:
+            animals = animals.filter(pk__in=options['animal_ids'])
+        updated = animals.refresh_current_weights()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt current weight for {updated} animals.'))
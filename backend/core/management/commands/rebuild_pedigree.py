@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.pedigree import rebuild_pedigree
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the pedigree ancestor index and every animal's inbreeding coefficient."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk insert/update.')
+
+    def handle(self, *args, **options):
+        count = rebuild_pedigree(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt pedigree index for {count} animals.'))
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Animal
+from core.seeding import DEFAULT_SEED, seed_herd
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills an empty database with a synthetic herd: pedigrees, litters, weight curves, feedings, '
+        'treatments and transactions. The same options always produce the same herd.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--animals', type=int, default=1000, help='Animals born over the whole period, founders included.')
+        parser.add_argument('--generations', type=int, default=4, help='Generations bred from the founders.')
+        parser.add_argument('--years', type=int, default=2, help='Years of history, up to today.')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed.')
+        parser.add_argument(
+            '--today', type=date.fromisoformat, default=None,
+            help='Last day of the history, YYYY-MM-DD (default: today). Pin it to reproduce a herd on another day.',
+        )
+
+    def handle(self, *args, **options):
+        if Animal.objects.exists():
+            raise CommandError('The database already holds animals; seed_herd only fills an empty one.')
+        if options['generations'] < 1 or options['years'] < 1:
+            raise CommandError('--generations and --years must be at least 1.')
+        try:
+            counts = seed_herd(options['animals'], options['generations'], options['years'], seed=options['seed'], today=options['today'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for name, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f"{name.replace('_', ' ').capitalize()}: {count}"))
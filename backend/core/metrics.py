@@ -0,0 +1,143 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Histogram upper bounds, in seconds and in queries per request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def query_shape(sql):
+    """
+    SQL with its literals replaced by placeholders and IN lists collapsed, so
+    the same statement run for different rows has the same shape.
+    """
+    return _IN_LIST.sub('(%s...)', _LITERAL.sub('%s', sql))
+
+
+def repeated_queries(queries, threshold):
+    """Shapes among (sql, seconds) pairs run more than `threshold` times, as {shape: count}."""
+    counts = Counter(query_shape(sql) for sql, _ in queries)
+    return {shape: count for shape, count in counts.items() if count > threshold}
+
+
+def slowest_queries(queries, limit=10):
+    """(shape, count, total seconds) of the most expensive shapes, slowest first."""
+    totals = defaultdict(lambda: [0, 0.0])
+    for sql, seconds in queries:
+        total = totals[query_shape(sql)]
+        total[0] += 1
+        total[1] += seconds
+    ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+    return [(shape, count, seconds) for shape, (count, seconds) in ranked[:limit]]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_seconds = 0.0
+        self.responses = Counter()
+        self.n_plus_one = 0
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Request metrics of this process, by (view name, method). Each worker
+    process keeps its own, like any in-process Prometheus client.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewMetrics)
+
+    def observe(self, view, method, status_code, seconds, query_count, sql_seconds, n_plus_one):
+        with self.lock:
+            metrics = self.views[(view, method)]
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(query_count)
+            metrics.sql_seconds += sql_seconds
+            metrics.responses[status_code] += 1
+            if n_plus_one:
+                metrics.n_plus_one += 1
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = []
+
+            def histogram(name, help_text, attribute):
+                lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} histogram'])
+                for (view, method), metrics in views:
+                    labels = [('view', view), ('method', method)]
+                    values = getattr(metrics, attribute)
+                    for bound, count in values.cumulative():
+                        lines.append(f'{name}_bucket{format_labels(labels + [("le", format_number(bound))])} {count}')
+                    lines.append(f'{name}_bucket{format_labels(labels + [("le", "+Inf")])} {values.count}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {format_number(values.sum)}')
+                    lines.append(f'{name}_count{format_labels(labels)} {values.count}')
+
+            def counter(name, help_text, values):
+                lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} counter'])
+                for labels, value in values:
+                    lines.append(f'{name}{format_labels(labels)} {format_number(value)}')
+
+            counter('cuypro_http_requests_total', 'Requests served, by view, method and status code.', [
+                ([('view', view), ('method', method), ('status', status_code)], count)
+                for (view, method), metrics in views
+                for status_code, count in sorted(metrics.responses.items())
+            ])
+            histogram('cuypro_http_request_duration_seconds', 'Time spent producing the response.', 'latency')
+            histogram('cuypro_db_queries_per_request', 'SQL queries run per request.', 'queries')
+            counter('cuypro_db_query_duration_seconds_total', 'Time spent in SQL queries.', [
+                ([('view', view), ('method', method)], metrics.sql_seconds) for (view, method), metrics in views
+            ])
+            counter('cuypro_n_plus_one_requests_total', 'Requests that repeated one query shape more than the N+1 threshold.', [
+                ([('view', view), ('method', method)], metrics.n_plus_one) for (view, method), metrics in views
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
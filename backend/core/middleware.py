@@ -0,0 +1,65 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from .metrics import REGISTRY, repeated_queries, slowest_queries
+
+logger = logging.getLogger('core.metrics')
+
+
+class QueryRecorder:
+    """connection.execute_wrapper() hook keeping each query's SQL and duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+
+class RequestMetricsMiddleware:
+    """
+    Records each request's latency, SQL query count and SQL time in
+    core.metrics.REGISTRY, by resolved view name, and counts requests that
+    repeat one query shape more than METRICS_N_PLUS_ONE_THRESHOLD times.
+
+    Requests slower than METRICS_SLOW_REQUEST_SECONDS, when set, are logged on
+    the 'core.metrics' logger with their most expensive queries. Streaming
+    responses are measured up to their first byte.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.n_plus_one_threshold = getattr(settings, 'METRICS_N_PLUS_ONE_THRESHOLD', 10)
+        self.slow_request_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        repeated = repeated_queries(recorder.queries, self.n_plus_one_threshold)
+        sql_seconds = sum(duration for _, duration in recorder.queries)
+        REGISTRY.observe(view, request.method, response.status_code, seconds, len(recorder.queries), sql_seconds, bool(repeated))
+
+        for shape, count in repeated.items():
+            logger.warning('Possible N+1 in %s %s: query run %d times: %s', request.method, view, count, shape)
+        if self.slow_request_seconds is not None and seconds > self.slow_request_seconds:
+            logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d queries in %.3fs\n%s',
+                request.method, request.get_full_path(), view, seconds, len(recorder.queries), sql_seconds,
+                '\n'.join(f'  {count}x {duration:.3f}s {shape}' for shape, count, duration in slowest_queries(recorder.queries)),
+            )
+        return response
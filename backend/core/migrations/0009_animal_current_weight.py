@@ -0,0 +1,35 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_current_weights(apps, schema_editor):
+    Animal = apps.get_model('core', 'Animal')
+    WeightLog = apps.get_model('core', 'WeightLog')
+    latest = WeightLog.objects.filter(animal=OuterRef('pk')).order_by('-log_date', '-id')
+    Animal.objects.update(
+        current_weight_kg=Subquery(latest.values('weight_kg')[:1]),
+        last_weighed_date=Subquery(latest.values('log_date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_feedration_rationcomponent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='current_weight_kg',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='last_weighed_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(populate_current_weights, migrations.RunPython.noop),
+    ]
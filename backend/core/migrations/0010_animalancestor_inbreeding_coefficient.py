@@ -0,0 +1,35 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_animal_current_weight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='inbreeding_coefficient',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=6, max_digits=7, null=True),
+        ),
+        migrations.CreateModel(
+            name='AnimalAncestor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='core.animal')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='core.animal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='animalancestor_ancestor_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='animalancestor',
+            constraint=models.UniqueConstraint(fields=('animal', 'ancestor'), name='unique_animal_ancestor'),
+        ),
+    ]
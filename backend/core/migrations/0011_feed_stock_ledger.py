@@ -0,0 +1,44 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def link_feeding_logs(apps, schema_editor):
+    FeedingLog = apps.get_model('core', 'FeedingLog')
+    FeedInventory = apps.get_model('core', 'FeedInventory')
+    item = FeedInventory.objects.filter(product_name=OuterRef('feed_type'))
+    FeedingLog.objects.update(feed_item=Subquery(item.values('pk')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_animalancestor_inbreeding_coefficient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedinglog',
+            name='feed_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.feedinventory'),
+        ),
+        migrations.CreateModel(
+            name='FeedStockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_date', models.DateField()),
+                ('kind', models.CharField(choices=[('Entrada', 'Entrada'), ('Consumo', 'Consumo'), ('Ajuste', 'Ajuste')], max_length=10)),
+                ('quantity_kg', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('compacted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('feed_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='core.feedinventory')),
+                ('feeding_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='core.feedinglog')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['feed_item', 'compacted'], name='feedmovement_item_pending_idx')],
+            },
+        ),
+        migrations.RunPython(link_feeding_logs, migrations.RunPython.noop),
+    ]
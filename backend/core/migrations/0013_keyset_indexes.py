@@ -0,0 +1,37 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tableversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedinglog',
+            index=models.Index(fields=['log_date', 'id'], name='feedinglog_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedstockmovement',
+            index=models.Index(fields=['movement_date', 'id'], name='feedmovement_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialtransaction',
+            index=models.Index(fields=['transaction_date', 'id'], name='fintransaction_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthlog',
+            index=models.Index(fields=['log_date', 'id'], name='healthlog_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reproductionevent',
+            index=models.Index(fields=['mating_date', 'id'], name='reproevent_mating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightlog',
+            index=models.Index(fields=['log_date', 'id'], name='weightlog_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['sex', 'status'], name='animal_sex_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedinglog',
+            index=models.Index(fields=['location', 'log_date'], name='feedinglog_location_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialtransaction',
+            index=models.Index(fields=['transaction_date', 'type'], name='fintransaction_date_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialtransaction',
+            index=models.Index(condition=models.Q(('related_entity_id__isnull', False)), fields=['related_entity_id', 'transaction_date'], name='fintransaction_entity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reproductionevent',
+            index=models.Index(condition=models.Q(('actual_birth_date__isnull', False)), fields=['female'], name='reproevent_birth_female_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treatment',
+            index=models.Index(condition=models.Q(('withdrawal_end_date__isnull', False)), fields=['withdrawal_end_date'], name='treatment_withdrawal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightlog',
+            index=models.Index(fields=['animal', 'log_date'], name='weightlog_animal_date_idx'),
+        ),
+    ]
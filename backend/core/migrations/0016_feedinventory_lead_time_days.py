@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedinventory',
+            name='lead_time_days',
+            field=models.PositiveSmallIntegerField(default=7),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_current_rows(apps, schema_editor):
+    # Only the current status and location are known; they are taken to hold since birth
+    Animal = apps.get_model('core', 'Animal')
+    AnimalHistory = apps.get_model('core', 'AnimalHistory')
+    rows = (
+        AnimalHistory(animal_id=animal_id, status=status, location_id=location_id, valid_from=birth_date)
+        for animal_id, status, location_id, birth_date in Animal.objects.values_list('id', 'status', 'location_id', 'birth_date').iterator()
+    )
+    AnimalHistory.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_feedinventory_lead_time_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Active', 'Active'), ('In Quarantine', 'In Quarantine'), ('Sick', 'Sick'), ('Pregnant', 'Pregnant'), ('Retired', 'Retired'), ('Sold', 'Sold'), ('Deceased', 'Deceased')], max_length=20)),
+                ('valid_from', models.DateField()),
+                ('valid_to', models.DateField(blank=True, null=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='core.animal')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='animal_history', to='core.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['animal', 'valid_from', 'valid_to'], name='animalhistory_animal_idx'), models.Index(fields=['location', 'valid_from', 'valid_to'], name='animalhistory_location_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='animalhistory',
+            constraint=models.UniqueConstraint(condition=models.Q(('valid_to__isnull', True)), fields=('animal',), name='unique_open_animal_history'),
+        ),
+        migrations.RunPython(open_current_rows, migrations.RunPython.noop),
+    ]
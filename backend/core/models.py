@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, FilteredRelation, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from datetime import timedelta, date
 
@@ -26,6 +28,30 @@ class Location(models.Model):
     def __str__(self):
         return f"{self.name} ({self.type})"
 
+class AnimalQuerySet(models.QuerySet):
+    def refresh_current_weights(self):
+        # Recomputes the denormalized latest weight for every animal in the
+        # queryset with a single UPDATE.
+        from .signals import notify_bulk_write
+
+        latest = WeightLog.objects.filter(animal=OuterRef('pk')).order_by('-log_date', '-id')
+        updated = self.update(
+            current_weight_kg=Subquery(latest.values('weight_kg')[:1]),
+            last_weighed_date=Subquery(latest.values('log_date')[:1]),
+        )
+        notify_bulk_write(Animal)
+        return updated
+
+    def as_of(self, day):
+        # The animals on the farm on `day`, annotated with their status and
+        # location then (status_as_of, location_as_of_id) from AnimalHistory.
+        placement = FilteredRelation('history', condition=Q(history__valid_from__lte=day) & (
+            Q(history__valid_to__isnull=True) | Q(history__valid_to__gt=day)
+        ))
+        return self.annotate(placement=placement).filter(placement__isnull=False).annotate(
+            status_as_of=F('placement__status'), location_as_of_id=F('placement__location'),
+        )
+
 class Animal(models.Model):
     SEX_CHOICES = (
         ('M', 'Male'),
@@ -40,6 +66,8 @@ class Animal(models.Model):
         ('Sold', 'Sold'),
         ('Deceased', 'Deceased'),
     )
+    # Animals that no longer occupy a location
+    INACTIVE_STATUSES = ('Sold', 'Deceased')
 
     unique_tag = models.CharField(max_length=100, unique=True)
     birth_date = models.DateField()
@@ -49,35 +77,154 @@ class Animal(models.Model):
     sire = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children_sire')
     dam = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children_dam')
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
+    # Latest WeightLog values, kept in sync by WeightLog.save()/delete()
+    current_weight_kg = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, db_index=True)
+    last_weighed_date = models.DateField(null=True, blank=True, db_index=True)
+    # Wright's inbreeding coefficient, kept in sync by core.pedigree when parents change
+    inbreeding_coefficient = models.DecimalField(max_digits=7, decimal_places=6, null=True, blank=True, db_index=True)
+
+    objects = AnimalQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Herd counts by sex and status (fertility, parturition and ranking reports)
+            models.Index(fields=['sex', 'status'], name='animal_sex_status_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parents = (instance.__dict__.get('sire_id'), instance.__dict__.get('dam_id'))
+        instance._loaded_placement = (instance.__dict__.get('status'), instance.__dict__.get('location_id'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .history import sync_history
+        from .pedigree import update_pedigree
+
+        parents = (self.sire_id, self.dam_id)
+        parents_changed = getattr(self, '_loaded_parents', (None, None)) != parents
+        placement = (self.status, self.location_id)
+        placement_changed = self._state.adding or getattr(self, '_loaded_placement', None) != placement
+        if self._state.adding and not parents_changed:
+            # A founder with no recorded parents
+            self.inbreeding_coefficient = 0
+        super().save(*args, **kwargs)
+        self._loaded_parents = parents
+        self._loaded_placement = placement
+        if placement_changed:
+            sync_history([self.pk])
+        if parents_changed:
+            update_pedigree(self.pk)
+            self.inbreeding_coefficient = Animal.objects.filter(pk=self.pk).values_list('inbreeding_coefficient', flat=True).first()
+
+    def delete(self, *args, **kwargs):
+        from .pedigree import update_pedigree
+
+        # Offspring lose this parent through SET_NULL, which bypasses save().
+        children = list(Animal.objects.filter(models.Q(sire=self) | models.Q(dam=self)).values_list('id', flat=True))
+        result = super().delete(*args, **kwargs)
+        for child_id in children:
+            update_pedigree(child_id)
+        return result
 
     def __str__(self):
         return self.unique_tag
 
+    # Minimum age in days and weight in kg for breeding readiness, per sex.
+    BREEDING_READINESS = {
+        'F': (90, 0.8),  # Female: 3 months (approx 90 days) and 800g
+        'M': (120, 1.0),  # Male: 4 months (approx 120 days) and 1kg
+    }
+
     def is_breeding_ready(self):
-        # Example logic: Female ready at 3 months and 800g, Male at 4 months and 1kg
-        today = date.today()
-        age_in_days = (today - self.birth_date).days
+        return Animal.meets_breeding_readiness(self.sex, self.birth_date, self.current_weight_kg)
+
+    @classmethod
+    def meets_breeding_readiness(cls, sex, birth_date, weight_kg, today=None):
+        # Shared by is_breeding_ready and the bulk pairing engine, which
+        # evaluates readiness from already-loaded values instead of per-animal queries.
+        if sex not in cls.BREEDING_READINESS:
+            return False
+        min_age_days, min_weight_kg = cls.BREEDING_READINESS[sex]
+        age_in_days = ((today or date.today()) - birth_date).days
+        return age_in_days >= min_age_days and (weight_kg or 0) >= min_weight_kg
+
+class AnimalAncestor(models.Model):
+    # Closure table of the sire/dam pedigree: one row per (animal, ancestor)
+    # with the shortest number of generations between them.
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='ancestor_links')
+    ancestor = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='descendant_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['animal', 'ancestor'], name='unique_animal_ancestor'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='animalancestor_ancestor_idx'),
+        ]
 
-        latest_weight = self.weightlog_set.order_by('-log_date').first()
-        current_weight_kg = latest_weight.weight_kg if latest_weight else 0
+    def __str__(self):
+        return f"{self.ancestor_id} is ancestor of {self.animal_id} ({self.depth} generations)"
+
+class AnimalHistory(models.Model):
+    # Append-only record of each animal's status and location, kept by
+    # core.history whenever they change. Each row holds from valid_from up to,
+    # not including, valid_to; the open row (valid_to null) is the current one.
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='history')
+    status = models.CharField(max_length=20, choices=Animal.STATUS_CHOICES)
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='animal_history')
+    valid_from = models.DateField()
+    valid_to = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['animal'], name='unique_open_animal_history', condition=models.Q(valid_to__isnull=True)),
+        ]
+        indexes = [
+            # Rows valid on a date, per animal (animal list ?as_of=) and per location (density ?as_of=)
+            models.Index(fields=['animal', 'valid_from', 'valid_to'], name='animalhistory_animal_idx'),
+            models.Index(fields=['location', 'valid_from', 'valid_to'], name='animalhistory_location_idx'),
+        ]
 
-        if self.sex == 'F':
-            # Female: 3 months (approx 90 days) and 800g
-            return age_in_days >= 90 and current_weight_kg >= 0.8
-        elif self.sex == 'M':
-            # Male: 4 months (approx 120 days) and 1kg
-            return age_in_days >= 120 and current_weight_kg >= 1.0
-        return False
+    def __str__(self):
+        return f"{self.animal_id} {self.status} at {self.location_id} from {self.valid_from} to {self.valid_to or 'now'}"
 
 class WeightLog(models.Model):
     animal = models.ForeignKey(Animal, on_delete=models.CASCADE)
     log_date = models.DateField()
     weight_kg = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['log_date', 'id'], name='weightlog_date_id_idx'),
+            # Per-animal weight series (GDP, ICA and cost reports, current-weight refresh)
+            models.Index(fields=['animal', 'log_date'], name='weightlog_animal_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        animal_ids = {self.animal_id}
+        if self.pk:
+            # The log may have been moved to another animal
+            animal_ids.update(WeightLog.objects.filter(pk=self.pk).values_list('animal_id', flat=True))
+        super().save(*args, **kwargs)
+        Animal.objects.filter(pk__in=animal_ids).refresh_current_weights()
+
+    def delete(self, *args, **kwargs):
+        animal_id = self.animal_id
+        result = super().delete(*args, **kwargs)
+        Animal.objects.filter(pk=animal_id).refresh_current_weights()
+        return result
+
     def __str__(self):
         return f"{self.animal.unique_tag} - {self.log_date} - {self.weight_kg} kg"
 
 class ReproductionEvent(models.Model):
+    # Average gestation period
+    GESTATION_DAYS = 67
+
     female = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='reproduction_events_female')
     male = models.ForeignKey(Animal, on_delete=models.SET_NULL, null=True, blank=True, related_name='reproduction_events_male')
     mating_date = models.DateField()
@@ -86,9 +233,17 @@ class ReproductionEvent(models.Model):
     live_births = models.IntegerField(null=True, blank=True)
     dead_births = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['mating_date', 'id'], name='reproevent_mating_id_idx'),
+            # Females that gave birth (fertility and parturition rates)
+            models.Index(fields=['female'], name='reproevent_birth_female_idx', condition=models.Q(actual_birth_date__isnull=False)),
+        ]
+
     def save(self, *args, **kwargs):
         if self.mating_date and not self.expected_birth_date:
-            self.expected_birth_date = self.mating_date + timedelta(days=67) # Average gestation period
+            self.expected_birth_date = self.mating_date + timedelta(days=self.GESTATION_DAYS)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -100,6 +255,12 @@ class HealthLog(models.Model):
     diagnosis = models.TextField()
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['log_date', 'id'], name='healthlog_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"Health Log for {self.animal.unique_tag} on {self.log_date}"
 
@@ -116,6 +277,12 @@ class Treatment(models.Model):
     dosage = models.CharField(max_length=100)
     withdrawal_end_date = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Withdrawal alerts only look at treatments with a withdrawal period
+            models.Index(fields=['withdrawal_end_date'], name='treatment_withdrawal_idx', condition=models.Q(withdrawal_end_date__isnull=False)),
+        ]
+
     def save(self, *args, **kwargs):
         if self.medication and self.health_log.log_date:
             self.withdrawal_end_date = self.health_log.log_date + timedelta(days=self.medication.withdrawal_period_days)
@@ -135,6 +302,15 @@ class FinancialTransaction(models.Model):
     description = models.TextField(blank=True, null=True)
     related_entity_id = models.IntegerField(null=True, blank=True, help_text="ID of related entity like Animal, Location, etc.")
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['transaction_date', 'id'], name='fintransaction_date_id_idx'),
+            models.Index(fields=['transaction_date', 'type'], name='fintransaction_date_type_idx'),
+            # Per-animal costs and income; most transactions have no related entity
+            models.Index(fields=['related_entity_id', 'transaction_date'], name='fintransaction_entity_idx', condition=models.Q(related_entity_id__isnull=False)),
+        ]
+
     def __str__(self):
         return f"{self.type} - {self.transaction_date} - {self.amount}"
 
@@ -142,32 +318,129 @@ class FeedingLog(models.Model):
     location = models.ForeignKey(Location, on_delete=models.CASCADE)
     log_date = models.DateField()
     feed_type = models.CharField(max_length=100) # e.g., 'Forraje', 'Concentrado'
+    feed_item = models.ForeignKey('FeedInventory', on_delete=models.SET_NULL, null=True, blank=True)
     quantity_kg = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['log_date', 'id'], name='feedinglog_date_id_idx'),
+            # Per-location feed consumption (ICA report)
+            models.Index(fields=['location', 'log_date'], name='feedinglog_location_date_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update FeedInventory
-        try:
-            feed_item = FeedInventory.objects.get(product_name=self.feed_type)
-            feed_item.quantity_kg -= self.quantity_kg
-            feed_item.save()
-        except FeedInventory.DoesNotExist:
-            # Handle case where feed_type is not in inventory (e.g., log a warning)
-            pass
+        from .signals import notify_bulk_write
+
+        previous = None
+        if self.pk:
+            previous = FeedingLog.objects.filter(pk=self.pk).values('feed_type', 'feed_item_id', 'quantity_kg', 'log_date').first()
+        if self.feed_item_id is None or (previous and previous['feed_type'] != self.feed_type and previous['feed_item_id'] == self.feed_item_id):
+            # Fall back to matching the free-text feed type against the inventory
+            self.feed_item = FeedInventory.objects.filter(product_name=self.feed_type).first()
+        elif previous is None or previous['feed_item_id'] != self.feed_item_id:
+            self.feed_type = self.feed_item.product_name
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Inventory is updated by appending to the movement ledger, never by
+            # rewriting the FeedInventory row, so concurrent feedings don't contend.
+            # An edit reverses the old movement on its own date and posts the new one.
+            unchanged = (previous['feed_item_id'], previous['quantity_kg'], previous['log_date']) if previous else None
+            if unchanged == (self.feed_item_id, self.quantity_kg, self.log_date):
+                return
+            movements = []
+            if previous and previous['feed_item_id']:
+                movements.append(FeedStockMovement(
+                    feed_item_id=previous['feed_item_id'], feeding_log=self, movement_date=previous['log_date'],
+                    kind='Ajuste', quantity_kg=previous['quantity_kg'],
+                ))
+            if self.feed_item_id:
+                movements.append(FeedStockMovement.for_feeding(self))
+            FeedStockMovement.objects.bulk_create(movements)
+            notify_bulk_write(FeedStockMovement, created=movements)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.feed_item_id:
+                FeedStockMovement.objects.create(
+                    feed_item_id=self.feed_item_id, feeding_log=self, movement_date=self.log_date,
+                    kind='Ajuste', quantity_kg=self.quantity_kg,
+                )
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"Feeding at {self.location.name} on {self.log_date} - {self.quantity_kg} kg of {self.feed_type}"
 
+class FeedInventoryQuerySet(models.QuerySet):
+    def with_balance(self):
+        # quantity_kg holds the compacted balance; movements not yet compacted are added on top.
+        pending = Sum('movements__quantity_kg', filter=Q(movements__compacted=False))
+        return self.annotate(
+            balance_kg=F('quantity_kg') + Coalesce(pending, Value(0), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+        )
+
 class FeedInventory(models.Model):
     product_name = models.CharField(max_length=100, unique=True)
+    # Balance as of the last ledger compaction (see FeedStockMovement); read the
+    # live balance through FeedInventory.objects.with_balance() or current_balance().
     quantity_kg = models.DecimalField(max_digits=10, decimal_places=2)
     cost_per_kg = models.DecimalField(max_digits=5, decimal_places=2)
     supplier = models.CharField(max_length=100, blank=True, null=True)
     entry_date = models.DateField(auto_now_add=True)
+    # Days between ordering the product and receiving it (reports.stock)
+    lead_time_days = models.PositiveSmallIntegerField(default=7)
+
+    objects = FeedInventoryQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # Once created, quantity_kg only moves through compact_feed_ledger(); saving
+        # a loaded copy must not write back a balance compacted since it was read.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'quantity_kg'
+            ]
+        super().save(*args, **kwargs)
+
+    def current_balance(self):
+        pending = self.movements.filter(compacted=False).aggregate(Sum('quantity_kg'))['quantity_kg__sum'] or 0
+        return self.quantity_kg + pending
 
     def __str__(self):
         return f"{self.product_name} - {self.quantity_kg} kg"
 
+class FeedStockMovement(models.Model):
+    # Append-only inventory ledger. Positive quantities add stock, negative ones consume it.
+    MOVEMENT_TYPES = (
+        ('Entrada', 'Entrada'),
+        ('Consumo', 'Consumo'),
+        ('Ajuste', 'Ajuste'),
+    )
+    feed_item = models.ForeignKey(FeedInventory, on_delete=models.CASCADE, related_name='movements')
+    feeding_log = models.ForeignKey(FeedingLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    movement_date = models.DateField()
+    kind = models.CharField(max_length=10, choices=MOVEMENT_TYPES)
+    quantity_kg = models.DecimalField(max_digits=10, decimal_places=2)
+    # Set once the quantity has been folded into FeedInventory.quantity_kg
+    compacted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['feed_item', 'compacted'], name='feedmovement_item_pending_idx'),
+            models.Index(fields=['movement_date', 'id'], name='feedmovement_date_id_idx'),
+        ]
+
+    @classmethod
+    def for_feeding(cls, feeding_log):
+        return cls(
+            feed_item_id=feeding_log.feed_item_id, feeding_log=feeding_log, movement_date=feeding_log.log_date,
+            kind='Consumo', quantity_kg=-feeding_log.quantity_kg,
+        )
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity_kg} kg of {self.feed_item.product_name} on {self.movement_date}"
+
 class FeedRation(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -181,4 +454,31 @@ class RationComponent(models.Model):
     percentage = models.DecimalField(max_digits=5, decimal_places=2) # Percentage of this item in the ration
 
     def __str__(self):
-        return f"{self.feed_ration.name} - {self.feed_item.product_name} ({self.percentage}%)"
\ No newline at end of file
+        return f"{self.feed_ration.name} - {self.feed_item.product_name} ({self.percentage}%)"
+
+class TableVersion(models.Model):
+    # Per-table change counter, bumped after every committed write (see core.signals).
+    # Used to key report caches and conditional GET validators.
+    table = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+    last_modified = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+class ImportCheckpoint(models.Model):
+    # Progress of one herd import file (see core.importer), identified by its
+    # contents, so an interrupted import resumes after its last committed batch.
+    kind = models.CharField(max_length=20)
+    checksum = models.CharField(max_length=64)
+    rows_imported = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'checksum'], name='unique_import_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.checksum[:12]}: {self.rows_imported} rows"
@@ -0,0 +1,161 @@
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as Base64Error
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .versioning import get_versions, table_label
+
+DEFAULT_PAGE_SIZE = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 100
+MAX_PAGE_SIZE = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a stable, indexed ordering.
+
+    The cursor holds the ordering values of the last row of the page, and the
+    next page is fetched with WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n, so
+    any page costs the same as the first one. Views choose the ordering with
+    `keyset_ordering`; its last field must be unique (usually 'id') and none
+    may be nullable.
+
+    Pagination is opt-in: lists are only paginated when the request carries
+    `cursor` or `page_size`, so existing clients keep receiving plain lists.
+    `?count=1` adds the total, cached until the table changes.
+    """
+    ordering = ('id',)
+    page_size = DEFAULT_PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset) if params.get(self.count_query_param) in ('1', 'true') else None
+
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.seek_filter(position, reverse))
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        ordering = [self.flip(field) for field in self.ordering] if reverse else self.ordering
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards, there is always a next page: the one we came from.
+        self.has_next = has_more or (reverse and position is not None)
+        self.has_previous = has_more if reverse else position is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_count(self, queryset):
+        # Keyed by the table version and the filtered SQL, so every write to the
+        # table invalidates the cached totals.
+        try:
+            sql = str(queryset.order_by().query)
+        except EmptyResultSet:
+            # e.g. a filter on an empty id__in list, which matches no row
+            return 0
+        version, _ = get_versions([queryset.model]).get(table_label(queryset.model), (0, None))
+        key = f"count:{table_label(queryset.model)}:{version}:{hashlib.sha1(sql.encode()).hexdigest()}"
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, None)
+        return count
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def seek_filter(self, position, reverse):
+        # (a > x) OR (a = x AND b > y) ..., with > or < per field direction
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def position_of(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_', validate=True))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, Base64Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        cursor = {'p': self.position_of(row)}
+        if reverse:
+            cursor['r'] = 1
+        encoded = b64encode(json.dumps(cursor, cls=DjangoJSONEncoder).encode(), altchars=b'-_').decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
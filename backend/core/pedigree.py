@@ -0,0 +1,216 @@
+from collections import deque
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from .models import Animal, AnimalAncestor
+from .signals import notify_bulk_write
+
+# Generations counted back from the (possibly hypothetical) offspring: the
+# candidate parents are generation 1.
+DEFAULT_GENERATIONS = getattr(settings, 'PEDIGREE_GENERATIONS', 5)
+# Deepest ancestor kept in the AnimalAncestor closure table.
+INDEX_DEPTH = getattr(settings, 'PEDIGREE_INDEX_DEPTH', 10)
+MAX_GENERATIONS = INDEX_DEPTH + 1
+
+COEFFICIENT_PLACES = Decimal('0.000001')
+
+
+def topological_order(parents):
+    """Orders animal IDs so that every parent in `parents` comes before its offspring."""
+    children = {}
+    pending = {}
+    for animal_id, animal_parents in parents.items():
+        known = {parent_id for parent_id in animal_parents if parent_id in parents}
+        pending[animal_id] = len(known)
+        for parent_id in known:
+            children.setdefault(parent_id, []).append(animal_id)
+
+    queue = deque(sorted(animal_id for animal_id, count in pending.items() if count == 0))
+    order = []
+    while queue:
+        animal_id = queue.popleft()
+        order.append(animal_id)
+        for child_id in children.get(animal_id, ()):
+            pending[child_id] -= 1
+            if pending[child_id] == 0:
+                queue.append(child_id)
+    # Anything left is part of a parent cycle; keep it so its rows are still rebuilt.
+    order.extend(sorted(animal_id for animal_id, count in pending.items() if count > 0))
+    return order
+
+
+def build_ancestor_rows(order, parents, known_ancestors):
+    """
+    Computes {animal_id: {ancestor_id: depth}} for every animal in `order`.
+
+    `known_ancestors` must already hold the rows of any parent that is not
+    itself being rebuilt. Depth is the shortest number of generations between
+    the animal and the ancestor, capped at INDEX_DEPTH.
+    """
+    ancestors = dict(known_ancestors)
+    for animal_id in order:
+        rows = {}
+        for parent_id in parents.get(animal_id, ()):
+            if not parent_id or parent_id == animal_id:
+                continue
+            rows[parent_id] = 1
+            for ancestor_id, depth in ancestors.get(parent_id, {}).items():
+                if depth + 1 <= INDEX_DEPTH and ancestor_id != animal_id and depth + 1 < rows.get(ancestor_id, INDEX_DEPTH + 1):
+                    rows[ancestor_id] = depth + 1
+        ancestors[animal_id] = rows
+    return ancestors
+
+
+class Pedigree:
+    """
+    In-memory pedigree used to compute coefficients of kinship (coancestry).
+
+    Load it once for a batch of animals with Pedigree.load(); every
+    coefficient is then computed without further queries.
+    """
+
+    def __init__(self, parents, ancestors):
+        self.parents = parents
+        self.ancestors = ancestors
+
+    @classmethod
+    def load(cls, animal_ids, generations=DEFAULT_GENERATIONS):
+        # Two queries regardless of batch size: the ancestor index rows for the
+        # requested animals, then the parent links of everything involved.
+        animal_ids = set(animal_ids)
+        ancestors = {animal_id: {} for animal_id in animal_ids}
+        rows = AnimalAncestor.objects.filter(animal_id__in=animal_ids, depth__lt=generations)
+        for animal_id, ancestor_id, depth in rows.values_list('animal_id', 'ancestor_id', 'depth'):
+            ancestors[animal_id][ancestor_id] = depth
+
+        involved = set(animal_ids)
+        for animal_ancestors in ancestors.values():
+            involved.update(animal_ancestors)
+        parents = {
+            animal_id: (sire_id, dam_id)
+            for animal_id, sire_id, dam_id in Animal.objects.filter(id__in=involved).values_list('id', 'sire_id', 'dam_id')
+        }
+        return cls(parents, ancestors)
+
+    def coancestry(self, x, y, generations=DEFAULT_GENERATIONS):
+        """
+        Coefficient of kinship between x and y, which is also Wright's
+        inbreeding coefficient of their offspring. Ancestors further than
+        `generations` back from that offspring are treated as founders.
+        """
+        if not x or not y:
+            return 0.0
+
+        allowed = {x, y}
+        for animal_id in (x, y):
+            allowed.update(
+                ancestor_id for ancestor_id, depth in self.ancestors.get(animal_id, {}).items() if depth < generations
+            )
+        parents = {
+            animal_id: tuple(
+                parent_id if parent_id in allowed and parent_id != animal_id else None
+                for parent_id in self.parents.get(animal_id, (None, None))
+            )
+            for animal_id in allowed
+        }
+
+        generation = {}
+        for animal_id in topological_order(parents):
+            known = [generation[parent_id] for parent_id in parents[animal_id] if parent_id in generation]
+            generation[animal_id] = 1 + max(known) if known else 0
+
+        memo = {}
+
+        def kinship(a, b):
+            if a is None or b is None:
+                return 0.0
+            key = (a, b) if a <= b else (b, a)
+            if key in memo:
+                return memo[key]
+            if a == b:
+                sire_id, dam_id = parents[a]
+                value = 0.5 * (1 + kinship(sire_id, dam_id))
+            else:
+                # Expand the younger animal, which cannot be an ancestor of the other.
+                if generation[a] < generation[b]:
+                    a, b = b, a
+                sire_id, dam_id = parents[a]
+                value = 0.5 * (kinship(sire_id, b) + kinship(dam_id, b))
+            memo[key] = value
+            return value
+
+        return kinship(x, y)
+
+    def inbreeding(self, animal_id, generations=DEFAULT_GENERATIONS):
+        sire_id, dam_id = self.parents.get(animal_id, (None, None))
+        return self.coancestry(sire_id, dam_id, generations)
+
+
+def as_coefficient(value):
+    return Decimal(value).quantize(COEFFICIENT_PLACES)
+
+
+def update_pedigree(animal_id):
+    """
+    Rebuilds the ancestor index and inbreeding coefficient of an animal whose
+    parents changed, along with every indexed descendant.
+    """
+    update_pedigrees([animal_id])
+
+
+def update_pedigrees(animal_ids):
+    """update_pedigree() for a batch of animals, e.g. after parents are linked in bulk."""
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        return
+    descendant_ids = set(AnimalAncestor.objects.filter(ancestor_id__in=animal_ids).values_list('animal_id', flat=True))
+    affected = descendant_ids | animal_ids
+    parents = {
+        pk: (sire_id, dam_id)
+        for pk, sire_id, dam_id in Animal.objects.filter(id__in=affected).values_list('id', 'sire_id', 'dam_id')
+    }
+
+    outside_parents = {parent_id for pair in parents.values() for parent_id in pair if parent_id and parent_id not in affected}
+    known_ancestors = {parent_id: {} for parent_id in outside_parents}
+    rows = AnimalAncestor.objects.filter(animal_id__in=outside_parents)
+    for pk, ancestor_id, depth in rows.values_list('animal_id', 'ancestor_id', 'depth'):
+        known_ancestors[pk][ancestor_id] = depth
+
+    ancestors = build_ancestor_rows(topological_order(parents), parents, known_ancestors)
+
+    # Parent links of every ancestor are needed to compute the coefficients.
+    ancestor_ids = {ancestor_id for pk in affected for ancestor_id in ancestors[pk]} - affected
+    parents.update(
+        (pk, (sire_id, dam_id))
+        for pk, sire_id, dam_id in Animal.objects.filter(id__in=ancestor_ids).values_list('id', 'sire_id', 'dam_id')
+    )
+    _save_pedigree(affected, parents, ancestors, replace_all=False)
+
+
+def rebuild_pedigree(batch_size=2000):
+    """Rebuilds the whole ancestor index and every inbreeding coefficient."""
+    parents = {pk: (sire_id, dam_id) for pk, sire_id, dam_id in Animal.objects.values_list('id', 'sire_id', 'dam_id')}
+    ancestors = build_ancestor_rows(topological_order(parents), parents, {})
+    _save_pedigree(set(parents), parents, ancestors, replace_all=True, batch_size=batch_size)
+    return len(parents)
+
+
+def _save_pedigree(animal_ids, parents, ancestors, replace_all, batch_size=2000):
+    pedigree = Pedigree(parents, ancestors)
+    rows = [
+        AnimalAncestor(animal_id=animal_id, ancestor_id=ancestor_id, depth=depth)
+        for animal_id in animal_ids
+        for ancestor_id, depth in ancestors[animal_id].items()
+    ]
+    coefficients = [
+        Animal(id=animal_id, inbreeding_coefficient=as_coefficient(pedigree.inbreeding(animal_id)))
+        for animal_id in animal_ids
+    ]
+
+    with transaction.atomic():
+        stale = AnimalAncestor.objects.all() if replace_all else AnimalAncestor.objects.filter(animal_id__in=animal_ids)
+        stale.delete()
+        AnimalAncestor.objects.bulk_create(rows, batch_size=batch_size)
+        Animal.objects.bulk_update(coefficients, ['inbreeding_coefficient'], batch_size=batch_size)
+        notify_bulk_write(AnimalAncestor, Animal)
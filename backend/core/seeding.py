@@ -0,0 +1,369 @@
+import math
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from .importer import insert_rows
+from .models import (
+    Line, Location, Animal, AnimalHistory, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment,
+    FinancialTransaction, FeedingLog, FeedInventory, FeedStockMovement, FeedRation, RationComponent,
+)
+from .pedigree import update_pedigrees
+from .signals import notify_bulk_write
+
+DEFAULT_SEED = 1
+GESTATION_DAYS = ReproductionEvent.GESTATION_DAYS
+# Age at first mating, and the shortest gap between two generations it allows
+BREEDING_AGE_DAYS = 90
+MIN_GENERATION_DAYS = BREEDING_AGE_DAYS + GESTATION_DAYS
+# Market age of fattened animals
+SALE_AGE_DAYS = (90, 120)
+# Age at which breeders are retired
+RETIREMENT_AGE_DAYS = 540
+
+LINES = ('Peru', 'Andina', 'Inti', 'Kuri')
+# Gompertz growth: adult weight (kg) by sex, birth weight and daily rate
+ADULT_WEIGHT_KG = {'M': 1.55, 'F': 1.35}
+BIRTH_WEIGHT_KG = 0.12
+GROWTH_RATE = 0.025
+# Daily ration per animal: (feed item, kg, cost per kg)
+FEEDS = (('Alfalfa', 0.35, Decimal('0.40')), ('Concentrado', 0.04, Decimal('1.80')))
+# Rations as percentages of each feed, in FEEDS order
+RATIONS = (('Engorde', (80, 20)), ('Reproductoras', (90, 10)))
+# (medication, withdrawal days, diagnoses it treats)
+MEDICATIONS = (
+    ('Enrofloxacino', 10, ('Diarrea', 'Neumonía')),
+    ('Ivermectina', 28, ('Sarna', 'Piojos')),
+    ('Oxitetraciclina', 14, ('Linfadenitis', 'Neumonía')),
+)
+HEALTH_EPISODE_RATE = 0.12
+LOCATION_CAPACITY = (12, 20)
+SALE_PRICE = (25, 45)
+
+
+def quantize(value):
+    return Decimal(str(round(value, 2)))
+
+
+def gompertz_weight(adult_weight, age_days):
+    return adult_weight * math.exp(-math.log(adult_weight / BIRTH_WEIGHT_KG) * math.exp(-GROWTH_RATE * age_days))
+
+
+def weighing_ages(end_age):
+    """Fortnightly weighings until market age, monthly afterwards."""
+    age = 0
+    while age <= end_age:
+        yield age
+        age += 14 if age < SALE_AGE_DAYS[1] else 30
+
+
+class HerdGenerator:
+    """
+    Builds the unsaved rows of a synthetic herd. Every draw comes from one
+    seeded random.Random, so a given (seed, today) always yields the same herd.
+
+    The founders are born before the period and every later generation is
+    bred from the previous one, litter by litter, so pedigrees, litters and
+    growth curves are consistent with each other. Animals that were not kept
+    for breeding are mostly sold at market age.
+    """
+
+    def __init__(self, animals, generations, years, seed=DEFAULT_SEED, today=None):
+        self.today = today or date.today()
+        self.start = self.today - timedelta(days=365 * years)
+        self.interval = (self.today - self.start).days // generations
+        if self.interval < MIN_GENERATION_DAYS:
+            raise ValueError(f'{generations} generations need at least {math.ceil(generations * MIN_GENERATION_DAYS / 365)} years.')
+        if animals < 4 * (generations + 1):
+            raise ValueError(f'{generations} generations need at least {4 * (generations + 1)} animals.')
+        self.animals = animals
+        self.generations = generations
+        self.rng = random.Random(seed)
+        # Animal id -> (adult weight, end of life or None)
+        self.profiles = {}
+
+    def generation_sizes(self):
+        size = self.animals // (self.generations + 1)
+        sizes = [size] * (self.generations + 1)
+        sizes[-1] += self.animals - sum(sizes)
+        return sizes
+
+    def founders(self, count, lines):
+        rng = self.rng
+        return [
+            Animal(
+                unique_tag=f'F-{number:05d}', sex='MF'[number % 2], line=lines[number % len(lines)],
+                birth_date=self.start - timedelta(days=rng.randint(200, 300)),
+            )
+            for number in range(count)
+        ]
+
+    def litters(self, generation, count, parents, tag_offset):
+        """
+        Offspring of `parents` (the previous generation) born within the
+        generation's window, as (animals, reproduction events).
+        """
+        rng = self.rng
+        window_end = self.start + timedelta(days=self.interval * generation)
+        window_start = window_end - timedelta(days=self.interval)
+        females = [animal for animal in parents if animal.sex == 'F']
+        males_by_line = defaultdict(list)
+        for animal in parents:
+            if animal.sex == 'M':
+                males_by_line[animal.line_id].append(animal)
+        males = [animal for animal in parents if animal.sex == 'M']
+
+        offspring, events = [], []
+        while len(offspring) < count:
+            dam = rng.choice(females)
+            # Most matings stay within the dam's line, which builds up some inbreeding
+            sire = rng.choice(males_by_line[dam.line_id] if males_by_line[dam.line_id] and rng.random() < 0.8 else males)
+            earliest = max(window_start, dam.birth_date + timedelta(days=MIN_GENERATION_DAYS), sire.birth_date + timedelta(days=MIN_GENERATION_DAYS))
+            birth_date = earliest + timedelta(days=rng.randint(0, max((window_end - earliest).days, 0)))
+            litter_size = min(rng.choice((2, 3, 3, 4)), count - len(offspring))
+            mating_date = birth_date - timedelta(days=GESTATION_DAYS)
+            events.append(ReproductionEvent(
+                female=dam, male=sire, mating_date=mating_date, expected_birth_date=mating_date + timedelta(days=GESTATION_DAYS),
+                actual_birth_date=birth_date, live_births=litter_size, dead_births=rng.choice((0, 0, 0, 1)),
+            ))
+            for _ in range(litter_size):
+                # The first two of each generation are a male and a female, so it can breed
+                sex = 'MF'[len(offspring)] if len(offspring) < 2 else rng.choice('MF')
+                offspring.append(Animal(
+                    unique_tag=f'G{generation}-{tag_offset + len(offspring):05d}', sex=sex,
+                    birth_date=birth_date, line_id=dam.line_id, sire=sire, dam=dam,
+                ))
+        return offspring, events
+
+    def assign_fates(self, animals, breeder_ids):
+        """Sets each animal's status and remembers when it left the herd."""
+        rng = self.rng
+        for animal in animals:
+            age = (self.today - animal.birth_date).days
+            end = None
+            if animal.id in breeder_ids:
+                animal.status = 'Retired' if age > RETIREMENT_AGE_DAYS else 'Active'
+            elif age > SALE_AGE_DAYS[1] and rng.random() < 0.7:
+                animal.status = 'Sold'
+                end = animal.birth_date + timedelta(days=rng.randint(*SALE_AGE_DAYS))
+            elif rng.random() < 0.04:
+                animal.status = 'Deceased'
+                end = animal.birth_date + timedelta(days=rng.randint(1, max(age, 1)))
+            else:
+                animal.status = 'Active'
+            adult_weight = ADULT_WEIGHT_KG[animal.sex] * rng.gauss(1, 0.08)
+            self.profiles[animal.id] = (adult_weight, end)
+
+    def locations(self, animals):
+        """Pozas for the animals still in the herd, filled to about 80% of their capacity."""
+        rng = self.rng
+        present = [animal for animal in animals if animal.status not in Animal.INACTIVE_STATUSES]
+        rng.shuffle(present)
+        locations, occupants = [], []
+        while present:
+            capacity = rng.randint(*LOCATION_CAPACITY)
+            locations.append(Location(name=f'Poza {len(locations) + 1:03d}', type=rng.choice(('Poza', 'Poza', 'Jaula')), capacity=capacity))
+            occupants.append(present[:round(capacity * 0.8)])
+            present = present[round(capacity * 0.8):]
+        return locations, occupants
+
+    def history(self, animals, locations):
+        """
+        Status and location intervals of every animal: sold and dead animals
+        were Active in one of the pozas from birth until they left, retired
+        breeders Active until retirement age, and the others have been in
+        their current state since birth.
+        """
+        rng = self.rng
+        rows = []
+        for animal in animals:
+            _, end = self.profiles[animal.id]
+            if end is not None:
+                end = min(end, self.today)
+                if end > animal.birth_date:
+                    rows.append(AnimalHistory(animal=animal, status='Active', location=rng.choice(locations), valid_from=animal.birth_date, valid_to=end))
+                rows.append(AnimalHistory(animal=animal, status=animal.status, location=animal.location, valid_from=end))
+            elif animal.status == 'Retired':
+                retired = animal.birth_date + timedelta(days=RETIREMENT_AGE_DAYS)
+                rows.append(AnimalHistory(animal=animal, status='Active', location=animal.location, valid_from=animal.birth_date, valid_to=retired))
+                rows.append(AnimalHistory(animal=animal, status='Retired', location=animal.location, valid_from=retired))
+            else:
+                rows.append(AnimalHistory(animal=animal, status=animal.status, location=animal.location, valid_from=animal.birth_date))
+        return rows
+
+    def weights(self, animals):
+        rng = self.rng
+        logs = []
+        for animal in animals:
+            adult_weight, end = self.profiles[animal.id]
+            last_day = min(end or self.today, self.today)
+            for age in weighing_ages((last_day - animal.birth_date).days):
+                weight = gompertz_weight(adult_weight, age) * rng.uniform(0.97, 1.03)
+                logs.append(WeightLog(animal=animal, log_date=animal.birth_date + timedelta(days=age), weight_kg=quantize(weight)))
+        return logs
+
+    def pregnancies(self, animals):
+        """Open matings of mature females still in the herd, who are marked Pregnant."""
+        rng = self.rng
+        events = []
+        for animal in animals:
+            if animal.sex != 'F' or animal.status != 'Active' or (self.today - animal.birth_date).days < BREEDING_AGE_DAYS:
+                continue
+            if rng.random() < 0.3:
+                mating_date = self.today - timedelta(days=rng.randint(1, GESTATION_DAYS - 1))
+                events.append(ReproductionEvent(female=animal, mating_date=mating_date, expected_birth_date=mating_date + timedelta(days=GESTATION_DAYS)))
+                animal.status = 'Pregnant'
+        return events
+
+    def health_logs(self, animals):
+        """Health episodes with their treatments; a few need repeated treatment."""
+        rng = self.rng
+        episodes = []
+        for animal in animals:
+            if rng.random() >= HEALTH_EPISODE_RATE:
+                continue
+            _, end = self.profiles[animal.id]
+            lifetime = ((end or self.today) - animal.birth_date).days
+            log_date = animal.birth_date + timedelta(days=rng.randint(0, max(lifetime, 0)))
+            medication = rng.randrange(len(MEDICATIONS))
+            diagnosis = rng.choice(MEDICATIONS[medication][2])
+            repeats = 3 if rng.random() < 0.1 else 1
+            for repeat in range(repeats):
+                day = min(log_date + timedelta(days=7 * repeat), self.today)
+                episodes.append((HealthLog(animal=animal, log_date=day, diagnosis=diagnosis), medication))
+            if end is None and (self.today - log_date).days < 14 and animal.status == 'Active':
+                animal.status = rng.choice(('Sick', 'In Quarantine'))
+        return episodes
+
+    def feedings(self, locations, feed_items):
+        """Daily feedings of every location since the start of the period."""
+        logs = []
+        for location in locations:
+            for day in range((self.today - self.start).days + 1):
+                log_date = self.start + timedelta(days=day)
+                for feed_item, (name, kg_per_animal, _) in zip(feed_items, FEEDS):
+                    quantity = location.capacity * 0.8 * kg_per_animal * self.rng.uniform(0.9, 1.1)
+                    logs.append(FeedingLog(location=location, log_date=log_date, feed_type=name, feed_item=feed_item, quantity_kg=quantize(quantity)))
+        return logs
+
+    def purchases(self, feedings, feed_items):
+        """Monthly stock entries covering each month's consumption, with their cost."""
+        consumed = defaultdict(Decimal)
+        for log in feedings:
+            consumed[(log.feed_item_id, log.log_date.replace(day=1))] += log.quantity_kg
+        costs = {feed_item.id: feed_item.cost_per_kg for feed_item in feed_items}
+        names = {feed_item.id: feed_item.product_name for feed_item in feed_items}
+        movements, transactions = [], []
+        for (feed_item_id, month), quantity in sorted(consumed.items()):
+            quantity = (quantity * Decimal('1.05')).quantize(Decimal('0.01'))
+            movements.append(FeedStockMovement(feed_item_id=feed_item_id, movement_date=month, kind='Entrada', quantity_kg=quantity))
+            transactions.append(FinancialTransaction(
+                transaction_date=month, type='Costo', amount=(quantity * costs[feed_item_id]).quantize(Decimal('0.01')),
+                description=f'Compra de {names[feed_item_id]}',
+            ))
+        return movements, transactions
+
+    def transactions(self, animals, treatments):
+        rng = self.rng
+        transactions = []
+        for animal in animals:
+            _, end = self.profiles[animal.id]
+            if animal.status == 'Sold':
+                transactions.append(FinancialTransaction(
+                    transaction_date=end, type='Ingreso', amount=quantize(rng.uniform(*SALE_PRICE)),
+                    description=f'Venta de {animal.unique_tag}', related_entity_id=animal.id,
+                ))
+        for treatment in treatments:
+            transactions.append(FinancialTransaction(
+                transaction_date=treatment.health_log.log_date, type='Costo', amount=quantize(rng.uniform(2, 8)),
+                description=f'Tratamiento de {treatment.health_log.animal.unique_tag}', related_entity_id=treatment.health_log.animal_id,
+            ))
+        month = self.start.replace(day=1)
+        while month <= self.today:
+            transactions.append(FinancialTransaction(transaction_date=month, type='Costo', amount=Decimal('930.00'), description='Mano de obra'))
+            month = (month + timedelta(days=31)).replace(day=1)
+        return transactions
+
+
+def insert(model, objs):
+    created = insert_rows(model, objs)
+    notify_bulk_write(model, created=created)
+    return created
+
+
+@transaction.atomic
+def seed_herd(animals=1000, generations=4, years=2, seed=DEFAULT_SEED, today=None):
+    """
+    Writes a synthetic herd of `animals` animals bred over `generations`
+    generations during the last `years` years: pedigrees, litters, weight
+    curves, daily feedings with their stock ledger, treatments and
+    transactions. Rows are written in bulk, and the derived data (ancestors,
+    inbreeding, current weights, rollups, alerts) is brought up to date.
+    Returns the number of rows written per model.
+    """
+    generator = HerdGenerator(animals, generations, years, seed, today)
+    counts = {}
+
+    lines = insert(Line, [Line(name=name) for name in LINES])
+    sizes = generator.generation_sizes()
+    generation = generator.founders(sizes[0], lines)
+    # Announced once placed, below, with their history written from their fates
+    insert_rows(Animal, generation)
+    herd, litters = list(generation), []
+    for number, size in enumerate(sizes[1:], start=1):
+        offspring, events = generator.litters(number, size, generation, len(herd))
+        insert_rows(Animal, offspring)
+        litters.extend(events)
+        herd.extend(offspring)
+        generation = offspring
+
+    breeder_ids = {event.female_id for event in litters} | {event.male_id for event in litters}
+    generator.assign_fates(herd, breeder_ids)
+    pregnancies = generator.pregnancies(herd)
+    episodes = generator.health_logs(herd)
+    locations, occupants = generator.locations(herd)
+    insert(Location, locations)
+    for location, animals_in_location in zip(locations, occupants):
+        for animal in animals_in_location:
+            animal.location = location
+    Animal.objects.bulk_update(herd, ['status', 'location'], batch_size=2000)
+    update_pedigrees([animal.id for animal in herd])
+    insert(AnimalHistory, generator.history(herd, locations))
+    # Status and location changes count as newly placed animals for the density alerts
+    notify_bulk_write(Animal, created=herd)
+    counts['animals'] = len(herd)
+
+    counts['reproduction_events'] = len(insert(ReproductionEvent, litters + pregnancies))
+    counts['weight_logs'] = len(insert(WeightLog, generator.weights(herd)))
+    Animal.objects.refresh_current_weights()
+
+    medications = insert(Medication, [Medication(name=name, withdrawal_period_days=days) for name, days, _ in MEDICATIONS])
+    health_logs = insert(HealthLog, [health_log for health_log, _ in episodes])
+    treatments = insert(Treatment, [
+        Treatment(
+            health_log=health_log, medication=medications[medication], dosage='0.2 ml',
+            withdrawal_end_date=health_log.log_date + timedelta(days=medications[medication].withdrawal_period_days),
+        )
+        for health_log, medication in episodes
+    ])
+    counts['health_logs'], counts['treatments'] = len(health_logs), len(treatments)
+
+    feed_items = insert(FeedInventory, [
+        FeedInventory(product_name=name, quantity_kg=Decimal('200.00'), cost_per_kg=cost, supplier='Agroveterinaria')
+        for name, _, cost in FEEDS
+    ])
+    rations = insert(FeedRation, [FeedRation(name=name) for name, _ in RATIONS])
+    insert(RationComponent, [
+        RationComponent(feed_ration=ration, feed_item=feed_item, percentage=percentage)
+        for ration, (_, percentages) in zip(rations, RATIONS)
+        for feed_item, percentage in zip(feed_items, percentages)
+    ])
+    feedings = insert(FeedingLog, generator.feedings(locations, feed_items))
+    entries, purchases = generator.purchases(feedings, feed_items)
+    movements = insert(FeedStockMovement, entries + [FeedStockMovement.for_feeding(log) for log in feedings])
+    counts['feeding_logs'], counts['stock_movements'] = len(feedings), len(movements)
+
+    counts['transactions'] = len(insert(FinancialTransaction, purchases + generator.transactions(herd, treatments)))
+    return counts
@@ -1,74 +1,153 @@
 from rest_framework import serializers
-from .models import User, Line, Location, Animal, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment, FinancialTransaction, FeedingLog, FeedInventory, FeedRation, RationComponent
+from datetime import date
+from django.db.models import Sum
+from .fieldsets import FieldsetSerializerMixin
+from .models import User, Line, Location, Animal, AnimalAncestor, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment, FinancialTransaction, FeedingLog, FeedInventory, FeedStockMovement, FeedRation, RationComponent
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
 
-class LineSerializer(serializers.ModelSerializer):
+class LineSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Line
         fields = ('id', 'name', 'description')
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = ('id', 'name', 'type', 'capacity', 'last_cleaned_date')
 
-class AnimalSerializer(serializers.ModelSerializer):
+class AnimalSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Animal
-        fields = ('id', 'unique_tag', 'birth_date', 'sex', 'status', 'line', 'sire', 'dam', 'location')
-
-class WeightLogSerializer(serializers.ModelSerializer):
+        fields = ('id', 'unique_tag', 'birth_date', 'sex', 'status', 'line', 'sire', 'dam', 'location', 'current_weight_kg', 'last_weighed_date', 'inbreeding_coefficient')
+        expandable = {'line': 'LineSerializer', 'sire': 'AnimalSerializer', 'dam': 'AnimalSerializer', 'location': 'LocationSerializer'}
+        read_only_fields = ('current_weight_kg', 'last_weighed_date', 'inbreeding_coefficient')
+
+    def to_representation(self, instance):
+        # Animals listed ?as_of= a date are shown with their status and location then
+        if hasattr(instance, 'status_as_of'):
+            instance.status, instance.location_id = instance.status_as_of, instance.location_as_of_id
+        return super().to_representation(instance)
+
+    def validate(self, data):
+        # An animal cannot be its own parent or descend from its own offspring
+        if self.instance:
+            for field in ('sire', 'dam'):
+                parent = data.get(field)
+                if parent is None:
+                    continue
+                if parent.pk == self.instance.pk:
+                    raise serializers.ValidationError({field: 'An animal cannot be its own parent.'})
+                if AnimalAncestor.objects.filter(animal=parent, ancestor=self.instance).exists():
+                    raise serializers.ValidationError({field: 'This animal is an ancestor of the selected parent.'})
+        return data
+
+class WeightLogSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = WeightLog
         fields = ('id', 'animal', 'log_date', 'weight_kg')
+        expandable = {'animal': 'AnimalSerializer'}
 
-class ReproductionEventSerializer(serializers.ModelSerializer):
+class ReproductionEventSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ReproductionEvent
         fields = ('id', 'female', 'male', 'mating_date', 'expected_birth_date', 'actual_birth_date', 'live_births', 'dead_births')
+        expandable = {'female': 'AnimalSerializer', 'male': 'AnimalSerializer'}
 
-class HealthLogSerializer(serializers.ModelSerializer):
+class HealthLogSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = HealthLog
         fields = ('id', 'animal', 'log_date', 'diagnosis', 'notes')
+        expandable = {'animal': 'AnimalSerializer'}
 
-class MedicationSerializer(serializers.ModelSerializer):
+class MedicationSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Medication
         fields = ('id', 'name', 'withdrawal_period_days')
 
-class TreatmentSerializer(serializers.ModelSerializer):
+class TreatmentSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Treatment
         fields = ('id', 'health_log', 'medication', 'dosage', 'withdrawal_end_date')
+        expandable = {'health_log': 'HealthLogSerializer', 'medication': 'MedicationSerializer'}
 
-class FinancialTransactionSerializer(serializers.ModelSerializer):
+class FinancialTransactionSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = FinancialTransaction
         fields = ('id', 'transaction_date', 'type', 'amount', 'description', 'related_entity_id')
 
-class FeedingLogSerializer(serializers.ModelSerializer):
+class FeedingLogSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = FeedingLog
-        fields = ('id', 'location', 'log_date', 'feed_type', 'quantity_kg')
+        fields = ('id', 'location', 'log_date', 'feed_type', 'feed_item', 'quantity_kg')
+        expandable = {'location': 'LocationSerializer'}
 
-class FeedInventorySerializer(serializers.ModelSerializer):
+class FeedInventorySerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = FeedInventory
-        fields = ('id', 'product_name', 'quantity_kg', 'cost_per_kg', 'supplier', 'entry_date')
+        fields = ('id', 'product_name', 'quantity_kg', 'cost_per_kg', 'supplier', 'entry_date', 'lead_time_days')
+
+    def to_representation(self, instance):
+        # quantity_kg is reported as the live ledger balance
+        data = super().to_representation(instance)
+        if 'quantity_kg' not in self.fields:
+            return data
+        balance = instance.balance_kg if hasattr(instance, 'balance_kg') else instance.current_balance()
+        data['quantity_kg'] = self.fields['quantity_kg'].to_representation(balance)
+        return data
+
+    def update(self, instance, validated_data):
+        # A new quantity is a stock count: record the difference as an adjustment
+        # instead of overwriting the compacted balance.
+        if 'quantity_kg' in validated_data:
+            counted = validated_data.pop('quantity_kg')
+            difference = counted - instance.current_balance()
+            if difference:
+                FeedStockMovement.objects.create(
+                    feed_item=instance, movement_date=date.today(), kind='Ajuste', quantity_kg=difference,
+                )
+        instance = super().update(instance, validated_data)
+        if hasattr(instance, 'balance_kg'):
+            del instance.balance_kg
+        return instance
+
+class FeedStockMovementSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
+    feed_item_name = serializers.ReadOnlyField(source='feed_item.product_name')
+
+    class Meta:
+        model = FeedStockMovement
+        fields = ('id', 'feed_item', 'feed_item_name', 'feeding_log', 'movement_date', 'kind', 'quantity_kg', 'compacted', 'created_at')
+        read_only_fields = ('feeding_log', 'compacted', 'created_at')
 
-class RationComponentSerializer(serializers.ModelSerializer):
+class RationComponentSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     feed_item_name = serializers.ReadOnlyField(source='feed_item.product_name')
 
     class Meta:
         model = RationComponent
         fields = ('id', 'feed_ration', 'feed_item', 'feed_item_name', 'percentage')
 
-class FeedRationSerializer(serializers.ModelSerializer):
+    def validate_percentage(self, value):
+        if not 0 < value <= 100:
+            raise serializers.ValidationError('Percentage must be greater than 0 and at most 100.')
+        return value
+
+    def validate(self, data):
+        # A ration's components may be entered one by one, so the total may be below 100% but never above it
+        feed_ration = data.get('feed_ration', getattr(self.instance, 'feed_ration', None))
+        percentage = data.get('percentage', getattr(self.instance, 'percentage', None))
+        if feed_ration is not None and percentage is not None:
+            others = RationComponent.objects.filter(feed_ration=feed_ration)
+            if self.instance is not None:
+                others = others.exclude(pk=self.instance.pk)
+            total = (others.aggregate(total=Sum('percentage'))['total'] or 0) + percentage
+            if total > 100:
+                raise serializers.ValidationError({'percentage': f'The components of {feed_ration.name} would add up to {total}%, above 100%.'})
+        return data
+
+class FeedRationSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     components = RationComponentSerializer(many=True, read_only=True, source='rationcomponent_set')
 
     class Meta:
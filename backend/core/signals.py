@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from .models import (
+    Line, Location, Animal, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment,
+    FinancialTransaction, FeedingLog, FeedInventory, FeedStockMovement, FeedRation, RationComponent,
+)
+from .versioning import bump_versions
+
+# Sent with the model class as sender for writes that bypass post_save/post_delete:
+# bulk_create, QuerySet.update() and QuerySet.delete() on models without delete receivers.
+# Bulk inserts pass the new instances as `created`.
+data_changed = Signal()
+
+# Models whose table versions are tracked from per-row signals. AnimalAncestor is
+# only written in bulk, and connecting delete receivers to it would disable
+# Django's fast deletes, so it is reported through data_changed instead.
+VERSIONED_MODELS = (
+    Line, Location, Animal, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment,
+    FinancialTransaction, FeedingLog, FeedInventory, FeedStockMovement, FeedRation, RationComponent,
+)
+
+
+def notify_bulk_write(*models, created=None):
+    for model in models:
+        data_changed.send(sender=model, created=created)
+
+
+def bump_on_write(sender, **kwargs):
+    bump_versions(sender)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_on_write, sender=model, dispatch_uid=f'bump_version_save_{model.__name__}')
+    post_delete.connect(bump_on_write, sender=model, dispatch_uid=f'bump_version_delete_{model.__name__}')
+
+
+@receiver(data_changed, dispatch_uid='bump_version_bulk')
+def bump_on_bulk_write(sender, **kwargs):
+    bump_versions(sender)
+
+
+@receiver(data_changed, dispatch_uid='animal_history_bulk_write')
+def sync_history_on_bulk_write(sender, created=None, **kwargs):
+    # Bulk writers pass the animals they added, placed or changed the status of as `created`
+    if sender is Animal and created:
+        from .history import sync_history
+
+        sync_history([animal.pk for animal in created])
@@ -1,3 +1,632 @@
+import gzip
+import io
+import json
+from base64 import b64encode
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .history import sync_history
+from .importer import file_checksum, import_herd
+from .ledger import compact_feed_ledger
+from .metrics import REGISTRY, query_shape, repeated_queries
+from .models import (
+    Animal, AnimalAncestor, AnimalHistory, FeedingLog, FeedInventory, FeedRation, FeedStockMovement, HealthLog, ImportCheckpoint, Line,
+    Location, Medication, RationComponent, Treatment, WeightLog,
+)
+from .pagination import KeysetPagination
+from .pedigree import Pedigree
+from .seeding import seed_herd
+
+
+class CurrentWeightTests(TestCase):
+    def current(self, animal):
+        return Animal.objects.filter(pk=animal.pk).values_list('current_weight_kg', 'last_weighed_date').get()
+
+    def test_current_weight_follows_weighing_edits(self):
+        first = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F')
+        second = Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='M')
+        client = APIClient()
+        response = client.post('/api/weightlogs/', {'animal': first.pk, 'log_date': '2024-03-01', 'weight_kg': '0.60'}, format='json')
+        latest = response.data['id']
+        older = WeightLog.objects.create(animal=first, log_date=date(2024, 2, 1), weight_kg='0.40')
+        self.assertEqual(self.current(first), (Decimal('0.60'), date(2024, 3, 1)))
+
+        # An older weighing moved past the latest one becomes current
+        client.patch(f'/api/weightlogs/{older.pk}/', {'log_date': '2024-04-01', 'weight_kg': '0.75'}, format='json')
+        self.assertEqual(self.current(first), (Decimal('0.75'), date(2024, 4, 1)))
+        # Moving it to another animal updates both
+        client.patch(f'/api/weightlogs/{older.pk}/', {'animal': second.pk}, format='json')
+        self.assertEqual(self.current(first), (Decimal('0.60'), date(2024, 3, 1)))
+        self.assertEqual(self.current(second), (Decimal('0.75'), date(2024, 4, 1)))
+
+        client.delete(f'/api/weightlogs/{latest}/')
+        self.assertEqual(self.current(first), (None, None))
+        response = client.get('/api/animals/?min_weight_kg=0.7')
+        self.assertEqual([row['unique_tag'] for row in response.data], ['C-002'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F')
+        # Shared dates: ties are broken by id
+        for day in (1, 1, 2, 3, 3, 3, 5):
+            WeightLog.objects.create(animal=animal, log_date=date(2024, 2, day), weight_kg='0.50')
+        self.expected = list(WeightLog.objects.order_by('-log_date', '-id').values_list('id', flat=True))
+        self.client = APIClient()
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages, response.data
+
+    def test_cursors_round_trip(self):
+        pages, last = self.walk('/api/weightlogs/?page_size=3&count=1', 'next')
+        self.assertEqual(pages, [self.expected[:3], self.expected[3:6], self.expected[6:]])
+        self.assertEqual(last['count'], 7)
+        # Walking back from the last page returns the same pages
+        back, first = self.walk(last['previous'], 'previous')
+        self.assertEqual(back, [self.expected[3:6], self.expected[:3]])
+        self.assertIsNotNone(first['next'])
+        # Without cursor or page_size the list is not paginated
+        self.assertEqual(sorted(row['id'] for row in self.client.get('/api/weightlogs/').data), sorted(self.expected))
+
+    def test_bad_cursors_are_not_found(self):
+        def cursor(value):
+            return b64encode(json.dumps(value).encode(), altchars=b'-_').decode()
+
+        for bad in ('not-a-cursor', cursor({'p': ['2024-02-03']}), cursor({'p': ['March', 1]}), cursor(['2024-02-03', 1])):
+            response = self.client.get(f'/api/weightlogs/?cursor={bad}')
+            self.assertEqual((response.status_code, response.data['detail']), (404, 'Invalid cursor'), bad)
+
+    def test_counts_a_queryset_known_to_be_empty(self):
+        self.assertEqual(KeysetPagination().get_count(WeightLog.objects.filter(id__in=[])), 0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        poza = Location.objects.create(name='Poza 1', capacity=10)
+        self.first = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', location=poza)
+        self.second = Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='M')
+        for animal, day, weight in ((self.first, 3, '0.60'), (self.second, 1, '0.55'), (self.first, 1, '0.50'), (self.first, 9, '0.70')):
+            WeightLog.objects.create(animal=animal, log_date=date(2024, 2, day), weight_kg=weight)
+        self.client = APIClient()
+
+    def export(self, query):
+        response = self.client.get(f'/api/weightlogs/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_and_ndjson_contents(self):
+        response, content = self.export('?start_date=2024-02-01&end_date=2024-02-05')
+        self.assertEqual((response['Content-Type'], response['Content-Disposition']), ('text/csv', 'attachment; filename="weight_logs.csv"'))
+        # Ordered by date, then id; the animal's tag and location come from the same query
+        rows = [line.split(',')[1:] for line in content.decode().splitlines()]
+        self.assertEqual(rows, [
+            ['log_date', 'animal_id', 'animal_tag', 'location', 'weight_kg'],
+            ['2024-02-01', str(self.second.pk), 'C-002', '', '0.55'],
+            ['2024-02-01', str(self.first.pk), 'C-001', 'Poza 1', '0.50'],
+            ['2024-02-03', str(self.first.pk), 'C-001', 'Poza 1', '0.60'],
+        ])
+
+        response, content = self.export(f'?output=ndjson&animal_id={self.first.pk}&start_date=2024-02-02')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([(record['log_date'], record['weight_kg']) for record in records], [('2024-02-03', '0.60'), ('2024-02-09', '0.70')])
+
+    def test_gzip_and_errors(self):
+        _, plain = self.export('?output=ndjson')
+        response, compressed = self.export('?output=ndjson&gzip=1')
+        self.assertEqual((response['Content-Type'], response['Content-Disposition']), ('application/gzip', 'attachment; filename="weight_logs.ndjson.gz"'))
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+        for query, error in (
+            ('?output=xml', 'output must be one of: csv, ndjson.'),
+            ('?start_date=February', 'Invalid date format. Use YYYY-MM-DD.'),
+            ('?animal_id=C-001', 'animal_id must be an integer ID.'),
+        ):
+            response = self.client.get(f'/api/weightlogs/export/{query}')
+            self.assertEqual((response.status_code, response.data), (400, {'error': error}))
+
+
+class WeighingSessionTests(TestCase):
+    def setUp(self):
+        # Fifty days old on the weigh day: one age cohort
+        for number in range(6):
+            Animal.objects.create(unique_tag=f'C-00{number}', birth_date=date(2024, 1, 1), sex='F')
+        for tag, previous_date, previous_weight in (('A-1', date(2024, 2, 10), '0.80'), ('A-2', date(2024, 2, 15), '0.40')):
+            animal = Animal.objects.create(unique_tag=tag, birth_date=date(2023, 10, 1), sex='M')
+            WeightLog.objects.create(animal=animal, log_date=previous_date, weight_kg=previous_weight)
+        self.entries = [
+            {'unique_tag': f'C-00{number}', 'weight_kg': weight}
+            for number, weight in enumerate(['0.50', '0.52', '0.51', '0.49', '0.50', '1.40'])
+        ] + [
+            {'unique_tag': 'A-1', 'weight_kg': '0.55'},
+            {'unique_tag': 'A-2', 'weight_kg': '0.90'},
+            {'unique_tag': 'C-000', 'weight_kg': '0.50'},
+            {'unique_tag': 'C-999', 'weight_kg': '0.50'},
+            {'unique_tag': 'C-001', 'weight_kg': '-1'},
+        ]
+
+    def session(self, **options):
+        response = APIClient().post('/api/weightlogs/weighing-session/', {'log_date': '2024-02-20', 'entries': self.entries, **options}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_outliers_are_flagged(self):
+        data = self.session()
+        self.assertEqual(data['summary'], {'created': 5, 'flagged': 3, 'skipped': 0, 'error': 3})
+        results = data['results']
+        self.assertEqual([result['status'] for result in results[:6]], ['created'] * 5 + ['flagged'])
+        self.assertTrue(results[5]['flags'][0].startswith('Outlier for its age cohort (median 0.51 kg'))
+        self.assertEqual(results[6]['flags'], ['Dropped more than 20% from the previous weight (0.80 kg).'])
+        self.assertEqual(results[7]['flags'], ['Gained more than 0.05 kg/day since the previous weight (0.40 kg on 2024-02-15).'])
+        self.assertEqual([result['errors'] for result in results[8:]], [
+            ['Duplicate weighing for this animal and date in the session.'], ['Animal not found.'],
+            ['weight_kg must be a positive number below 1000.'],
+        ])
+        # Flagged weighings are still recorded
+        self.assertEqual(Animal.objects.get(unique_tag='C-005').current_weight_kg, Decimal('1.40'))
+
+    def test_flagged_weighings_can_be_skipped(self):
+        data = self.session(skip_flagged=True)
+        self.assertEqual(data['summary'], {'created': 5, 'flagged': 0, 'skipped': 3, 'error': 3})
+        self.assertEqual(WeightLog.objects.filter(log_date=date(2024, 2, 20)).count(), 5)
+        self.assertEqual(Animal.objects.get(unique_tag='A-1').current_weight_kg, Decimal('0.80'))
+
+    def test_weighings_are_checked_in_date_order(self):
+        animal = Animal.objects.get(unique_tag='A-1')
+        WeightLog.objects.create(animal=animal, log_date=date(2024, 2, 1), weight_kg='0.50')
+        WeightLog.objects.create(animal=animal, log_date=date(2024, 2, 20), weight_kg='1.00')
+        self.entries = [
+            # Backdated between two stored weighings: compared with 0.80 kg on 2024-02-10, not the latest 1.00 kg
+            {'unique_tag': 'A-1', 'weight_kg': '0.78', 'log_date': '2024-02-15'},
+            # Later rows in the session are compared with the earlier ones
+            {'unique_tag': 'A-1', 'weight_kg': '1.60', 'log_date': '2024-02-23'},
+            {'unique_tag': 'A-1', 'weight_kg': '1.05', 'log_date': '2024-02-21'},
+            {'unique_tag': 'A-2', 'weight_kg': '0.30', 'log_date': '2023-09-01'},
+        ]
+        results = self.session()['results']
+        self.assertEqual([result['flags'] for result in results[:3]], [
+            [],
+            ['Gained more than 0.05 kg/day since the previous weight (1.05 kg on 2024-02-21).'],
+            [],
+        ])
+        self.assertEqual(results[3]['errors'], ["log_date is before the animal's birth date (2023-10-01)."])
+
+
+class PedigreeTests(TestCase):
+    def animal(self, tag, sex, sire=None, dam=None):
+        return Animal.objects.create(unique_tag=tag, birth_date=date(2024, 1, 1), sex=sex, sire=sire, dam=dam)
+
+    def ancestors(self, animal):
+        return dict(AnimalAncestor.objects.filter(animal=animal).values_list('ancestor__unique_tag', 'depth'))
+
+    def setUp(self):
+        self.sire, self.dam, self.other_dam = self.animal('S', 'M'), self.animal('D', 'F'), self.animal('D2', 'F')
+        self.brother = self.animal('A', 'M', self.sire, self.dam)
+        self.sister = self.animal('B', 'F', self.sire, self.dam)
+        self.half_sister = self.animal('C', 'F', self.sire, self.other_dam)
+
+    def test_inbreeding_of_related_matings(self):
+        full_sibs = self.animal('X', 'M', self.brother, self.sister)
+        half_sibs = self.animal('Y', 'M', self.brother, self.half_sister)
+        self.assertEqual(full_sibs.inbreeding_coefficient, Decimal('0.250000'))
+        self.assertEqual(half_sibs.inbreeding_coefficient, Decimal('0.125000'))
+        self.assertEqual(Animal.objects.get(pk=self.brother.pk).inbreeding_coefficient, Decimal('0'))
+
+        pedigree = Pedigree.load([self.sire.pk, self.sister.pk, self.brother.pk, self.half_sister.pk])
+        # Parent and offspring
+        self.assertEqual(pedigree.coancestry(self.sire.pk, self.sister.pk), 0.25)
+        self.assertEqual(pedigree.coancestry(self.brother.pk, self.sister.pk), 0.25)
+        self.assertEqual(pedigree.coancestry(self.brother.pk, self.half_sister.pk), 0.125)
+        self.assertEqual(pedigree.coancestry(self.sire.pk, self.other_dam.pk), 0.0)
+
+    def test_ancestors_follow_parent_changes(self):
+        outsider = self.animal('M2', 'M')
+        child = self.animal('X', 'M', self.brother, self.sister)
+        grandchild = self.animal('Z', 'F', child, self.half_sister)
+        self.assertEqual(self.ancestors(child), {'A': 1, 'B': 1, 'S': 2, 'D': 2})
+        self.assertEqual(self.ancestors(grandchild), {'X': 1, 'C': 1, 'A': 2, 'B': 2, 'S': 2, 'D': 3, 'D2': 2})
+
+        # A new sire rebuilds the animal and its descendants
+        child.sire = outsider
+        child.save()
+        self.assertEqual(child.inbreeding_coefficient, Decimal('0'))
+        self.assertEqual(self.ancestors(child), {'M2': 1, 'B': 1, 'S': 2, 'D': 2})
+        self.assertEqual(self.ancestors(grandchild), {'X': 1, 'C': 1, 'M2': 2, 'B': 2, 'S': 2, 'D': 3, 'D2': 2})
+
+        # Deleting a parent drops it and its line from the offspring
+        self.sister.delete()
+        self.assertEqual(self.ancestors(child), {'M2': 1})
+        self.assertEqual(self.ancestors(grandchild), {'X': 1, 'C': 1, 'M2': 2, 'S': 2, 'D2': 2})
+
+    def test_parents_cannot_form_a_cycle(self):
+        child = self.animal('X', 'M', self.brother, self.sister)
+        client = APIClient()
+        response = client.patch(f'/api/animals/{self.sire.pk}/', {'sire': child.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['sire'], ['This animal is an ancestor of the selected parent.'])
+        response = client.patch(f'/api/animals/{self.dam.pk}/', {'dam': self.dam.pk}, format='json')
+        self.assertEqual(response.data['dam'], ['An animal cannot be its own parent.'])
+        self.assertEqual(Animal.objects.get(pk=self.sire.pk).sire_id, None)
+
+
+def csv_file(*lines):
+    return io.BytesIO('\n'.join(lines).encode())
+
+
+class ImporterTests(TestCase):
+    # Offspring listed before their parents, which are linked in a second pass
+    ANIMALS = (
+        'unique_tag,birth_date,sex,line,location,sire,dam',
+        'C-3,2024-03-01,F,Peru,Poza 1,C-1,C-2',
+        'C-1,2023-10-01,M,Peru,Poza 1,,',
+        'C-2,2023-10-01,F,Peru,Poza 1,,',
+    )
+
+    def herd_files(self):
+        return {
+            'lines': csv_file('name,description', 'Peru,Carne'),
+            'locations': csv_file('name,type,capacity', 'Poza 1,Poza,20'),
+            'animals': csv_file(*self.ANIMALS),
+            'weights': csv_file('unique_tag,log_date,weight_kg', 'C-3,2024-04-01,0.45', 'C-3,2024-05-01,0.80', 'C-1,2024-05-01,1.20'),
+            'feedings': csv_file('location,log_date,feed_type,quantity_kg', 'Poza 1,2024-05-01,Alfalfa,12.5', 'Poza 1,2024-05-01,Pasto,4'),
+        }
+
+    def setUp(self):
+        self.alfalfa = FeedInventory.objects.create(product_name='Alfalfa', quantity_kg=Decimal('100.00'), cost_per_kg=Decimal('1.50'))
+
+    def test_import_links_parents_and_derived_data(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            results, errors = import_herd(self.herd_files(), batch_size=2)
+        self.assertEqual(errors, {})
+        self.assertEqual(results['animals'], {'rows': 3, 'created': 3, 'skipped': 0, 'resumed_from': 0, 'linked': 1, 'status': 'imported'})
+
+        child = Animal.objects.get(unique_tag='C-3')
+        self.assertEqual((child.sire.unique_tag, child.dam.unique_tag, child.line.name), ('C-1', 'C-2', 'Peru'))
+        self.assertEqual(set(AnimalAncestor.objects.filter(animal=child).values_list('ancestor__unique_tag', flat=True)), {'C-1', 'C-2'})
+        # Weighings refresh the current weight
+        self.assertEqual((child.current_weight_kg, child.last_weighed_date), (Decimal('0.80'), date(2024, 5, 1)))
+        # Feedings of a known product post to its ledger; others are only logged
+        self.assertEqual(FeedingLog.objects.count(), 2)
+        self.assertEqual(
+            list(FeedStockMovement.objects.values_list('feed_item', 'kind', 'quantity_kg')),
+            [(self.alfalfa.pk, 'Consumo', Decimal('-12.50'))],
+        )
+
+        # Importing the same files again is a no-op
+        results, errors = import_herd(self.herd_files())
+        self.assertEqual({kind: result['status'] for kind, result in results.items()}, dict.fromkeys(results, 'already imported'))
+        self.assertEqual(Animal.objects.count(), 3)
+
+    def test_invalid_files_and_dry_runs_write_nothing(self):
+        files = self.herd_files()
+        files['animals'] = csv_file(*self.ANIMALS, 'C-1,2023-10-01,M,Peru,Poza 1,,', 'C-4,2024-03-01,F,Peru,Poza 1,C-9,')
+        files['weights'] = csv_file('unique_tag,weight_kg', 'C-3,0.45')
+        results, errors = import_herd(files)
+        self.assertEqual((results['animals'], results['lines']), ({'status': 'invalid'}, {'status': 'valid'}))
+        self.assertEqual(errors['animals'], {'count': 2, 'rows': {5: ["Duplicate 'C-1' in the file."], 6: ["sire 'C-9' not found."]}})
+        self.assertEqual(errors['weights']['rows'], {1: ['Missing columns: log_date.']})
+
+        results, errors = import_herd(self.herd_files(), dry_run=True)
+        self.assertEqual((errors, set(result['status'] for result in results.values())), ({}, {'valid'}))
+        self.assertFalse(Line.objects.exists() or Animal.objects.exists() or WeightLog.objects.exists() or ImportCheckpoint.objects.exists())
+
+    def test_interrupted_import_resumes_after_its_checkpoint(self):
+        files = self.herd_files()
+        import_herd({kind: files[kind] for kind in ('lines', 'locations')})
+        # A first run committed the batch of the first two rows, then stopped
+        line, location = Line.objects.get(), Location.objects.get()
+        for tag, birth_date, sex in (('C-3', date(2024, 3, 1), 'F'), ('C-1', date(2023, 10, 1), 'M')):
+            Animal.objects.create(unique_tag=tag, birth_date=birth_date, sex=sex, line=line, location=location)
+        ImportCheckpoint.objects.create(kind='animals', checksum=file_checksum(files['animals']), rows_imported=2)
+
+        results, errors = import_herd({'animals': files['animals']}, batch_size=2)
+        self.assertEqual(results['animals'], {'rows': 3, 'created': 1, 'skipped': 0, 'resumed_from': 2, 'linked': 1, 'status': 'imported'})
+        # Parents named by the rows committed before the interruption are still linked
+        self.assertEqual(Animal.objects.get(unique_tag='C-3').dam.unique_tag, 'C-2')
+        results, _ = import_herd({'animals': files['animals']})
+        self.assertEqual(results['animals'], {'rows': 3, 'created': 0, 'skipped': 0, 'resumed_from': 3, 'status': 'already imported'})
+
+
+class TreatmentBatchTests(TestCase):
+    def setUp(self):
+        self.poza = Location.objects.create(name='Poza 1', capacity=10)
+        self.medication = Medication.objects.create(name='Ivermectina', withdrawal_period_days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.animals = [
+                Animal.objects.create(unique_tag=f'C-00{number}', birth_date=date(2024, 1, 1), sex='F', location=self.poza, status=status)
+                for number, status in enumerate(['Active', 'Pregnant', 'Sold'])
+            ]
+            self.elsewhere = Animal.objects.create(unique_tag='C-100', birth_date=date(2024, 1, 1), sex='M')
+        self.client = APIClient()
+
+    def batch(self, **data):
+        payload = {'medication': self.medication.pk, 'dosage': '0.2 ml', 'log_date': '2024-05-01', 'diagnosis': 'Sarna', **data}
+        return self.client.post('/api/treatments/batch/', payload, format='json')
+
+    def test_location_batch_treats_and_quarantines(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.batch(location=self.poza.pk, status='In Quarantine', notes='Toda la poza')
+        self.assertEqual(response.status_code, 201)
+        # Animals that left the herd are not treated
+        treated = [animal.pk for animal in self.animals[:2]]
+        self.assertEqual((response.data['animals'], response.data['status']), (2, 'In Quarantine'))
+        self.assertEqual(
+            sorted(Treatment.objects.values_list('health_log__animal', 'withdrawal_end_date', 'dosage')),
+            [(pk, date(2024, 5, 11), '0.2 ml') for pk in treated],
+        )
+        self.assertEqual(set(HealthLog.objects.values_list('diagnosis', 'notes', 'log_date')), {('Sarna', 'Toda la poza', date(2024, 5, 1))})
+        self.assertEqual(
+            dict(Animal.objects.values_list('unique_tag', 'status')),
+            {'C-000': 'In Quarantine', 'C-001': 'In Quarantine', 'C-002': 'Sold', 'C-100': 'Active'},
+        )
+        # The status change is recorded in the animals' history
+        open_rows = AnimalHistory.objects.filter(valid_to__isnull=True, animal__in=treated)
+        self.assertEqual(set(open_rows.values_list('status', 'valid_from')), {('In Quarantine', date.today())})
+
+    def test_animal_batches_and_errors(self):
+        response = self.batch(animals=[self.elsewhere.pk, self.elsewhere.pk])
+        self.assertEqual((response.status_code, response.data['animals'], response.data['status']), (201, 1, None))
+        self.assertEqual(Animal.objects.get(pk=self.elsewhere.pk).status, 'Active')
+
+        response = self.batch(animals=[self.elsewhere.pk, 999])
+        self.assertEqual((response.status_code, response.data['missing']), (400, [999]))
+        self.assertEqual(self.batch(location=self.poza.pk, status='Sold').status_code, 400)
+        self.assertEqual(self.batch(location=self.poza.pk, animals=[self.elsewhere.pk]).status_code, 400)
+        self.assertEqual(self.batch(location=self.poza.pk, medication=999).status_code, 404)
+        self.assertEqual(Treatment.objects.count(), 1)
+
+
+class FieldsetTests(TestCase):
+    def setUp(self):
+        poza = Location.objects.create(name='Poza 1', type='Poza', capacity=10)
+        line = Line.objects.create(name='Peru')
+        sire = Animal.objects.create(unique_tag='C-001', birth_date=date(2023, 1, 1), sex='M', line=line, location=poza)
+        self.animal = Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='F', line=line, location=poza, sire=sire)
+        WeightLog.objects.create(animal=self.animal, log_date=date(2024, 2, 1), weight_kg='0.50')
+        self.client = APIClient()
+
+    def get(self, url):
+        """The response and the SQL of the query reading the listed rows."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        reads = [query['sql'] for query in captured.captured_queries if 'core_tableversion' not in query['sql']]
+        self.assertEqual(len(reads), 1, reads)
+        return response.data, reads[0]
+
+    def test_fields_trim_the_columns(self):
+        data, sql = self.get(f'/api/animals/{self.animal.pk}/?fields=id,unique_tag')
+        self.assertEqual(data, {'id': self.animal.pk, 'unique_tag': 'C-002'})
+        self.assertNotIn('birth_date', sql)
+        self.assertNotIn('inbreeding_coefficient', sql)
+
+    def test_expanded_relations_are_joined(self):
+        data, sql = self.get('/api/animals/?fields=unique_tag,location.name,sire.unique_tag&expand=line')
+        rows = {row['unique_tag']: row for row in data}
+        self.assertEqual(rows['C-002'], {
+            'unique_tag': 'C-002', 'location': {'name': 'Poza 1'}, 'sire': {'unique_tag': 'C-001'},
+            'line': {'id': self.animal.line_id, 'name': 'Peru', 'description': None},
+        })
+        self.assertIsNone(rows['C-001']['sire'])
+        self.assertIn('JOIN "core_location"', sql)
+        self.assertNotIn('capacity', sql)
+
+        # Nested two levels deep, still in one query
+        data, sql = self.get('/api/weightlogs/?fields=weight_kg,animal.unique_tag,animal.location.type')
+        self.assertEqual(data, [{'weight_kg': '0.50', 'animal': {'unique_tag': 'C-002', 'location': {'type': 'Poza'}}}])
+        self.assertNotIn('last_cleaned_date', sql)
+
+    def test_unknown_fields_and_relations(self):
+        response = self.client.get('/api/animals/?fields=id,color')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['error'].startswith('Unknown fields: color.'))
+        response = self.client.get('/api/animals/?expand=sex')
+        self.assertEqual(response.data['error'], 'Cannot expand sex. Expandable: line, sire, dam, location.')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location = Location.objects.create(name='Poza 1', capacity=10)
+            Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', location=self.location)
+
+    def assert_revalidates(self, url, write):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        # Only the table versions are read
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_viewset_list_and_retrieve(self):
+        self.assert_revalidates('/api/animals/', lambda: Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='M'))
+        self.assert_revalidates(f'/api/locations/{self.location.id}/', self.location.save)
+        # Expanded relations are part of the response, so their tables are too
+        self.assert_revalidates('/api/animals/?expand=location', lambda: Location.objects.create(name='Poza 2', capacity=10))
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        REGISTRY.reset()
+
+    def test_query_shapes(self):
+        self.assertEqual(
+            query_shape('SELECT "core_animal"."id" FROM "core_animal" WHERE ("core_animal"."id" IN (%s, %s, %s) AND "core_animal"."sex" = \'F\' AND "core_animal"."status" = 3)'),
+            'SELECT "core_animal"."id" FROM "core_animal" WHERE ("core_animal"."id" IN (%s...) AND "core_animal"."sex" = %s AND "core_animal"."status" = %s)',
+        )
+        queries = [('SELECT * FROM "core_line" WHERE "id" = 1', 0.001)] * 3 + [('SELECT * FROM "core_line" WHERE "id" = 2', 0.001), ('SELECT 1', 0.002)]
+        self.assertEqual(repeated_queries(queries, 3), {'SELECT * FROM "core_line" WHERE "id" = %s': 4})
+        self.assertEqual(repeated_queries(queries, 4), {})
+
+    def test_metrics_endpoint(self):
+        client = APIClient()
+        Location.objects.create(name='Poza 1', capacity=10)
+        client.get('/api/locations/')
+        client.get('/api/locations/')
+        client.get('/api/animals/?min_weight_kg=heavy')
+
+        response = client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('cuypro_http_requests_total{view="location-list",method="GET",status="200"} 2', text)
+        self.assertIn('cuypro_http_requests_total{view="animal-list",method="GET",status="400"} 1', text)
+        self.assertIn('cuypro_http_request_duration_seconds_count{view="location-list",method="GET"} 2', text)
+        self.assertIn('cuypro_db_queries_per_request_bucket{view="location-list",method="GET",le="+Inf"} 2', text)
+        self.assertIn('cuypro_n_plus_one_requests_total{view="location-list",method="GET"} 0', text)
+
+
+class FeedLedgerTests(TestCase):
+    def setUp(self):
+        self.location = Location.objects.create(name='Poza 1', capacity=10)
+        self.item = FeedInventory.objects.create(product_name='Alfalfa', quantity_kg=Decimal('100.00'), cost_per_kg=Decimal('1.50'))
+
+    def test_compaction_folds_each_movement_once(self):
+        FeedingLog.objects.create(location=self.location, feed_item=self.item, feed_type='Alfalfa', quantity_kg=Decimal('10.00'), log_date=date(2024, 1, 1))
+        FeedStockMovement.objects.create(feed_item=self.item, movement_date=date(2024, 1, 2), kind='Entrada', quantity_kg=Decimal('25.00'))
+        self.assertEqual(compact_feed_ledger(batch_size=1), 2)
+        # A second run finds nothing left to fold
+        self.assertEqual(compact_feed_ledger(), 0)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity_kg, Decimal('115.00'))
+        self.assertEqual(self.item.current_balance(), Decimal('115.00'))
+
+    def test_redating_a_feeding_moves_its_consumption(self):
+        feeding = FeedingLog.objects.create(location=self.location, feed_item=self.item, feed_type='Alfalfa', quantity_kg=Decimal('10.00'), log_date=date(2024, 1, 1))
+        feeding.log_date = date(2024, 1, 5)
+        feeding.save()
+        movements = FeedStockMovement.objects.order_by('id').values_list('kind', 'movement_date', 'quantity_kg')
+        self.assertEqual(list(movements), [
+            ('Consumo', date(2024, 1, 1), Decimal('-10.00')),
+            ('Ajuste', date(2024, 1, 1), Decimal('10.00')),
+            ('Consumo', date(2024, 1, 5), Decimal('-10.00')),
+        ])
+        self.assertEqual(self.item.current_balance(), Decimal('90.00'))
+
+    def test_saving_a_stale_copy_keeps_the_compacted_balance(self):
+        stale = FeedInventory.objects.get(pk=self.item.pk)
+        FeedStockMovement.objects.create(feed_item=self.item, movement_date=date(2024, 1, 2), kind='Entrada', quantity_kg=Decimal('25.00'))
+        compact_feed_ledger()
+        stale.cost_per_kg = Decimal('1.80')
+        stale.save()
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity_kg, self.item.cost_per_kg), (Decimal('125.00'), Decimal('1.80')))
+
+    def test_patch_records_stock_counts_as_adjustments(self):
+        client = APIClient()
+        url = f'/api/feedinventory/{self.item.pk}/'
+        response = client.patch(url, {'cost_per_kg': '1.70'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(FeedStockMovement.objects.exists())
+
+        response = client.patch(url, {'quantity_kg': '90.00'}, format='json')
+        self.assertEqual(response.data['quantity_kg'], '90.00')
+        self.assertEqual(list(FeedStockMovement.objects.values_list('kind', 'quantity_kg')), [('Ajuste', Decimal('-10.00'))])
+        compact_feed_ledger()
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity_kg, self.item.cost_per_kg), (Decimal('90.00'), Decimal('1.70')))
+
+
+class RationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alfalfa = FeedInventory.objects.create(product_name='Alfalfa', quantity_kg=500, cost_per_kg='1.20')
+        self.concentrate = FeedInventory.objects.create(product_name='Concentrado', quantity_kg=200, cost_per_kg='2.50')
+        self.ration = FeedRation.objects.create(name='Engorde')
+        RationComponent.objects.create(feed_ration=self.ration, feed_item=self.alfalfa, percentage=80)
+        RationComponent.objects.create(feed_ration=self.ration, feed_item=self.concentrate, percentage=20)
+        self.partial = FeedRation.objects.create(name='Prueba')
+        RationComponent.objects.create(feed_ration=self.partial, feed_item=self.alfalfa, percentage=60)
+
+    def test_components_cannot_exceed_100_percent(self):
+        response = self.client.post('/api/rationcomponents/', {'feed_ration': self.ration.id, 'feed_item': self.alfalfa.id, 'percentage': '5'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('percentage', response.data)
+        response = self.client.post('/api/rationcomponents/', {'feed_ration': self.partial.id, 'feed_item': self.concentrate.id, 'percentage': '40'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_rations_are_listed_without_n_plus_one(self):
+        # Table versions, rations and their components with the feed items
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/feedrations/')
+        self.assertEqual(response.data[0]['components'][0]['feed_item_name'], 'Alfalfa')
+
+
+class AnimalHistoryTests(TestCase):
+    def test_herd_as_of_a_date(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            poza_1 = Location.objects.create(name='Poza 1', capacity=10)
+            poza_2 = Location.objects.create(name='Poza 2', capacity=10)
+            animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', location=poza_1)
+            Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 5, 1), sex='M', location=poza_2)
+            # Moved on March 1 and sold on June 1, recorded as bulk writes on those days
+            Animal.objects.filter(pk=animal.pk).update(location=poza_2)
+            sync_history([animal.pk], today=date(2024, 3, 1))
+            Animal.objects.filter(pk=animal.pk).update(status='Sold')
+            sync_history([animal.pk], today=date(2024, 6, 1))
+        self.assertEqual(
+            list(AnimalHistory.objects.filter(animal=animal).values_list('status', 'location', 'valid_from', 'valid_to')),
+            [('Active', poza_1.id, date(2024, 1, 1), date(2024, 3, 1)), ('Active', poza_2.id, date(2024, 3, 1), date(2024, 6, 1)),
+             ('Sold', poza_2.id, date(2024, 6, 1), None)],
+        )
+
+        client = APIClient()
+        # The herd is rebuilt from the history in one query
+        with self.assertNumQueries(2):
+            response = client.get('/api/animals/?as_of=2024-02-01')
+        self.assertEqual([(row['unique_tag'], row['status'], row['location']) for row in response.data], [('C-001', 'Active', poza_1.id)])
+        response = client.get('/api/animals/?as_of=2024-05-15')
+        self.assertEqual(sorted((row['unique_tag'], row['status'], row['location']) for row in response.data), [('C-001', 'Active', poza_2.id), ('C-002', 'Active', poza_2.id)])
+        self.assertEqual(client.get('/api/animals/?as_of=2023-12-31').data, [])
+        self.assertEqual(client.get('/api/animals/?as_of=March').status_code, 400)
+
+        def density_on(day):
+            return [row['current_animals'] for row in client.get(f'/api/reports/density-report/?as_of={day}').data]
+        self.assertEqual(density_on('2024-02-01'), [1, 0])
+        self.assertEqual(density_on('2024-05-15'), [0, 2])
+        self.assertEqual(density_on('2024-06-01'), [0, 1])
+
+    def test_same_day_changes_replace_the_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            animal = Animal.objects.create(unique_tag='C-001', birth_date=date.today(), sex='F')
+            animal.status = 'Sick'
+            animal.save()
+            # Saves that leave status and location alone write no history
+            animal.save()
+        self.assertEqual(list(AnimalHistory.objects.values_list('status', 'valid_from', 'valid_to')), [('Sick', date.today(), None)])
+
+    def test_seeded_history_follows_the_fates(self):
+        today = date(2025, 6, 1)
+        seed_herd(60, 2, 2, today=today)
+        # Written with the herd: placing it does not reopen any interval
+        self.assertEqual(AnimalHistory.objects.filter(valid_to__isnull=True).count(), Animal.objects.count())
+        self.assertEqual(sync_history(Animal.objects.values_list('id', flat=True), today=today), 0)
 
-# Create your tests here.
+        sold = Animal.objects.filter(status='Sold').first()
+        active, final = AnimalHistory.objects.filter(animal=sold).order_by('valid_from')
+        self.assertEqual((active.status, active.valid_from, final.status, final.valid_to), ('Active', sold.birth_date, 'Sold', None))
+        self.assertIsNotNone(active.location_id)
+        self.assertEqual(active.valid_to, final.valid_from)
+        # Sold animals are counted where they were while in the herd
+        self.assertIn(sold.id, Animal.objects.as_of(active.valid_from).values_list('id', flat=True))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.db import transaction
+from .history import sync_history
+from .models import Animal, HealthLog, Treatment
+from .signals import notify_bulk_write
+
+
+def treat_animals(animal_ids, medication, dosage, log_date, diagnosis, notes=None, new_status=None):
+    """
+    Records one health log and one treatment per animal in a single transaction,
+    e.g. when a whole location is dewormed. Withdrawal end dates are computed
+    here as Treatment.save() would, and the rows are inserted with bulk_create.
+    Optionally sets the animals' status too. Returns the created treatments.
+    """
+    withdrawal_end_date = None
+    if medication:
+        withdrawal_end_date = log_date + timedelta(days=medication.withdrawal_period_days)
+
+    with transaction.atomic():
+        health_logs = HealthLog.objects.bulk_create([
+            HealthLog(animal_id=animal_id, log_date=log_date, diagnosis=diagnosis, notes=notes)
+            for animal_id in animal_ids
+        ])
+        treatments = Treatment.objects.bulk_create([
+            Treatment(health_log=health_log, medication=medication, dosage=dosage, withdrawal_end_date=withdrawal_end_date)
+            for health_log in health_logs
+        ])
+        if new_status:
+            Animal.objects.filter(id__in=animal_ids).update(status=new_status)
+            sync_history(animal_ids)
+            notify_bulk_write(Animal)
+        notify_bulk_write(HealthLog)
+        notify_bulk_write(Treatment, created=treatments)
+    return treatments
@@ -1,4 +1,4 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework import routers
 from . import views
 
@@ -15,9 +15,13 @@ router.register(r'treatments', views.TreatmentViewSet)
 router.register(r'financialtransactions', views.FinancialTransactionViewSet)
 router.register(r'feedinglogs', views.FeedingLogViewSet)
 router.register(r'feedinventory', views.FeedInventoryViewSet)
+router.register(r'feedmovements', views.FeedStockMovementViewSet)
 router.register(r'feedrations', views.FeedRationViewSet)
 router.register(r'rationcomponents', views.RationComponentViewSet)
 
 urlpatterns = [
+    path('import/', views.HerdImportView.as_view(), name='herd-import'),
+    # Scrapers usually ask for /api/metrics without the trailing slash
+    re_path(r'^metrics/?$', views.MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
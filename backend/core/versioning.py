@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import TableVersion
+
+
+def table_label(model):
+    return model._meta.label_lower
+
+
+def bump_versions(*models):
+    """
+    Increments the change counter of each model's table once the current
+    transaction commits, so writers never hold the counter row for long.
+    """
+    labels = {table_label(model) for model in models}
+    transaction.on_commit(lambda: _bump(labels))
+
+
+def _bump(labels):
+    now = timezone.now()
+    for label in labels:
+        updated = TableVersion.objects.filter(table=label).update(version=F('version') + 1, last_modified=now)
+        if not updated:
+            _, created = TableVersion.objects.get_or_create(table=label, defaults={'version': 1, 'last_modified': now})
+            if not created:
+                TableVersion.objects.filter(table=label).update(version=F('version') + 1, last_modified=now)
+
+
+def get_versions(models):
+    """Returns {table label: (version, last_modified)} for the given models in one query."""
+    labels = sorted({table_label(model) for model in models})
+    versions = {label: (0, None) for label in labels}
+    for label, version, last_modified in TableVersion.objects.filter(table__in=labels).values_list('table', 'version', 'last_modified'):
+        versions[label] = (version, last_modified)
+    return versions
@@ -1,23 +1,69 @@
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import User, Line, Location, Animal, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment, FinancialTransaction, FeedingLog, FeedInventory, FeedRation, RationComponent
-from .serializers import UserSerializer, LineSerializer, LocationSerializer, AnimalSerializer, WeightLogSerializer, ReproductionEventSerializer, HealthLogSerializer, MedicationSerializer, TreatmentSerializer, FinancialTransactionSerializer, FeedingLogSerializer, FeedInventorySerializer, FeedRationSerializer, RationComponentSerializer
+from rest_framework.views import APIView
+from django.db.models import Prefetch
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from .models import User, Line, Location, Animal, WeightLog, ReproductionEvent, HealthLog, Medication, Treatment, FinancialTransaction, FeedingLog, FeedInventory, FeedStockMovement, FeedRation, RationComponent
+from .conditional import ConditionalGetMixin
+from .exports import Export, ExportMixin
+from .fieldsets import FieldsetMixin
+from .importer import IMPORTERS, import_herd
+from .ledger import record_feedings
+from .metrics import REGISTRY
+from .treatments import treat_animals
+from .weighing import record_weighing_session
+from .serializers import UserSerializer, LineSerializer, LocationSerializer, AnimalSerializer, WeightLogSerializer, ReproductionEventSerializer, HealthLogSerializer, MedicationSerializer, TreatmentSerializer, FinancialTransactionSerializer, FeedingLogSerializer, FeedInventorySerializer, FeedStockMovementSerializer, FeedRationSerializer, RationComponentSerializer
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FieldsetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
-class LineViewSet(viewsets.ModelViewSet):
+class LineViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = Line.objects.all()
     serializer_class = LineSerializer
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
 
-class AnimalViewSet(viewsets.ModelViewSet):
+class AnimalViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = Animal.objects.all()
     serializer_class = AnimalSerializer
+    keyset_ordering = ('unique_tag',)
+
+    def get_queryset(self):
+        # Filters on the denormalized current weight and inbreeding coefficient, e.g. ?min_weight_kg=0.8&last_weighed_before=2024-01-31
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        try:
+            if params.get('min_weight_kg'):
+                queryset = queryset.filter(current_weight_kg__gte=Decimal(params['min_weight_kg']))
+            if params.get('max_weight_kg'):
+                queryset = queryset.filter(current_weight_kg__lte=Decimal(params['max_weight_kg']))
+            if params.get('min_inbreeding'):
+                queryset = queryset.filter(inbreeding_coefficient__gte=Decimal(params['min_inbreeding']))
+            if params.get('max_inbreeding'):
+                queryset = queryset.filter(inbreeding_coefficient__lte=Decimal(params['max_inbreeding']))
+        except InvalidOperation:
+            raise ValidationError({'error': 'Invalid weight or inbreeding coefficient. Use a decimal number.'})
+        try:
+            if params.get('last_weighed_after'):
+                queryset = queryset.filter(last_weighed_date__gte=datetime.strptime(params['last_weighed_after'], '%Y-%m-%d').date())
+            if params.get('last_weighed_before'):
+                queryset = queryset.filter(last_weighed_date__lte=datetime.strptime(params['last_weighed_before'], '%Y-%m-%d').date())
+            if params.get('as_of'):
+                # The herd as it was on that date, with the status and location it had then
+                queryset = queryset.as_of(datetime.strptime(params['as_of'], '%Y-%m-%d').date())
+        except ValueError:
+            raise ValidationError({'error': 'Invalid date format. Use YYYY-MM-DD.'})
+        if params.get('unweighed') in ('1', 'true'):
+            queryset = queryset.filter(last_weighed_date__isnull=True)
+        return queryset
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -25,42 +71,240 @@ class AnimalViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Cannot sell a retired animal.'}, status=status.HTTP_400_BAD_REQUEST)
         return super().update(request, *args, **kwargs)
 
-class WeightLogViewSet(viewsets.ModelViewSet):
+class WeightLogViewSet(ConditionalGetMixin, FieldsetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = WeightLog.objects.all()
     serializer_class = WeightLogSerializer
+    keyset_ordering = ('-log_date', '-id')
+    export_spec = Export(
+        'weight_logs',
+        [('id', 'id'), ('log_date', 'log_date'), ('animal_id', 'animal_id'), ('animal_tag', 'animal__unique_tag'),
+         ('location', 'animal__location__name'), ('weight_kg', 'weight_kg')],
+        date_field='log_date', filters={'animal_id': 'animal_id', 'location_id': 'animal__location_id'},
+    )
+    max_session_entries = 10000
+
+    @action(detail=False, methods=['post'], url_path='weighing-session')
+    def weighing_session(self, request):
+        # Bulk upload for a weigh day:
+        # {"log_date": "2024-05-01", "skip_flagged": false, "entries": [{"unique_tag": "C-001", "weight_kg": "0.95"}, ...]}
+        entries = request.data.get('entries')
+        if not isinstance(entries, list) or not entries:
+            return Response({'error': 'entries must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.max_session_entries:
+            return Response({'error': f'At most {self.max_session_entries} entries per session.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        log_date = None
+        if request.data.get('log_date'):
+            try:
+                log_date = datetime.strptime(request.data['log_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        skip_flagged = request.data.get('skip_flagged') in (True, 'true', '1', 1)
 
-class ReproductionEventViewSet(viewsets.ModelViewSet):
+        results = record_weighing_session(entries, default_log_date=log_date, skip_flagged=skip_flagged)
+        summary = {result_status: 0 for result_status in ('created', 'flagged', 'skipped', 'error')}
+        for result in results:
+            summary[result['status']] += 1
+        return Response({'summary': summary, 'results': results}, status=status.HTTP_200_OK)
+
+class ReproductionEventViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = ReproductionEvent.objects.all()
     serializer_class = ReproductionEventSerializer
+    keyset_ordering = ('-mating_date', '-id')
 
-class HealthLogViewSet(viewsets.ModelViewSet):
+class HealthLogViewSet(ConditionalGetMixin, FieldsetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = HealthLog.objects.all()
     serializer_class = HealthLogSerializer
+    keyset_ordering = ('-log_date', '-id')
+    export_spec = Export(
+        'health_logs',
+        [('id', 'id'), ('log_date', 'log_date'), ('animal_id', 'animal_id'), ('animal_tag', 'animal__unique_tag'),
+         ('location', 'animal__location__name'), ('diagnosis', 'diagnosis'), ('notes', 'notes')],
+        date_field='log_date', filters={'animal_id': 'animal_id', 'location_id': 'animal__location_id'},
+    )
 
-class MedicationViewSet(viewsets.ModelViewSet):
+class MedicationViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = Medication.objects.all()
     serializer_class = MedicationSerializer
 
-class TreatmentViewSet(viewsets.ModelViewSet):
+class TreatmentViewSet(ConditionalGetMixin, FieldsetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Treatment.objects.all()
     serializer_class = TreatmentSerializer
+    export_spec = Export(
+        'treatments',
+        [('id', 'id'), ('log_date', 'health_log__log_date'), ('health_log_id', 'health_log_id'),
+         ('animal_tag', 'health_log__animal__unique_tag'), ('location', 'health_log__animal__location__name'),
+         ('diagnosis', 'health_log__diagnosis'), ('medication', 'medication__name'), ('dosage', 'dosage'),
+         ('withdrawal_end_date', 'withdrawal_end_date')],
+        date_field='health_log__log_date',
+        filters={'animal_id': 'health_log__animal_id', 'location_id': 'health_log__animal__location_id', 'medication_id': 'medication_id'},
+    )
+    max_batch_animals = 10000
+    # A treatment batch may quarantine or mark animals sick, but not remove them from the herd
+    batch_statuses = [value for value, _ in Animal.STATUS_CHOICES if value not in Animal.INACTIVE_STATUSES]
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        # Treats a whole location, or a list of animals, in one transaction:
+        # {"location": 3, "medication": 2, "dosage": "0.5 ml", "log_date": "2024-05-01",
+        #  "diagnosis": "Desparasitacion", "notes": "...", "status": "In Quarantine"}
+        # With "animals": [ids] instead of "location", exactly those animals are treated.
+        data = request.data
+        try:
+            log_date = datetime.strptime(data.get('log_date'), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        dosage = str(data.get('dosage') or '').strip()
+        if not dosage or len(dosage) > 100:
+            return Response({'error': 'dosage is required (at most 100 characters).'}, status=status.HTTP_400_BAD_REQUEST)
+        diagnosis = str(data.get('diagnosis') or '').strip()
+        if not diagnosis:
+            return Response({'error': 'diagnosis is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        new_status = data.get('status') or None
+        if new_status and new_status not in self.batch_statuses:
+            return Response({'error': f"status must be one of: {', '.join(self.batch_statuses)}."}, status=status.HTTP_400_BAD_REQUEST)
 
-class FinancialTransactionViewSet(viewsets.ModelViewSet):
+        try:
+            medication = Medication.objects.get(pk=int(data.get('medication')))
+        except (TypeError, ValueError):
+            return Response({'error': 'medication must be an integer ID.'}, status=status.HTTP_400_BAD_REQUEST)
+        except Medication.DoesNotExist:
+            return Response({'error': 'Medication not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        if data.get('location') and data.get('animals'):
+            return Response({'error': 'Give either location or animals, not both.'}, status=status.HTTP_400_BAD_REQUEST)
+        if data.get('location'):
+            try:
+                location_id = int(data['location'])
+            except (TypeError, ValueError):
+                return Response({'error': 'location must be an integer ID.'}, status=status.HTTP_400_BAD_REQUEST)
+            if not Location.objects.filter(pk=location_id).exists():
+                return Response({'error': 'Location not found.'}, status=status.HTTP_404_NOT_FOUND)
+            # Animals currently in the location, as counted by the density report
+            animal_ids = list(
+                Animal.objects.filter(location_id=location_id).exclude(status__in=Animal.INACTIVE_STATUSES).order_by('id').values_list('id', flat=True)
+            )
+        elif isinstance(data.get('animals'), list) and data['animals']:
+            try:
+                requested = list(dict.fromkeys(int(animal_id) for animal_id in data['animals']))
+            except (TypeError, ValueError):
+                return Response({'error': 'animals must be a list of integer IDs.'}, status=status.HTTP_400_BAD_REQUEST)
+            found = set(Animal.objects.filter(id__in=requested).values_list('id', flat=True))
+            missing = [animal_id for animal_id in requested if animal_id not in found]
+            if missing:
+                return Response({'error': 'Animals not found.', 'missing': missing}, status=status.HTTP_400_BAD_REQUEST)
+            animal_ids = requested
+        else:
+            return Response({'error': 'location or a non-empty animals list is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not animal_ids:
+            return Response({'error': 'No animals to treat.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(animal_ids) > self.max_batch_animals:
+            return Response({'error': f'At most {self.max_batch_animals} animals per batch.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        treatments = treat_animals(animal_ids, medication, dosage, log_date, diagnosis, notes=data.get('notes') or None, new_status=new_status)
+        return Response({
+            'animals': len(animal_ids),
+            'status': new_status,
+            'treatments': self.get_serializer(treatments, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+class FinancialTransactionViewSet(ConditionalGetMixin, FieldsetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = FinancialTransaction.objects.all()
     serializer_class = FinancialTransactionSerializer
+    keyset_ordering = ('-transaction_date', '-id')
+    export_spec = Export(
+        'financial_transactions',
+        [('id', 'id'), ('transaction_date', 'transaction_date'), ('type', 'type'), ('amount', 'amount'),
+         ('description', 'description'), ('related_entity_id', 'related_entity_id')],
+        date_field='transaction_date', filters={'related_entity_id': 'related_entity_id'},
+    )
 
-class FeedingLogViewSet(viewsets.ModelViewSet):
+class FeedingLogViewSet(ConditionalGetMixin, FieldsetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = FeedingLog.objects.all()
     serializer_class = FeedingLogSerializer
+    keyset_ordering = ('-log_date', '-id')
+    export_spec = Export(
+        'feeding_logs',
+        [('id', 'id'), ('log_date', 'log_date'), ('location_id', 'location_id'), ('location', 'location__name'),
+         ('feed_type', 'feed_type'), ('feed_item_id', 'feed_item_id'), ('quantity_kg', 'quantity_kg')],
+        date_field='log_date', filters={'location_id': 'location_id', 'feed_item_id': 'feed_item_id'},
+    )
+    max_bulk_entries = 10000
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # Posts a whole day's feedings in one transaction:
+        # {"log_date": "2024-05-01", "entries": [{"location": 1, "feed_type": "Forraje", "quantity_kg": "12.5"}, ...]}
+        entries = request.data.get('entries')
+        if not isinstance(entries, list) or not entries:
+            return Response({'error': 'entries must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.max_bulk_entries:
+            return Response({'error': f'At most {self.max_bulk_entries} entries per request.'}, status=status.HTTP_400_BAD_REQUEST)
 
-class FeedInventoryViewSet(viewsets.ModelViewSet):
-    queryset = FeedInventory.objects.all()
+        log_date = None
+        if request.data.get('log_date'):
+            try:
+                log_date = datetime.strptime(request.data['log_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        created, errors = record_feedings(entries, default_log_date=log_date)
+        if errors:
+            return Response({'error': 'No feedings were saved.', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
+class FeedInventoryViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
+    queryset = FeedInventory.objects.with_balance()
     serializer_class = FeedInventorySerializer
+    # Quantities are reported as balances over the stock movements
+    source_models = (FeedStockMovement,)
+
+class FeedStockMovementViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
+    # The ledger is append-only: movements can be listed and created, never edited.
+    queryset = FeedStockMovement.objects.select_related('feed_item').order_by('-movement_date', '-id')
+    serializer_class = FeedStockMovementSerializer
+    keyset_ordering = ('-movement_date', '-id')
+    http_method_names = ['get', 'post', 'head', 'options']
 
-class FeedRationViewSet(viewsets.ModelViewSet):
-    queryset = FeedRation.objects.all()
+class FeedRationViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
+    # Components are rendered with their feed item's name
+    queryset = FeedRation.objects.prefetch_related(Prefetch('rationcomponent_set', queryset=RationComponent.objects.select_related('feed_item')))
     serializer_class = FeedRationSerializer
 
-class RationComponentViewSet(viewsets.ModelViewSet):
-    queryset = RationComponent.objects.all()
-    serializer_class = RationComponentSerializer
\ No newline at end of file
+class RationComponentViewSet(ConditionalGetMixin, FieldsetMixin, viewsets.ModelViewSet):
+    queryset = RationComponent.objects.select_related('feed_item')
+    serializer_class = RationComponentSerializer
+
+class HerdImportView(APIView):
+    # Upload counterpart of `manage.py import_herd`: multipart form with one CSV per kind
+    # (lines, locations, animals, weights, feedings, reproduction) and an optional dry_run.
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        files = {kind: request.FILES[kind] for kind in request.FILES}
+        if not files:
+            return Response({'error': f"Upload at least one CSV file: {', '.join(IMPORTERS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.data.get('dry_run') in ('1', 'true')
+        try:
+            results, errors = import_herd(files, dry_run=dry_run)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if errors:
+            return Response({'results': results, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'dry_run': dry_run, 'results': results})
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+class MetricsView(APIView):
+    # Request metrics of this process (core.middleware.RequestMetricsMiddleware) for Prometheus
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request, format=None):
+        return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,216 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from operator import or_
+from statistics import median
+
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lead
+from .models import Animal, WeightLog
+from .signals import notify_bulk_write
+
+# Plausibility limits for a new weighing compared with the animal's previous one
+MAX_DAILY_GAIN_KG = Decimal('0.05')
+MAX_WEIGHT_DROP_RATIO = Decimal('0.20')
+# Modified z-score (median/MAD based) above which a weight is a cohort outlier
+COHORT_OUTLIER_SCORE = 3.5
+MIN_COHORT_SIZE = 5
+
+# Cohorts group animals of similar age, in days
+COHORT_AGE_BANDS = (30, 60, 90, 180)
+
+
+def cohort_for(birth_date, log_date):
+    age_in_days = (log_date - birth_date).days
+    for upper in COHORT_AGE_BANDS:
+        if age_in_days <= upper:
+            return upper
+    return None
+
+
+def previous_weight_flags(weight, log_date, previous_weight, previous_date):
+    flags = []
+    if previous_weight is None or previous_date is None:
+        return flags
+    if weight < previous_weight * (1 - MAX_WEIGHT_DROP_RATIO):
+        flags.append(f'Dropped more than {MAX_WEIGHT_DROP_RATIO:.0%} from the previous weight ({previous_weight} kg).')
+    days = (log_date - previous_date).days
+    if days > 0 and (weight - previous_weight) / days > MAX_DAILY_GAIN_KG:
+        flags.append(f'Gained more than {MAX_DAILY_GAIN_KG} kg/day since the previous weight ({previous_weight} kg on {previous_date}).')
+    return flags
+
+
+def previous_weighings(rows):
+    """
+    The stored weighing of each row's animal last before the row's log_date,
+    as {(animal_id, log_date): (weight_kg, log_date)}, in one query: a window
+    function gives every weighing the date of the next one, and a weighing is
+    the previous one of a row when it comes before the row's date and the next
+    one does not.
+    """
+    pairs = {(row['animal_id'], row['log_date']) for row in rows}
+    if not pairs:
+        return {}
+    weighings = WeightLog.objects.filter(animal_id__in={animal_id for animal_id, _ in pairs}).annotate(
+        next_date=Window(Lead('log_date'), partition_by=[F('animal_id')], order_by=[F('log_date').asc(), F('id').asc()]),
+    ).filter(reduce(or_, (
+        Q(animal_id=animal_id, log_date__lt=log_date) & (Q(next_date__gte=log_date) | Q(next_date__isnull=True))
+        for animal_id, log_date in pairs
+    ))).values_list('animal_id', 'log_date', 'weight_kg')
+
+    by_animal = defaultdict(list)
+    for animal_id, log_date, weight in weighings:
+        by_animal[animal_id].append((log_date, weight))
+    previous = {}
+    for animal_id, log_date in pairs:
+        earlier = [weighing for weighing in by_animal[animal_id] if weighing[0] < log_date]
+        if earlier:
+            previous_date, weight = max(earlier)
+            previous[animal_id, log_date] = (weight, previous_date)
+    return previous
+
+
+def cohort_outliers(rows):
+    """
+    Flags weights far from the rest of their age cohort in this session,
+    using the modified z-score 0.6745 * (x - median) / MAD. When more than
+    half the cohort shares one weight (MAD of 0), the mean absolute
+    deviation is used instead: (x - median) / (1.253314 * MeanAD).
+    """
+    cohorts = defaultdict(list)
+    for row in rows:
+        cohorts[row['cohort']].append(row)
+
+    for cohort, members in cohorts.items():
+        if len(members) < MIN_COHORT_SIZE:
+            continue
+        weights = [float(row['weight_kg']) for row in members]
+        center = median(weights)
+        deviations = [abs(weight - center) for weight in weights]
+        mad = median(deviations)
+        if mad:
+            scale = mad / 0.6745
+        else:
+            scale = 1.253314 * sum(deviations) / len(deviations)
+        if not scale:
+            continue
+        for row, weight in zip(members, weights):
+            score = (weight - center) / scale
+            if abs(score) > COHORT_OUTLIER_SCORE:
+                row['flags'].append(f'Outlier for its age cohort (median {center:.2f} kg, score {score:.1f}).')
+
+
+def record_weighing_session(entries, default_log_date=None, skip_flagged=False):
+    """
+    Validates, checks and inserts a batch of weighings.
+
+    Each entry identifies the animal by `unique_tag` or `animal` (ID). All
+    animals are resolved in one query, valid rows are inserted with one
+    bulk_create inside a transaction and a result is returned per entry.
+    """
+    results = []
+    pending = []
+    tags, ids = set(), set()
+
+    for index, entry in enumerate(entries):
+        result = {'index': index, 'unique_tag': None, 'animal': None, 'status': 'error', 'errors': [], 'flags': []}
+        results.append(result)
+        if not isinstance(entry, dict):
+            result['errors'].append('Each entry must be an object.')
+            continue
+
+        try:
+            weight = Decimal(str(entry.get('weight_kg')))
+            if not weight.is_finite() or weight <= 0 or weight >= 1000:
+                raise InvalidOperation
+            weight = weight.quantize(Decimal('0.01'))
+        except InvalidOperation:
+            result['errors'].append('weight_kg must be a positive number below 1000.')
+            weight = None
+
+        log_date = default_log_date
+        if entry.get('log_date'):
+            try:
+                log_date = datetime.strptime(entry['log_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                result['errors'].append('Invalid log_date format. Use YYYY-MM-DD.')
+                log_date = None
+        elif log_date is None:
+            result['errors'].append('log_date is required.')
+
+        if entry.get('unique_tag'):
+            result['unique_tag'] = str(entry['unique_tag'])
+            tags.add(result['unique_tag'])
+        elif entry.get('animal'):
+            try:
+                result['animal'] = int(entry['animal'])
+                ids.add(result['animal'])
+            except (TypeError, ValueError):
+                result['errors'].append('animal must be an integer ID.')
+        else:
+            result['errors'].append('unique_tag or animal is required.')
+
+        if not result['errors']:
+            pending.append({'result': result, 'weight_kg': weight, 'log_date': log_date, 'flags': result['flags']})
+
+    animals = Animal.objects.filter(Q(unique_tag__in=tags) | Q(id__in=ids)).values('id', 'unique_tag', 'birth_date')
+    by_tag, by_id = {}, {}
+    for animal in animals:
+        by_tag[animal['unique_tag']] = animal
+        by_id[animal['id']] = animal
+
+    valid = []
+    seen = set()
+    for row in pending:
+        result = row['result']
+        animal = by_tag.get(result['unique_tag']) if result['unique_tag'] else by_id.get(result['animal'])
+        if animal is None:
+            result['errors'].append('Animal not found.')
+            continue
+        result['animal'], result['unique_tag'] = animal['id'], animal['unique_tag']
+        if (animal['id'], row['log_date']) in seen:
+            result['errors'].append('Duplicate weighing for this animal and date in the session.')
+            continue
+        seen.add((animal['id'], row['log_date']))
+        if row['log_date'] < animal['birth_date']:
+            result['errors'].append(f"log_date is before the animal's birth date ({animal['birth_date']}).")
+            continue
+
+        row['animal_id'] = animal['id']
+        row['cohort'] = cohort_for(animal['birth_date'], row['log_date'])
+        valid.append(row)
+
+    # Each weighing is checked against the animal's previous one, stored or
+    # earlier in this session, so backdated entries are compared in date order.
+    stored = previous_weighings(valid)
+    session = {}
+    for row in sorted(valid, key=lambda row: row['log_date']):
+        key = (row['animal_id'], row['log_date'])
+        previous_weight, previous_date = stored.get(key, (None, None))
+        earlier = session.get(row['animal_id'])
+        if earlier and (previous_date is None or earlier[1] >= previous_date):
+            previous_weight, previous_date = earlier
+        row['flags'].extend(previous_weight_flags(row['weight_kg'], row['log_date'], previous_weight, previous_date))
+        session[row['animal_id']] = (row['weight_kg'], row['log_date'])
+
+    cohort_outliers(valid)
+
+    to_create = []
+    for row in valid:
+        result = row['result']
+        if row['flags'] and skip_flagged:
+            result['status'] = 'skipped'
+            continue
+        result['status'] = 'flagged' if row['flags'] else 'created'
+        to_create.append((result, WeightLog(animal_id=row['animal_id'], log_date=row['log_date'], weight_kg=row['weight_kg'])))
+
+    with transaction.atomic():
+        created = WeightLog.objects.bulk_create([log for _, log in to_create])
+        Animal.objects.filter(pk__in={log.animal_id for log in created}).refresh_current_weights()
+        notify_bulk_write(WeightLog, created=created)
+    for (result, _), log in zip(to_create, created):
+        result['id'] = log.pk
+
+    return results
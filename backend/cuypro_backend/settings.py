@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +56,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+REST_FRAMEWORK = {
+    # Opt-in keyset pagination: lists are paginated when ?cursor= or ?page_size= is given
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+}
+
+# Largest ?page_size= accepted by core.pagination.KeysetPagination
+API_MAX_PAGE_SIZE = 1000
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 ]
@@ -95,6 +105,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+# Report results use their own alias so they can live in a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache or filebased) in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': os.environ.get('REPORT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('REPORT_CACHE_LOCATION', 'cuypro-reports'),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -137,3 +163,38 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
+
+# Pedigree / inbreeding engine (core.pedigree)
+# Generations considered when computing inbreeding and kinship coefficients.
+PEDIGREE_GENERATIONS = 5
+# Deepest ancestor kept in the AnimalAncestor closure table.
+PEDIGREE_INDEX_DEPTH = 10
+
+# Report result cache (reports.cache)
+REPORT_CACHE_ALIAS = 'reports'
+# Seconds a cached report is kept; entries are invalidated earlier by any write to their source tables.
+REPORT_CACHE_TIMEOUT = 3600
+
+# Background report jobs (reports.jobs), run by `manage.py run_report_worker`
+# Seconds finished jobs and their results are kept.
+REPORT_JOB_RETENTION = 86400
+# Seconds after which a job still marked running is considered lost with its worker.
+REPORT_JOB_STALE_AFTER = 3600
+
+# Feed stock-out forecast (reports.stock), behind the low stock alerts
+# Days of feeding history averaged into each product's consumption rate.
+FEED_FORECAST_WINDOW_DAYS = 28
+# Days of stock kept on top of a product's lead time when reordering.
+FEED_REORDER_SAFETY_DAYS = 3
+
+# Growth curves and market-date predictions (reports.growth)
+# Default target weight in kg of the market forecast.
+MARKET_WEIGHT_KG = 1.0
+# Weighings the line's mean curve counts for when blended with an animal's own curve.
+GROWTH_PRIOR_WEIGHINGS = 4
+
+# Request metrics (core.middleware.RequestMetricsMiddleware), exposed at /api/metrics
+# Requests running one query shape more often than this are counted and logged as possible N+1s.
+METRICS_N_PLUS_ONE_THRESHOLD = 10
+# Requests slower than this many seconds are logged with their most expensive queries; None disables the log.
+METRICS_SLOW_REQUEST_SECONDS = 1.0
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import Alert, GrowthCurveFit, LocationOccupancy, ReportJob, StaleGrowthFit
 
-# Register your models here.
+admin.site.register(LocationOccupancy)
+admin.site.register(Alert)
+admin.site.register(ReportJob)
+admin.site.register(GrowthCurveFit)
+admin.site.register(StaleGrowthFit)
@@ -0,0 +1,217 @@
+import hashlib
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from core.models import HealthLog, Treatment
+from core.signals import notify_bulk_write
+from .models import Alert
+from .occupancy import density_percentage, occupied_locations
+from .stock import stock_forecasts
+
+# Treatments for one diagnosis within the window above which treatment looks ineffective
+INEFFECTIVE_TREATMENT_COUNT = 2
+INEFFECTIVE_TREATMENT_WINDOW_DAYS = 30
+
+
+class AlertRule:
+    """
+    One type of alert. evaluate(subject_ids, today) returns the conditions
+    that currently hold among the given subjects (every subject when None),
+    as {(subject, key): (severity, message, data)}.
+    """
+    type = None
+    # Subjects are '<prefix>:<id>', e.g. 'animal:12'
+    prefix = None
+
+    def subject(self, pk):
+        return f'{self.prefix}:{pk}'
+
+    def evaluate(self, subject_ids, today):
+        raise NotImplementedError
+
+
+class WithdrawalRule(AlertRule):
+    # Treatments whose withdrawal period has ended while the animal is still
+    # marked 'In Quarantine', i.e. not ready for sale/consumption
+    type = 'withdrawal'
+    prefix = 'animal'
+
+    def evaluate(self, subject_ids, today):
+        treatments = Treatment.objects.filter(
+            withdrawal_end_date__lte=today,
+            health_log__animal__status='In Quarantine'
+        ).select_related('health_log__animal', 'medication')
+        if subject_ids is not None:
+            treatments = treatments.filter(health_log__animal_id__in=subject_ids)
+
+        found = {}
+        for treatment in treatments:
+            animal = treatment.health_log.animal
+            medication = treatment.medication.name if treatment.medication else 'N/A'
+            message = f"Animal {animal.unique_tag} has completed its withdrawal period for {medication} and is still in quarantine."
+            found[(self.subject(animal.id), f'treatment:{treatment.id}')] = ('warning', message, {
+                'animal_id': animal.id,
+                'animal_tag': animal.unique_tag,
+                'medication': medication,
+                'withdrawal_end_date': treatment.withdrawal_end_date.isoformat(),
+                'message': message,
+            })
+        return found
+
+
+class IneffectiveTreatmentRule(AlertRule):
+    # Animals with more than 2 treatments for the same diagnosis in the last 30 days
+    type = 'ineffective_treatment'
+    prefix = 'animal'
+
+    def evaluate(self, subject_ids, today):
+        health_logs = HealthLog.objects.filter(log_date__gte=today - timedelta(days=INEFFECTIVE_TREATMENT_WINDOW_DAYS))
+        if subject_ids is not None:
+            health_logs = health_logs.filter(animal_id__in=subject_ids)
+        grouped = health_logs.values('animal', 'animal__unique_tag', 'diagnosis').annotate(
+            treatment_count=Count('treatment')
+        ).filter(treatment_count__gt=INEFFECTIVE_TREATMENT_COUNT)
+
+        found = {}
+        for entry in grouped:
+            animal_tag = entry['animal__unique_tag']
+            message = f"Animal {animal_tag} has received {entry['treatment_count']} treatments for {entry['diagnosis']} in the last {INEFFECTIVE_TREATMENT_WINDOW_DAYS} days, suggesting potential ineffectiveness."
+            # Diagnoses are free text, so the key is a digest of it
+            key = hashlib.sha1(entry['diagnosis'].encode()).hexdigest()
+            found[(self.subject(entry['animal']), key)] = ('warning', message, {
+                'animal_id': entry['animal'],
+                'animal_tag': animal_tag,
+                'diagnosis': entry['diagnosis'],
+                'treatment_count': entry['treatment_count'],
+                'message': message,
+            })
+        return found
+
+
+class LowStockRule(AlertRule):
+    # Products that will run out within their lead time (plus the safety
+    # margin) at their recent consumption, or already have
+    type = 'low_stock'
+    prefix = 'feed_item'
+
+    def evaluate(self, subject_ids, today):
+        found = {}
+        for item in stock_forecasts(today, subject_ids):
+            if item['severity'] is None:
+                continue
+            if item['current_stock_kg'] <= 0:
+                message = f"Low stock alert: {item['product_name']} is out of stock."
+            else:
+                message = (
+                    f"Low stock alert: {item['product_name']} will run out in {item['days_to_stockout']} days "
+                    f"({item['current_stock_kg']} kg left); reorder by {item['reorder_date'].isoformat()}, "
+                    f"lead time is {item['lead_time_days']} days."
+                )
+            found[(self.subject(item['feed_item_id']), '')] = (item['severity'], message, {
+                'product_name': item['product_name'],
+                'current_stock_kg': str(item['current_stock_kg']),
+                'daily_consumption_kg': str(item['daily_consumption_kg']),
+                'days_to_stockout': str(item['days_to_stockout']),
+                'reorder_date': item['reorder_date'].isoformat(),
+                'lead_time_days': item['lead_time_days'],
+                'message': message,
+            })
+        return found
+
+
+class DensityRule(AlertRule):
+    type = 'density'
+    prefix = 'location'
+
+    def evaluate(self, subject_ids, today):
+        locations = occupied_locations()
+        if subject_ids is not None:
+            locations = locations.filter(id__in=subject_ids)
+
+        found = {}
+        for location in locations:
+            percentage = density_percentage(location.current_animals, location.capacity)
+            if percentage > 100:
+                severity, message = 'critical', f"Location {location.name} is over capacity! ({percentage:.2f}%)"
+            elif percentage > 80:
+                severity, message = 'warning', f"Location {location.name} is nearing capacity. ({percentage:.2f}%)"
+            else:
+                continue
+            found[(self.subject(location.id), '')] = (severity, message, {
+                'location_id': location.id,
+                'location_name': location.name,
+                'capacity': location.capacity,
+                'current_animals': location.current_animals,
+                'density_percentage': percentage,
+                'message': message,
+            })
+        return found
+
+
+WITHDRAWAL = WithdrawalRule()
+INEFFECTIVE_TREATMENT = IneffectiveTreatmentRule()
+LOW_STOCK = LowStockRule()
+DENSITY = DensityRule()
+
+RULES = {rule.type: rule for rule in (WITHDRAWAL, INEFFECTIVE_TREATMENT, LOW_STOCK, DENSITY)}
+# Rules whose subjects are animals, re-evaluated when an animal or its health records change
+ANIMAL_RULES = (WITHDRAWAL, INEFFECTIVE_TREATMENT)
+
+
+def sync_alerts(rule, subject_ids=None, today=None):
+    """
+    Brings the open alerts of `rule` for the given subjects (all when None) in
+    line with the data: new conditions open alerts, changed ones are updated
+    and cleared ones are resolved. Returns (opened, updated, resolved).
+    """
+    today = today or date.today()
+    if subject_ids is not None:
+        subject_ids = set(subject_ids)
+        if not subject_ids:
+            return 0, 0, 0
+    found = rule.evaluate(subject_ids, today)
+
+    with transaction.atomic():
+        open_alerts = Alert.objects.open().filter(type=rule.type)
+        if subject_ids is not None:
+            open_alerts = open_alerts.filter(subject__in=[rule.subject(pk) for pk in subject_ids])
+        existing = {(alert.subject, alert.key): alert for alert in open_alerts.select_for_update()}
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for (subject, key), (severity, message, data) in found.items():
+            alert = existing.get((subject, key))
+            if alert is None:
+                to_create.append(Alert(type=rule.type, subject=subject, key=key, severity=severity, message=message, data=data))
+            elif (alert.severity, alert.message, alert.data) != (severity, message, data):
+                alert.severity, alert.message, alert.data, alert.updated_at = severity, message, data, now
+                to_update.append(alert)
+        resolved = [alert.pk for subject_key, alert in existing.items() if subject_key not in found]
+
+        if resolved:
+            Alert.objects.filter(pk__in=resolved).update(resolved_at=now, updated_at=now)
+        if to_update:
+            Alert.objects.bulk_update(to_update, ['severity', 'message', 'data', 'updated_at'])
+        if to_create:
+            # A concurrent sync may have opened the same alert first
+            Alert.objects.bulk_create(to_create, ignore_conflicts=True)
+        if resolved or to_update or to_create:
+            notify_bulk_write(Alert)
+    return len(to_create), len(to_update), len(resolved)
+
+
+def sync_after_commit(rule, subject_ids=None):
+    """Schedules sync_alerts() for once the current transaction commits."""
+    subject_ids = None if subject_ids is None else {pk for pk in subject_ids if pk is not None}
+    transaction.on_commit(lambda: sync_alerts(rule, subject_ids))
+
+
+def sweep_alerts(today=None):
+    """
+    Re-evaluates every rule for every subject, which also catches conditions
+    that only change with time (withdrawal periods ending, treatments leaving
+    the ineffectiveness window). Returns {type: (opened, updated, resolved)}.
+    """
+    return {alert_type: sync_alerts(rule, today=today) for alert_type, rule in RULES.items()}
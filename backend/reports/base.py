@@ -0,0 +1,104 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from core.conditional import not_modified, set_validators, validators
+from core.versioning import get_versions
+from .cache import CACHE_TIMEOUT, cache_key, normalized_params, record, report_cache
+from .jobs import set_progress, submit_job
+from .serializers import ReportJobSerializer
+from .kpis import SECTIONS, KPIContext, SectionError, parse_filters
+
+# Every ReportView subclass, by name, for cache statistics
+REPORT_VIEWS = {}
+
+
+class ReportView(APIView):
+    """
+    Base class for GET reports computed from core tables.
+
+    Subclasses implement get_report(request) and list the models they read in
+    source_models. Successful responses are cached per normalized query string
+    and invalidated by the per-table versions of those models, which also
+    provide the ETag/Last-Modified validators: clients whose copy is still
+    current get 304 Not Modified without the report being looked up.
+
+    With ?async=1 the report is queued as a ReportJob instead (see
+    reports.jobs) and 202 Accepted is returned with the job to poll.
+    """
+    source_models = ()
+    cache_timeout = CACHE_TIMEOUT
+    # The ReportJob being run, when the report is computed by the worker
+    job = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__module__ != __name__:
+            REPORT_VIEWS[cls.__name__] = cls
+
+    def get_report(self, request):
+        raise NotImplementedError
+
+    def should_cache(self, response):
+        return response.status_code == status.HTTP_200_OK
+
+    def report_progress(self, done, total):
+        """Lets long reports tell the clients polling their job how far they are."""
+        if self.job is not None:
+            set_progress(self.job, done, total)
+
+    def submit(self, request):
+        params = [(key, values) for key, values in normalized_params(request.query_params) if key != 'async']
+        job, _ = submit_job(type(self).__name__, params)
+        return Response(
+            ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('report-job', args=[job.pk])},
+        )
+
+    def get(self, request, format=None):
+        if request.query_params.get('async') in ('1', 'true'):
+            return self.submit(request)
+        if not self.source_models:
+            return self.get_report(request)
+
+        view_name = type(self).__name__
+        versions = get_versions(self.source_models)
+        etag, last_modified = validators(request, versions, daily=True)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return set_validators(response, etag, last_modified)
+
+        key = cache_key(view_name, normalized_params(request.query_params), versions)
+        cache = report_cache()
+
+        data = cache.get(key)
+        if data is not None:
+            record(view_name, 'hit')
+            response = Response(data, status=status.HTTP_200_OK, headers={'X-Report-Cache': 'HIT'})
+            return set_validators(response, etag, last_modified)
+
+        response = self.get_report(request)
+        if self.should_cache(response):
+            cache.set(key, response.data, self.cache_timeout)
+            record(view_name, 'miss')
+            response['X-Report-Cache'] = 'MISS'
+            set_validators(response, etag, last_modified)
+        return response
+
+
+class KPIReportView(ReportView):
+    """Serves a single section of reports.kpis, named by `section`."""
+    section = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.section:
+            cls.source_models = SECTIONS[cls.section][1]
+
+    def get_report(self, request):
+        compute, _ = SECTIONS[self.section]
+        try:
+            data = compute(KPIContext(parse_filters(request.query_params)))
+        except (ValueError, SectionError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)
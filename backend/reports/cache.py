@@ -0,0 +1,67 @@
+import hashlib
+import json
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+
+CACHE_ALIAS = getattr(settings, 'REPORT_CACHE_ALIAS', 'reports')
+CACHE_TIMEOUT = getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600)
+
+STATS_KEY = 'report-cache-stats:{view}:{outcome}'
+
+
+def report_cache():
+    return caches[CACHE_ALIAS]
+
+
+def normalized_params(query_params):
+    """Query parameters as a sorted list, ignoring blank values, so equivalent requests share a key."""
+    return sorted(
+        (key, sorted(value for value in query_params.getlist(key) if value != ''))
+        for key in query_params
+        if any(value != '' for value in query_params.getlist(key))
+    )
+
+
+def cache_key(view_name, params, versions):
+    # Table versions are part of the key: any write to a source table makes
+    # every older entry unreachable, and it simply expires.
+    payload = json.dumps([
+        params,
+        [(label, version) for label, (version, _) in sorted(versions.items())],
+        # Several reports depend on today's date (ages, alert windows)
+        date.today().isoformat(),
+    ])
+    return f"report:{view_name}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+
+def record(view_name, outcome):
+    cache = report_cache()
+    key = STATS_KEY.format(view=view_name, outcome=outcome)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cache_stats(view_names):
+    cache = report_cache()
+    keys = {
+        (view_name, outcome): STATS_KEY.format(view=view_name, outcome=outcome)
+        for view_name in view_names
+        for outcome in ('hit', 'miss')
+    }
+    values = cache.get_many(list(keys.values()))
+
+    stats = {}
+    for view_name in sorted(view_names):
+        hits = values.get(keys[(view_name, 'hit')], 0)
+        misses = values.get(keys[(view_name, 'miss')], 0)
+        stats[view_name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
@@ -0,0 +1,115 @@
+from datetime import date
+
+from django.db.models import Count, DecimalField, F, Max, Window
+from django.db.models.functions import FirstValue, RowNumber
+from core.models import WeightLog
+
+# (label, minimum age in days, maximum age in days or None)
+AGE_BANDS = (
+    ('0-30', 0, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('91-180', 91, 180),
+    ('181+', 181, None),
+)
+
+GROUP_FIELDS = {
+    'line': ('line_id', 'line_name'),
+    'location': ('location_id', 'location_name'),
+    'sex': ('sex',),
+    'age_band': ('age_band',),
+}
+
+SORT_FIELDS = ('gdp', 'animal_tag', 'num_days', 'initial_weight_kg', 'final_weight_kg', 'weight_gain_kg')
+
+
+def age_band(birth_date, today):
+    age_in_days = (today - birth_date).days
+    for label, min_days, max_days in AGE_BANDS:
+        if age_in_days >= min_days and (max_days is None or age_in_days <= max_days):
+            return label
+    return None
+
+
+def herd_gdp(start_date=None, end_date=None, line_id=None, location_id=None, sex=None, today=None):
+    """
+    Daily weight gain for every animal with at least two weighings, in one query.
+
+    Window functions partitioned by animal give the first and last weighing of
+    each series; only the first row of every partition is returned.
+    """
+    today = today or date.today()
+    weight_logs = WeightLog.objects.all()
+    if start_date and end_date:
+        weight_logs = weight_logs.filter(log_date__range=[start_date, end_date])
+    if line_id:
+        weight_logs = weight_logs.filter(animal__line_id=line_id)
+    if location_id:
+        weight_logs = weight_logs.filter(animal__location_id=location_id)
+    if sex:
+        weight_logs = weight_logs.filter(animal__sex=sex)
+
+    partition = [F('animal_id')]
+    series = weight_logs.annotate(
+        position=Window(RowNumber(), partition_by=partition, order_by=[F('log_date').asc(), F('id').asc()]),
+        num_logs=Window(Count('id'), partition_by=partition),
+        final_weight_kg=Window(
+            FirstValue('weight_kg'), partition_by=partition, order_by=[F('log_date').desc(), F('id').desc()],
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        ),
+        final_date=Window(Max('log_date'), partition_by=partition),
+    ).filter(position=1, num_logs__gte=2).values(
+        'animal_id', 'log_date', 'weight_kg', 'final_weight_kg', 'final_date',
+        animal_tag=F('animal__unique_tag'),
+        sex=F('animal__sex'),
+        birth_date=F('animal__birth_date'),
+        line_id=F('animal__line_id'),
+        line_name=F('animal__line__name'),
+        location_id=F('animal__location_id'),
+        location_name=F('animal__location__name'),
+    ).order_by('animal_id')
+
+    rows = []
+    for entry in series:
+        num_days = (entry['final_date'] - entry['log_date']).days
+        weight_gain = entry['final_weight_kg'] - entry['weight_kg']
+        gdp = weight_gain / num_days if num_days > 0 else 0
+        rows.append({
+            'animal_id': entry['animal_id'],
+            'animal_tag': entry['animal_tag'],
+            'sex': entry['sex'],
+            'line_id': entry['line_id'],
+            'line_name': entry['line_name'],
+            'location_id': entry['location_id'],
+            'location_name': entry['location_name'],
+            'age_band': age_band(entry['birth_date'], today),
+            'initial_weight_kg': entry['weight_kg'],
+            'final_weight_kg': entry['final_weight_kg'],
+            'weight_gain_kg': weight_gain,
+            'num_days': num_days,
+            'gdp': round(gdp, 2),
+        })
+    return rows
+
+
+def group_gdp(rows, group_by):
+    """Aggregates per-animal GDP rows by the given GROUP_FIELDS keys."""
+    key_fields = [field for group in group_by for field in GROUP_FIELDS[group]]
+    groups = {}
+    for row in rows:
+        key = tuple(row[field] for field in key_fields)
+        groups.setdefault(key, []).append(row)
+
+    data = []
+    for key, members in groups.items():
+        gdps = [row['gdp'] for row in members]
+        group = dict(zip(key_fields, key))
+        group.update({
+            'animal_count': len(members),
+            'average_gdp': round(sum(gdps) / len(gdps), 2),
+            'min_gdp': min(gdps),
+            'max_gdp': max(gdps),
+            'total_weight_gain_kg': sum(row['weight_gain_kg'] for row in members),
+        })
+        data.append(group)
+    return data
@@ -0,0 +1,292 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count
+from core.models import Animal, WeightLog
+from core.signals import notify_bulk_write
+from .models import GrowthCurveFit, StaleGrowthFit
+
+# Weight at which animals are sold, the default target of market predictions
+MARKET_WEIGHT_KG = getattr(settings, 'MARKET_WEIGHT_KG', 1.0)
+# Weighings, spanning at least MIN_FIT_SPAN_DAYS, needed to fit an animal on its own
+MIN_FIT_WEIGHINGS = 3
+MIN_FIT_SPAN_DAYS = 21
+# Weight of the line prior, in weighings: an animal with this many weighings
+# is predicted half from its own curve and half from its line's
+PRIOR_WEIGHINGS = getattr(settings, 'GROWTH_PRIOR_WEIGHINGS', 4)
+# Asymptotes tried, as multiples of the heaviest weighing
+ASYMPTOTE_FACTORS = [1.01 * 1.1 ** step for step in range(16)]
+# Refinement steps of each fit
+FIT_ITERATIONS = 30
+# Animals whose weighings are loaded and fitted at a time
+FIT_BATCH_SIZE = 1000
+
+
+def gompertz(asymptote, b, k, age_days):
+    return asymptote * math.exp(-b * math.exp(-k * age_days))
+
+
+def age_at_weight(asymptote, b, k, weight):
+    """Age in days at which the curve reaches `weight`, or None if it never does."""
+    if not 0 < weight < asymptote:
+        return None
+    return -math.log(math.log(asymptote / weight) / b) / k
+
+
+def squared_errors(ages, weights, mask, asymptote, b, k):
+    """Sum of squared residuals of each padded series against its curve."""
+    values = asymptote[:, None] * np.exp(-b[:, None] * np.exp(-k[:, None] * ages))
+    return np.where(mask, (weights - values) ** 2, 0).sum(axis=1)
+
+
+def initial_curves(ages, weights, mask, fittable):
+    """
+    Starting curves for fit_gompertz_batch(): for each candidate asymptote
+    above a series' heaviest weighing the curve is a straight line in age once
+    log(log(asymptote / weight)) is taken, so b and k come from a linear fit,
+    weighted so errors count as they would in kg. The best candidate of each
+    series is kept. Returns (parameters, errors), errors infinite where no
+    candidate grows.
+    """
+    heaviest = np.where(mask, weights, 0).max(axis=1)
+    best = np.zeros((len(ages), 3))
+    best_errors = np.full(len(ages), np.inf)
+    for factor in ASYMPTOTE_FACTORS:
+        asymptote = heaviest * factor
+        logs = np.where(mask, np.log(asymptote[:, None] / weights), 1)
+        ys = np.log(logs)
+        # d(weight)/dy: a unit of y near the asymptote is worth few kg
+        fit_weights = np.where(mask, (weights * logs) ** 2, 0)
+        total = fit_weights.sum(axis=1)
+        mean_age = (fit_weights * ages).sum(axis=1) / total
+        mean_y = (fit_weights * ys).sum(axis=1) / total
+        spread = (fit_weights * (ages - mean_age[:, None]) ** 2).sum(axis=1)
+        slope = (fit_weights * (ages - mean_age[:, None]) * (ys - mean_y[:, None])).sum(axis=1) / spread
+        # Not growing where the slope is not negative
+        k, b = -slope, np.exp(mean_y - slope * mean_age)
+        errors = squared_errors(ages, weights, mask, asymptote, b, k)
+        better = fittable & (spread > 0) & (slope < 0) & (errors < best_errors)
+        best[better] = np.column_stack([asymptote, b, k])[better]
+        best_errors[better] = errors[better]
+    return best, best_errors
+
+
+def fit_gompertz_batch(series):
+    """
+    Least-squares Gompertz curves through many [(age_days, weight_kg)] series
+    at once, as (asymptote, b, k, rmse) or None per series, None with too few
+    points or no growth. The series are padded into arrays so every step runs
+    over the whole batch: Levenberg-Marquardt steps refine initial_curves() in
+    kg, which lets the asymptote settle below the heaviest weighing of a noisy
+    adult.
+    """
+    series = [[(age, weight) for age, weight in points if age >= 0 and weight > 0] for points in series]
+    width = max((len(points) for points in series), default=0)
+    if not width:
+        return [None] * len(series)
+    ages, weights = np.zeros((len(series), width)), np.ones((len(series), width))
+    mask = np.zeros((len(series), width), dtype=bool)
+    for row, points in enumerate(series):
+        if points:
+            ages[row, :len(points)], weights[row, :len(points)] = zip(*points)
+            mask[row, :len(points)] = True
+    counts = mask.sum(axis=1)
+    spans = np.where(mask, ages, -np.inf).max(axis=1) - np.where(mask, ages, np.inf).min(axis=1)
+
+    # Steps that overflow or divide by zero are rejected through their NaN errors
+    with np.errstate(all='ignore'):
+        fittable = (counts >= MIN_FIT_WEIGHINGS) & (spans >= MIN_FIT_SPAN_DAYS)
+        parameters, errors = initial_curves(ages, weights, mask, fittable)
+        fitted = np.isfinite(errors)
+        active = fitted.copy()
+        damping = np.full(len(series), 1e-3)
+        diagonal = np.arange(3)
+        for _ in range(FIT_ITERATIONS):
+            if not active.any():
+                break
+            asymptote, b, k = parameters.T
+            decay = np.exp(-k[:, None] * ages)
+            values = asymptote[:, None] * np.exp(-b[:, None] * decay)
+            jacobian = np.where(mask[:, :, None], np.stack([
+                values / asymptote[:, None], -values * decay, values * b[:, None] * ages * decay,
+            ], axis=2), 0)
+            gradient = np.einsum('nmi,nm->ni', jacobian, np.where(mask, weights - values, 0))
+            normal = np.einsum('nmi,nmj->nij', jacobian, jacobian)
+            normal[:, diagonal, diagonal] *= (1 + damping)[:, None]
+            determinants = np.linalg.det(normal)
+            active &= np.isfinite(determinants) & (determinants != 0)
+            steps = np.zeros_like(parameters)
+            steps[active] = np.linalg.solve(normal[active], gradient[active][:, :, None])[:, :, 0]
+
+            candidates = parameters + steps
+            candidate_errors = squared_errors(ages, weights, mask, *candidates.T)
+            accepted = active & (candidates.min(axis=1) > 0) & (candidate_errors < errors)
+            converged = accepted & (errors - candidate_errors < 1e-10)
+            parameters[accepted] = candidates[accepted]
+            errors[accepted] = candidate_errors[accepted]
+            damping = np.where(accepted, damping / 10, damping * 10)
+            active &= ~converged & (damping <= 1e6)
+
+    rmses = np.sqrt(errors / np.maximum(counts, 1))
+    return [
+        (*(float(value) for value in parameters[row]), float(rmses[row])) if fitted[row] else None
+        for row in range(len(series))
+    ]
+
+
+def fit_gompertz(points):
+    """Least-squares Gompertz curve through one [(age_days, weight_kg)] series; see fit_gompertz_batch()."""
+    return fit_gompertz_batch([points])[0]
+
+
+def mark_stale(animal_ids):
+    """
+    Queues the animals among `animal_ids` that still exist for refit by
+    refresh_fits(). Marks are upserted, so an animal marked while a refit holds
+    its mark is queued again once that refit commits.
+    """
+    animal_ids = Animal.objects.filter(pk__in={pk for pk in animal_ids if pk is not None}).values_list('pk', flat=True)
+    StaleGrowthFit.objects.bulk_create(
+        [StaleGrowthFit(animal_id=pk) for pk in animal_ids],
+        update_conflicts=True, unique_fields=['animal'], update_fields=['marked_at'], batch_size=FIT_BATCH_SIZE,
+    )
+
+
+def mark_stale_after_commit(animal_ids):
+    """Schedules mark_stale() for once the current transaction commits, when the animals' weighings are visible."""
+    animal_ids = set(animal_ids)
+    transaction.on_commit(lambda: mark_stale(animal_ids))
+
+
+def fit_animals(animal_ids):
+    """Fits every weighed animal among `animal_ids` in one batch, from their weighings loaded in one query."""
+    series = defaultdict(list)
+    weights = WeightLog.objects.filter(animal_id__in=animal_ids).order_by('animal', 'log_date', 'id')
+    for animal_id, log_date, birth_date, weight in weights.values_list('animal', 'log_date', 'animal__birth_date', 'weight_kg'):
+        series[animal_id].append(((log_date - birth_date).days, float(weight)))
+    fits = []
+    for (animal_id, points), fit in zip(series.items(), fit_gompertz_batch(list(series.values()))):
+        last_age, last_weight = points[-1]
+        asymptote, b, k, rmse = fit if fit else (None, None, None, None)
+        fits.append(GrowthCurveFit(
+            animal_id=animal_id, num_weights=len(points),
+            asymptote_kg=asymptote, b=b, k=k, rmse_kg=rmse, last_age_days=last_age, last_weight_kg=last_weight,
+        ))
+    return fits
+
+
+def refresh_fits(refit_all=False):
+    """
+    Refits the animals marked stale (every weighed animal with refit_all),
+    FIT_BATCH_SIZE at a time, and drops the fits of animals no longer weighed.
+    Each batch of marks is locked while it is refitted and locked marks are
+    skipped, so several fit_growth_curves commands can run side by side.
+    Returns (fitted, removed).
+    """
+    if refit_all:
+        mark_stale([*WeightLog.objects.values_list('animal', flat=True).distinct(), *GrowthCurveFit.objects.values_list('animal', flat=True)])
+
+    fitted = removed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StaleGrowthFit.objects.select_for_update(skip_locked=True).order_by('animal').values_list('animal', flat=True)[:FIT_BATCH_SIZE]
+            )
+            if not batch:
+                break
+            fits = fit_animals(batch)
+            stored = set(GrowthCurveFit.objects.filter(animal_id__in=batch).values_list('animal', flat=True))
+            GrowthCurveFit.objects.filter(animal_id__in=batch).delete()
+            GrowthCurveFit.objects.bulk_create(fits)
+            StaleGrowthFit.objects.filter(animal_id__in=batch).delete()
+        fitted += len(fits)
+        removed += len(stored - {fit.animal_id for fit in fits})
+
+    if fitted or removed:
+        notify_bulk_write(GrowthCurveFit)
+    return fitted, removed
+
+
+def line_priors():
+    """
+    Mean curve parameters of the animals fitted on their own, by line, with
+    the herd's mean under None for animals without a line or lines without fits.
+    """
+    rows = GrowthCurveFit.objects.filter(asymptote_kg__isnull=False).values('animal__line').annotate(
+        count=Count('animal'), asymptote=Avg('asymptote_kg'), b=Avg('b'), k=Avg('k'),
+    )
+    priors = {row['animal__line']: (row['asymptote'], row['b'], row['k']) for row in rows if row['animal__line'] is not None}
+    total = sum(row['count'] for row in rows)
+    if total:
+        priors[None] = tuple(sum(row[name] * row['count'] for row in rows) / total for name in ('asymptote', 'b', 'k'))
+    return priors
+
+
+def shrunk_curve(fit, prior):
+    """
+    The animal's curve pulled toward its line's: parameters are averaged with
+    the animal's own weighted by its number of weighings against
+    PRIOR_WEIGHINGS. Animals too sparse to fit take the line's shape, scaled
+    to pass through their latest weighing, weighted the same way.
+    """
+    weight = fit.num_weights / (fit.num_weights + PRIOR_WEIGHINGS)
+    _, prior_b, prior_k = prior
+    if fit.asymptote_kg is not None:
+        own = (fit.asymptote_kg, fit.b, fit.k)
+    else:
+        level = fit.last_weight_kg / gompertz(1, prior_b, prior_k, fit.last_age_days)
+        own = (level, prior_b, prior_k)
+    return tuple(weight * value + (1 - weight) * prior_value for value, prior_value in zip(own, prior))
+
+
+def market_predictions(target_kg, start_date, end_date, line_id=None):
+    """
+    Active animals under `target_kg` expected to reach it between
+    `start_date` and `end_date`, soonest first, projected along their curve
+    from their latest weighing. Only reads the stored fits, which
+    fit_growth_curves keeps current (refresh_fits()).
+    """
+    priors = line_priors()
+    if None not in priors:
+        # No animal has enough weighings for a curve
+        return []
+
+    animals = Animal.objects.exclude(status__in=Animal.INACTIVE_STATUSES).filter(growth_fit__isnull=False).exclude(
+        current_weight_kg__gte=target_kg,
+    ).select_related('growth_fit', 'line')
+    if line_id:
+        animals = animals.filter(line_id=line_id)
+
+    target = float(target_kg)
+    predictions = []
+    for animal in animals:
+        fit = animal.growth_fit
+        asymptote, b, k = shrunk_curve(fit, priors.get(animal.line_id, priors[None]))
+        # Days the curve takes from the latest weighing to the target, so animals
+        # ahead of or behind their curve are projected from where they are
+        curve_age, target_age = age_at_weight(asymptote, b, k, fit.last_weight_kg), age_at_weight(asymptote, b, k, target)
+        if curve_age is None or target_age is None:
+            continue
+        age = fit.last_age_days + max(0, target_age - curve_age)
+        predicted_date = animal.birth_date + timedelta(days=math.ceil(age))
+        if not start_date <= predicted_date <= end_date:
+            continue
+        predictions.append({
+            'animal_id': animal.id,
+            'animal_tag': animal.unique_tag,
+            'line': animal.line.name if animal.line else None,
+            'sex': animal.sex,
+            'current_weight_kg': animal.current_weight_kg,
+            'last_weighed_date': animal.last_weighed_date,
+            'predicted_date': predicted_date,
+            'predicted_age_days': math.ceil(age),
+            'num_weights': fit.num_weights,
+            'fitted': fit.asymptote_kg is not None,
+            'asymptote_kg': round(asymptote, 3),
+        })
+    predictions.sort(key=lambda prediction: (prediction['predicted_date'], prediction['animal_tag']))
+    return predictions
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# Seconds finished jobs and their results are kept
+JOB_RETENTION = getattr(settings, 'REPORT_JOB_RETENTION', 86400)
+# Seconds after which a job still marked running is assumed lost with its worker
+JOB_STALE_AFTER = getattr(settings, 'REPORT_JOB_STALE_AFTER', 3600)
+
+
+def job_key(view_name, params):
+    return hashlib.sha1(json.dumps([view_name, params]).encode()).hexdigest()
+
+
+def submit_job(view_name, params):
+    """
+    Queues the report `view_name` (a ReportView subclass name) for the
+    normalized query `params`, unless the same report is already queued or
+    running, in which case that job is returned. Returns (job, created).
+    """
+    key = job_key(view_name, params)
+    for _ in range(3):
+        job = ReportJob.objects.in_flight().filter(key=key).first()
+        if job is not None:
+            return job, False
+        try:
+            with transaction.atomic():
+                return ReportJob.objects.create(view=view_name, params=params, key=key), True
+        except IntegrityError:
+            # A concurrent request queued the same report first
+            continue
+    raise RuntimeError(f'Could not queue {view_name}.')
+
+
+def claim_next_job():
+    """Marks the oldest queued job as running and returns it, or None when the queue is empty."""
+    queued = ReportJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:10]
+    for pk in queued:
+        # Conditional update: when several workers race for a job only one gets it
+        if ReportJob.objects.filter(pk=pk, status='queued').update(status='running', started_at=timezone.now()):
+            return ReportJob.objects.get(pk=pk)
+    return None
+
+
+def set_progress(job, done, total):
+    # Capped below 100 until the result is stored
+    ReportJob.objects.filter(pk=job.pk, status='running').update(progress=min(99, int(100 * done / total)) if total else 0)
+
+
+def report_request(params):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    # Stored as JSON, the (key, values) pairs come back as lists
+    request.GET = QueryDict(urlencode([(key, values) for key, values in params], doseq=True))
+    return request
+
+
+def run_job(job):
+    """Computes the job's report through its view, as a GET request would, and stores the response."""
+    from .base import REPORT_VIEWS
+
+    try:
+        view = REPORT_VIEWS[job.view].as_view(job=job)
+        response = view(report_request(job.params))
+        ReportJob.objects.filter(pk=job.pk).update(
+            status='done', progress=100, result=response.data, result_status=response.status_code, finished_at=timezone.now(),
+        )
+    except Exception as e:
+        logger.exception('Report job %s (%s) failed', job.pk, job.view)
+        ReportJob.objects.filter(pk=job.pk).update(status='failed', error=str(e) or type(e).__name__, finished_at=timezone.now())
+
+
+def fail_stale_jobs():
+    """Fails jobs left running by a worker that stopped. Returns how many."""
+    started_before = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+    return ReportJob.objects.filter(status='running', started_at__lt=started_before).update(
+        status='failed', error='The worker running this job stopped.', finished_at=timezone.now(),
+    )
+
+
+def purge_jobs():
+    """Deletes finished jobs older than JOB_RETENTION. Returns how many."""
+    finished_before = timezone.now() - timedelta(seconds=JOB_RETENTION)
+    deleted, _ = ReportJob.objects.filter(status__in=('done', 'failed'), finished_at__lt=finished_before).delete()
+    return deleted
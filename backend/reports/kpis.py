@@ -0,0 +1,253 @@
+from datetime import date, datetime
+from functools import cached_property
+
+from django.db.models import Count, Sum
+from core.models import Animal, AnimalHistory, FeedingLog, FinancialTransaction, Location, ReproductionEvent, WeightLog
+from .models import Alert, DailyFeedRollup, DailyFinanceRollup, DailyWeightRollup
+from .occupancy import density_percentage as location_density, occupied_locations
+
+class SectionError(Exception):
+    """A KPI that cannot be computed for the requested filters."""
+
+
+def parse_filters(params):
+    """
+    Reads the filters shared by the herd KPIs from query parameters. Dates only
+    apply when both are given, as in every report. Raises ValueError on a bad date.
+    """
+    filters = {
+        'start_date': None,
+        'end_date': None,
+        'animal_id': params.get('animal_id') or None,
+        'location_id': params.get('location_id') or None,
+        'as_of': None,
+    }
+    if params.get('start_date') and params.get('end_date'):
+        try:
+            filters['start_date'] = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+            filters['end_date'] = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date format. Use YYYY-MM-DD.')
+    if params.get('as_of'):
+        try:
+            filters['as_of'] = datetime.strptime(params['as_of'], '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date format. Use YYYY-MM-DD.')
+    return filters
+
+
+class KPIContext:
+    """
+    Aggregates shared between KPIs for one filter set, each computed at most
+    once: ICA and cost per kg share the weight total, cost per kg and P&L the
+    finance totals, and the reproduction KPIs the birth counts.
+    """
+
+    def __init__(self, filters, today=None):
+        self.filters = filters
+        self.today = today or date.today()
+
+    def in_period(self, queryset):
+        if self.filters['start_date'] and self.filters['end_date']:
+            return queryset.filter(date__range=[self.filters['start_date'], self.filters['end_date']])
+        return queryset
+
+    @cached_property
+    def weight_gained_kg(self):
+        weights = self.in_period(DailyWeightRollup.objects.all())
+        if self.filters['animal_id']:
+            weights = weights.filter(animal_id=self.filters['animal_id'])
+        if self.filters['location_id']:
+            weights = weights.filter(animal__location_id=self.filters['location_id'])
+        return weights.aggregate(Sum('weight_kg'))['weight_kg__sum'] or 0
+
+    @cached_property
+    def feed_consumed_kg(self):
+        feedings = self.in_period(DailyFeedRollup.objects.all())
+        if self.filters['animal_id']:
+            # Feedings reach an animal through its current location
+            feedings = feedings.filter(location__animal__id=self.filters['animal_id'])
+        if self.filters['location_id']:
+            feedings = feedings.filter(location_id=self.filters['location_id'])
+        return feedings.aggregate(Sum('quantity_kg'))['quantity_kg__sum'] or 0
+
+    @cached_property
+    def finance_totals(self):
+        """{transaction type: amount} in one grouped query."""
+        transactions = self.in_period(DailyFinanceRollup.objects.all())
+        if self.filters['animal_id']:
+            transactions = transactions.filter(related_entity_id=self.filters['animal_id'])
+        if self.filters['location_id']:
+            # Transactions whose related entity is an animal in the location
+            animals_in_location = Animal.objects.filter(location_id=self.filters['location_id'])
+            transactions = transactions.filter(related_entity_id__in=animals_in_location.values_list('id', flat=True))
+        return {row['type']: row['total'] for row in transactions.values('type').annotate(total=Sum('amount'))}
+
+    @cached_property
+    def births(self):
+        # Restricted to events with a birth so the partial index on them is used
+        return ReproductionEvent.objects.filter(actual_birth_date__isnull=False).aggregate(
+            events_with_birth=Count('id'),
+            females_gave_birth=Count('female', distinct=True),
+        )
+
+    @cached_property
+    def total_live_births(self):
+        return ReproductionEvent.objects.aggregate(Sum('live_births'))['live_births__sum'] or 0
+
+    @cached_property
+    def pregnant_females(self):
+        return Animal.objects.filter(sex='F', status='Pregnant').count() # Simplified
+
+
+def ica(context):
+    total_feed_consumed = context.feed_consumed_kg
+    total_weight_gained = context.weight_gained_kg
+    ica = total_feed_consumed / total_weight_gained if total_weight_gained > 0 else 0
+    return {
+        'total_feed_consumed_kg': total_feed_consumed,
+        'total_weight_gained_kg': total_weight_gained,
+        'ica': round(ica, 2)
+    }
+
+
+def cost_per_kg_gained(context):
+    if context.filters['location_id']:
+        # This would require a more complex join or assumption about related_entity_id for locations
+        raise SectionError('Filtering by location_id for CostPerKgGained is not yet fully implemented.')
+    total_feed_cost = context.finance_totals.get('Costo') or 0
+    total_weight_gained = context.weight_gained_kg
+    cost_per_kg_gained = total_feed_cost / total_weight_gained if total_weight_gained > 0 else 0
+    return {
+        'total_feed_cost': total_feed_cost,
+        'total_weight_gained_kg': total_weight_gained,
+        'cost_per_kg_gained': round(cost_per_kg_gained, 2)
+    }
+
+
+def profit_and_loss(context):
+    total_income = context.finance_totals.get('Ingreso') or 0
+    total_cost = context.finance_totals.get('Costo') or 0
+    return {
+        'total_income': total_income,
+        'total_cost': total_cost,
+        'profit_loss': total_income - total_cost
+    }
+
+
+def fertility_rate(context):
+    total_females_breeding = context.pregnant_females
+    total_females_pregnant = context.births['females_gave_birth']
+    fertility_rate = (total_females_pregnant / total_females_breeding) * 100 if total_females_breeding > 0 else 0
+    return {
+        'total_females_breeding': total_females_breeding,
+        'total_females_pregnant': total_females_pregnant,
+        'fertility_rate': round(fertility_rate, 2)
+    }
+
+
+def parturition_rate(context):
+    total_females_gave_birth = context.births['females_gave_birth']
+    total_females_pregnant = context.pregnant_females
+    parturition_rate = (total_females_gave_birth / total_females_pregnant) * 100 if total_females_pregnant > 0 else 0
+    return {
+        'total_females_gave_birth': total_females_gave_birth,
+        'total_females_pregnant': total_females_pregnant,
+        'parturition_rate': round(parturition_rate, 2)
+    }
+
+
+def prolificacy(context):
+    total_live_births = context.total_live_births
+    total_reproduction_events_with_birth = context.births['events_with_birth']
+    prolificacy = total_live_births / total_reproduction_events_with_birth if total_reproduction_events_with_birth > 0 else 0
+    return {
+        'total_live_births': total_live_births,
+        'total_reproduction_events_with_birth': total_reproduction_events_with_birth,
+        'prolificacy': round(prolificacy, 2)
+    }
+
+
+def wpi(context):
+    # Weaning Productive Index (WPI) is complex and requires more data (e.g., number of weaned animals).
+    # For now, a placeholder.
+    return {
+        'message': 'WPI calculation is complex and requires more data.',
+        'wpi': 0.0
+    }
+
+
+def open_alerts(alert_type):
+    # Maintained by reports.alerts as the data changes, so reading them is O(open alerts)
+    return [alert.data for alert in Alert.objects.open().filter(type=alert_type).order_by('id')]
+
+
+def withdrawal_alerts(context):
+    return open_alerts('withdrawal')
+
+
+def ineffective_treatment_alerts(context):
+    return open_alerts('ineffective_treatment')
+
+
+def low_stock_alerts(context):
+    return open_alerts('low_stock')
+
+
+def reproductive_ranking(context):
+    # Simplified ranking by total live births
+    ranked_animals = Animal.objects.filter(sex='F').annotate(
+        total_live_births=Sum('reproduction_events_female__live_births')
+    ).order_by('-total_live_births')
+    return [
+        {
+            'animal_id': animal.id,
+            'animal_tag': animal.unique_tag,
+            'total_live_births': animal.total_live_births or 0
+        }
+        for animal in ranked_animals
+    ]
+
+
+def density(context):
+    # Current density vs. capacity for each location, excluding sold and deceased animals;
+    # with the as_of filter, the headcount on that date against today's capacity.
+    locations_data = []
+    for location in occupied_locations(as_of=context.filters['as_of']):
+        current_animals = location.current_animals
+        density_percentage = location_density(current_animals, location.capacity)
+
+        alert = None
+        if density_percentage > 100:
+            alert = f"Location {location.name} is over capacity! ({density_percentage:.2f}%)"
+        elif density_percentage > 80:
+            alert = f"Location {location.name} is nearing capacity. ({density_percentage:.2f}%)"
+
+        locations_data.append({
+            'location_id': location.id,
+            'location_name': location.name,
+            'location_type': location.type,
+            'capacity': location.capacity,
+            'current_animals': current_animals,
+            'density_percentage': density_percentage,
+            'alert': alert
+        })
+    return locations_data
+
+
+# Dashboard sections: name -> (function of a KPIContext, models whose writes change it).
+# The rollups change exactly when their raw tables do, so the raw tables are listed.
+SECTIONS = {
+    'ica': (ica, (WeightLog, FeedingLog, Animal)),
+    'cost_per_kg_gained': (cost_per_kg_gained, (FinancialTransaction, WeightLog)),
+    'profit_and_loss': (profit_and_loss, (FinancialTransaction, Animal)),
+    'fertility_rate': (fertility_rate, (Animal, ReproductionEvent)),
+    'parturition_rate': (parturition_rate, (Animal, ReproductionEvent)),
+    'prolificacy': (prolificacy, (ReproductionEvent,)),
+    'wpi': (wpi, ()),
+    'withdrawal_alerts': (withdrawal_alerts, (Alert,)),
+    'ineffective_treatment_alerts': (ineffective_treatment_alerts, (Alert,)),
+    'low_stock_alerts': (low_stock_alerts, (Alert,)),
+    'reproductive_ranking': (reproductive_ranking, (Animal, ReproductionEvent)),
+    'density': (density, (Location, Animal, AnimalHistory)),
+}
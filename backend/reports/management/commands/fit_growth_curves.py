@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from reports.growth import refresh_fits
+
+
+class Command(BaseCommand):
+    help = (
+        'Fits growth curves to the animals weighed since their last fit; run after large imports, from cron, '
+        'or with --watch to keep refitting until interrupted. Several can run side by side.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refit every weighed animal.')
+        parser.add_argument('--watch', action='store_true', help='Keep refitting until interrupted.')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between refits with --watch.')
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0:
+            raise CommandError('--interval must be positive.')
+        refit_all = options['all']
+        while True:
+            fitted, removed = refresh_fits(refit_all=refit_all)
+            if fitted or removed or not options['watch']:
+                self.stdout.write(self.style.SUCCESS(f'Fitted {fitted} animals, removed {removed} stale fits.'))
+            if not options['watch']:
+                break
+            # --all applies to the first pass only
+            refit_all = False
+            time.sleep(options['interval'])
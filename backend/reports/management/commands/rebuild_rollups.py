@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from reports.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily feed, weight and finance rollups from the raw logs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert.')
+
+    def handle(self, *args, **options):
+        counts = rebuild_rollups(batch_size=options['batch_size'])
+        for table, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {table}: {count} rows.'))
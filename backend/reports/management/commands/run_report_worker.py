@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from reports.jobs import claim_next_job, fail_stale_jobs, purge_jobs, run_job
+
+# Seconds between purges of old finished jobs
+PURGE_INTERVAL = 600
+
+
+def run_in_thread(job):
+    try:
+        run_job(job)
+    finally:
+        # Each worker thread holds its own database connection
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs report jobs submitted with ?async=1, several at a time, until interrupted. '
+        'More workers can run side by side, e.g. one per CPU.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help='Jobs run concurrently.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between queue checks when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        if threads < 1:
+            raise CommandError('--threads must be at least 1.')
+        stale = fail_stale_jobs()
+        if stale:
+            self.stdout.write(f'Failed {stale} jobs left running by a stopped worker.')
+
+        completed, last_purge = 0, 0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            running = set()
+            while True:
+                running = {future for future in running if not future.done()}
+                job = claim_next_job() if len(running) < threads else None
+                if job is not None:
+                    running.add(pool.submit(run_in_thread, job))
+                    completed += 1
+                    continue
+                if options['once'] and not running:
+                    break
+                if time.monotonic() - last_purge > PURGE_INTERVAL:
+                    purge_jobs()
+                    last_purge = time.monotonic()
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {completed} report jobs.'))
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from reports.occupancy import snapshot_occupancy
+
+
+class Command(BaseCommand):
+    help = "Records today's headcount per location into the occupancy history (run daily, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Date to record the current headcount under (YYYY-MM-DD). Defaults to today.')
+
+    def handle(self, *args, **options):
+        snapshot_date = None
+        if options['date']:
+            try:
+                snapshot_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid date format. Use YYYY-MM-DD.')
+        count = snapshot_occupancy(snapshot_date)
+        self.stdout.write(self.style.SUCCESS(f'Recorded occupancy for {count} locations.'))
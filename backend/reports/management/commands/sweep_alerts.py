@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from reports.alerts import sweep_alerts
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-evaluates every alert rule, opening and resolving stored alerts. Alerts follow data changes on their own; '
+        'run this daily (e.g. from cron) for conditions that change with time, such as withdrawal periods ending.'
+    )
+
+    def handle(self, *args, **options):
+        for alert_type, (opened, updated, resolved) in sweep_alerts().items():
+            self.stdout.write(self.style.SUCCESS(f'{alert_type}: {opened} opened, {updated} updated, {resolved} resolved.'))
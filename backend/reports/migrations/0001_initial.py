@@ -0,0 +1,33 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0010_animalancestor_inbreeding_coefficient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('animal_count', models.IntegerField()),
+                ('capacity', models.IntegerField()),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_history', to='core.location')),
+            ],
+            options={
+                'ordering': ['date', 'location'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='locationoccupancy',
+            constraint=models.UniqueConstraint(fields=('location', 'date'), name='unique_location_occupancy_date'),
+        ),
+    ]
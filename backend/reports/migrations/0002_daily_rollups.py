@@ -0,0 +1,102 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:14
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    # Same grouping as reports.rollups, against the historical models
+    sources = (
+        ('DailyFeedRollup', 'FeedingLog', {'date': 'log_date', 'location_id': 'location_id', 'feed_type': 'feed_type'}, {'quantity_kg': 'quantity_kg'}, 'num_logs'),
+        ('DailyWeightRollup', 'WeightLog', {'date': 'log_date', 'animal_id': 'animal_id'}, {'weight_kg': 'weight_kg'}, 'num_logs'),
+        ('DailyFinanceRollup', 'FinancialTransaction', {'date': 'transaction_date', 'type': 'type', 'related_entity_id': 'related_entity_id'}, {'amount': 'amount'}, 'num_transactions'),
+    )
+    for rollup_name, source_name, dimensions, measures, count_field in sources:
+        Rollup = apps.get_model('reports', rollup_name)
+        Source = apps.get_model('core', source_name)
+        aggregates = {rollup_field: Sum(field) for rollup_field, field in measures.items()}
+        aggregates[count_field] = Count('id')
+        rows = Source.objects.order_by().values(*dimensions.values()).annotate(**aggregates)
+        Rollup.objects.bulk_create([
+            Rollup(
+                **{rollup_field: row[field] for rollup_field, field in dimensions.items()},
+                **{field: row[field] for field in list(measures) + [count_field]},
+            )
+            for row in rows.iterator()
+        ], batch_size=5000)
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_report_indexes'),
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFeedRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('feed_type', models.CharField(max_length=100)),
+                ('quantity_kg', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('num_logs', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyWeightRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('weight_kg', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('num_logs', models.IntegerField()),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weight_rollups', to='core.animal')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyFinanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(max_length=10)),
+                ('related_entity_id', models.IntegerField(blank=True, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('num_transactions', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'type'], name='financerollup_date_type_idx'), models.Index(fields=['related_entity_id', 'date'], name='financerollup_entity_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyfinancerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('related_entity_id__isnull', False)), fields=('date', 'type', 'related_entity_id'), name='unique_finance_rollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyfinancerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('related_entity_id__isnull', True)), fields=('date', 'type'), name='unique_finance_rollup_unrelated'),
+        ),
+        migrations.AddField(
+            model_name='dailyfeedrollup',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_rollups', to='core.location'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyweightrollup',
+            index=models.Index(fields=['animal', 'date'], name='weightrollup_animal_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyweightrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'animal'), name='unique_weight_rollup_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyfeedrollup',
+            index=models.Index(fields=['location', 'date'], name='feedrollup_location_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyfeedrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'location', 'feed_type'), name='unique_feed_rollup_bucket'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
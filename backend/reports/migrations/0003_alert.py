@@ -0,0 +1,36 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('withdrawal', 'Withdrawal'), ('ineffective_treatment', 'Ineffective treatment'), ('low_stock', 'Low stock'), ('density', 'Density')], max_length=30)),
+                ('severity', models.CharField(choices=[('info', 'Info'), ('warning', 'Warning'), ('critical', 'Critical')], max_length=10)),
+                ('subject', models.CharField(max_length=50)),
+                ('key', models.CharField(blank=True, default='', max_length=64)),
+                ('message', models.TextField()),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('resolved_at__isnull', True)), fields=['type', 'severity'], name='alert_open_type_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='alert',
+            constraint=models.UniqueConstraint(condition=models.Q(('resolved_at__isnull', True)), fields=('type', 'subject', 'key'), name='unique_open_alert'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_feedinventory_lead_time_days'),
+        ('reports', '0004_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrowthCurveFit',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='growth_fit', serialize=False, to='core.animal')),
+                ('weights_signature', models.CharField(max_length=100)),
+                ('num_weights', models.IntegerField()),
+                ('asymptote_kg', models.FloatField(blank=True, null=True)),
+                ('b', models.FloatField(blank=True, null=True)),
+                ('k', models.FloatField(blank=True, null=True)),
+                ('rmse_kg', models.FloatField(blank=True, null=True)),
+                ('last_age_days', models.IntegerField()),
+                ('last_weight_kg', models.FloatField()),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
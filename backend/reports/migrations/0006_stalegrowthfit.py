@@ -0,0 +1,26 @@
+# Generated by Django 4.2.13 on 2026-10-18 15:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_animalhistory'),
+        ('reports', '0005_growthcurvefit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleGrowthFit',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stale_growth_fit', serialize=False, to='core.animal')),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='growthcurvefit',
+            name='weights_signature',
+        ),
+    ]
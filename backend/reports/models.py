@@ -1,3 +1,213 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from core.models import Animal, Location
 
-# Create your models here.
+
+class LocationOccupancy(models.Model):
+    # Daily headcount per location, written by the snapshot_occupancy command
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='occupancy_history')
+    date = models.DateField()
+    animal_count = models.IntegerField()
+    capacity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'date'], name='unique_location_occupancy_date'),
+        ]
+        ordering = ['date', 'location']
+
+    def __str__(self):
+        return f"{self.location.name} on {self.date}: {self.animal_count}/{self.capacity}"
+
+
+# Daily rollups kept in sync with the raw logs by reports.rollups. Each row
+# holds the totals of one bucket and how many raw rows it covers; a bucket
+# whose last row is removed is deleted.
+
+class DailyFeedRollup(models.Model):
+    date = models.DateField()
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='feed_rollups')
+    feed_type = models.CharField(max_length=100)
+    quantity_kg = models.DecimalField(max_digits=14, decimal_places=2)
+    num_logs = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'location', 'feed_type'], name='unique_feed_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['location', 'date'], name='feedrollup_location_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.location.name} - {self.feed_type} on {self.date}: {self.quantity_kg} kg"
+
+class DailyWeightRollup(models.Model):
+    # Per animal, so location filters follow the animal's current location like the raw reports do
+    date = models.DateField()
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='weight_rollups')
+    weight_kg = models.DecimalField(max_digits=14, decimal_places=2)
+    num_logs = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'animal'], name='unique_weight_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['animal', 'date'], name='weightrollup_animal_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.animal.unique_tag} on {self.date}: {self.weight_kg} kg"
+
+class DailyFinanceRollup(models.Model):
+    date = models.DateField()
+    type = models.CharField(max_length=10)
+    related_entity_id = models.IntegerField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=16, decimal_places=2)
+    num_transactions = models.IntegerField()
+
+    class Meta:
+        # NULL never conflicts in a unique constraint, so transactions without a
+        # related entity need their own one.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'type', 'related_entity_id'], name='unique_finance_rollup_bucket',
+                condition=models.Q(related_entity_id__isnull=False),
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'type'], name='unique_finance_rollup_unrelated',
+                condition=models.Q(related_entity_id__isnull=True),
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'type'], name='financerollup_date_type_idx'),
+            models.Index(fields=['related_entity_id', 'date'], name='financerollup_entity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} on {self.date}: {self.amount}"
+
+class AlertQuerySet(models.QuerySet):
+    def open(self):
+        return self.filter(resolved_at__isnull=True)
+
+class Alert(models.Model):
+    # Conditions detected by reports.alerts. At most one open alert exists per
+    # (type, subject, key); when the condition clears the alert is resolved and
+    # kept as history, so reads of open alerts never scan the history.
+    TYPE_CHOICES = (
+        ('withdrawal', 'Withdrawal'),
+        ('ineffective_treatment', 'Ineffective treatment'),
+        ('low_stock', 'Low stock'),
+        ('density', 'Density'),
+    )
+    SEVERITY_CHOICES = (
+        ('info', 'Info'),
+        ('warning', 'Warning'),
+        ('critical', 'Critical'),
+    )
+    type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES)
+    # The row the alert is about, e.g. 'animal:12', and what about it (a treatment, a diagnosis...)
+    subject = models.CharField(max_length=50)
+    key = models.CharField(max_length=64, blank=True, default='')
+    message = models.TextField()
+    # The alert as the report endpoints return it
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AlertQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['type', 'subject', 'key'], name='unique_open_alert',
+                condition=models.Q(resolved_at__isnull=True),
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['type', 'severity'], name='alert_open_type_idx', condition=models.Q(resolved_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.get_severity_display()} {self.get_type_display()} alert for {self.subject}"
+
+class ReportJobQuerySet(models.QuerySet):
+    def in_flight(self):
+        return self.filter(status__in=ReportJob.IN_FLIGHT_STATUSES)
+
+class ReportJob(models.Model):
+    # A report computed in the background by the run_report_worker command
+    # (see reports.jobs). Identical requests submitted while a job is queued or
+    # running share it: at most one in-flight job exists per key.
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    IN_FLIGHT_STATUSES = ('queued', 'running')
+
+    # ReportView subclass name and its normalized query parameters
+    view = models.CharField(max_length=100)
+    params = models.JSONField(default=list)
+    key = models.CharField(max_length=40)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)
+    # The report's response: its data (a result or an error) and HTTP status
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    result_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ReportJobQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], name='unique_in_flight_report_job',
+                condition=models.Q(status__in=('queued', 'running')),
+            ),
+        ]
+        indexes = [
+            # The worker's queue, oldest first
+            models.Index(fields=['created_at'], name='reportjob_queued_idx', condition=models.Q(status='queued')),
+        ]
+
+    def __str__(self):
+        return f"{self.view} job {self.pk} ({self.status})"
+
+class GrowthCurveFit(models.Model):
+    # Gompertz curve weight = asymptote_kg * exp(-b * exp(-k * age_days)) fitted
+    # to one animal's own weighings by reports.growth, and refitted only when
+    # they change (StaleGrowthFit). The line prior is applied when predicting,
+    # so fits stay current when other animals are weighed.
+    animal = models.OneToOneField(Animal, on_delete=models.CASCADE, primary_key=True, related_name='growth_fit')
+    num_weights = models.IntegerField()
+    # Null when the animal has too few weighings to be fitted on its own
+    asymptote_kg = models.FloatField(null=True, blank=True)
+    b = models.FloatField(null=True, blank=True)
+    k = models.FloatField(null=True, blank=True)
+    rmse_kg = models.FloatField(null=True, blank=True)
+    # Latest weighing, which the line curve is scaled to for animals without a fit
+    last_age_days = models.IntegerField()
+    last_weight_kg = models.FloatField()
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Growth curve of {self.animal_id} ({self.num_weights} weighings)"
+
+class StaleGrowthFit(models.Model):
+    # Animals whose weighings or birth date changed since their GrowthCurveFit,
+    # marked by reports.signals and refitted by reports.growth.refresh_fits()
+    animal = models.OneToOneField(Animal, on_delete=models.CASCADE, primary_key=True, related_name='stale_growth_fit')
+    marked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Growth curve of {self.animal_id} to refit"
@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.db.models import Count, Q
+from core.models import Animal, Location
+from core.signals import notify_bulk_write
+from .models import LocationOccupancy
+
+
+def occupied_locations(as_of=None):
+    """
+    Every location annotated with its current headcount, or its headcount on
+    the date `as_of` from AnimalHistory, in one grouped query.
+    """
+    if as_of is None:
+        return Location.objects.annotate(
+            current_animals=Count('animal', filter=~Q(animal__status__in=Animal.INACTIVE_STATUSES))
+        ).order_by('id')
+    on_date = Q(animal_history__valid_from__lte=as_of) & (Q(animal_history__valid_to__isnull=True) | Q(animal_history__valid_to__gt=as_of))
+    return Location.objects.annotate(
+        current_animals=Count('animal_history', filter=on_date & ~Q(animal_history__status__in=Animal.INACTIVE_STATUSES))
+    ).order_by('id')
+
+
+def density_percentage(animal_count, capacity):
+    return round((animal_count / capacity) * 100, 2) if capacity > 0 else 0
+
+
+def snapshot_occupancy(snapshot_date=None):
+    """Stores (or refreshes) one LocationOccupancy row per location for the given day."""
+    snapshot_date = snapshot_date or date.today()
+    rows = [
+        LocationOccupancy(
+            location_id=location.id,
+            date=snapshot_date,
+            animal_count=location.current_animals,
+            capacity=location.capacity,
+        )
+        for location in occupied_locations()
+    ]
+    LocationOccupancy.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['location', 'date'],
+        update_fields=['animal_count', 'capacity'],
+    )
+    notify_bulk_write(LocationOccupancy)
+    return len(rows)
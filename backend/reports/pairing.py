@@ -0,0 +1,120 @@
+import heapq
+from datetime import date
+
+from django.db.models import F
+from core.models import Animal
+from core.pedigree import DEFAULT_GENERATIONS, Pedigree, as_coefficient
+
+PAIRING_REASON = 'Both breeding ready and no immediate family ties.'
+
+
+def load_breeders(line_id=None, location_id=None, today=None):
+    """
+    Loads every breeding-ready animal in a single query.
+
+    Returns (females, males), each a list of dicts sorted by latest weight
+    (heaviest first) so the best candidates are paired first.
+    """
+    today = today or date.today()
+    animals = Animal.objects.filter(sex__in=['F', 'M'])
+    if line_id:
+        animals = animals.filter(line_id=line_id)
+    if location_id:
+        animals = animals.filter(location_id=location_id)
+
+    females, males = [], []
+    rows = animals.values('id', 'unique_tag', 'sex', 'birth_date', 'sire_id', 'dam_id', latest_weight_kg=F('current_weight_kg'))
+    for row in rows:
+        if not Animal.meets_breeding_readiness(row['sex'], row['birth_date'], row['latest_weight_kg'], today=today):
+            continue
+        (females if row['sex'] == 'F' else males).append(row)
+
+    sort_key = lambda row: (-(row['latest_weight_kg'] or 0), row['id'])
+    females.sort(key=sort_key)
+    males.sort(key=sort_key)
+    return females, males
+
+
+def blocked_pairs(females, males):
+    """
+    Builds the set of (female_id, male_id) pairs with immediate family ties:
+    parent-offspring in either direction and full siblings.
+    """
+    female_ids = {female['id'] for female in females}
+    male_ids = {male['id'] for male in males}
+
+    blocked = set()
+    males_by_parents = {}
+    for male in males:
+        # Male is the offspring of a ready female
+        for parent_id in (male['sire_id'], male['dam_id']):
+            if parent_id in female_ids:
+                blocked.add((parent_id, male['id']))
+        if male['sire_id'] and male['dam_id']:
+            males_by_parents.setdefault((male['sire_id'], male['dam_id']), []).append(male['id'])
+
+    for female in females:
+        # Female is the offspring of a ready male
+        for parent_id in (female['sire_id'], female['dam_id']):
+            if parent_id in male_ids:
+                blocked.add((female['id'], parent_id))
+        # Siblings (simplified: same sire and dam)
+        if female['sire_id'] and female['dam_id']:
+            for male_id in males_by_parents.get((female['sire_id'], female['dam_id']), ()):
+                blocked.add((female['id'], male_id))
+    return blocked
+
+
+def iter_ranked_pairs(females, males, blocked=frozenset(), pedigree=None, generations=DEFAULT_GENERATIONS, max_kinship=None):
+    """
+    Lazily yields eligible pairs ranked by combined latest weight.
+
+    Both lists must be sorted heaviest first (see load_breeders). Pairs are
+    enumerated best-first with a heap over (female, male) index pairs, so
+    producing the first k pairs costs O(k log F) instead of building the full
+    F x M product. When a pedigree is given, each pair carries the
+    coefficient of kinship of the two animals and pairs above max_kinship are
+    skipped.
+    """
+    if not females or not males:
+        return
+
+    def weight(row):
+        return row['latest_weight_kg'] or 0
+
+    heap = [(-(weight(females[0]) + weight(males[0])), 0, 0)]
+    while heap:
+        neg_score, i, j = heapq.heappop(heap)
+        female, male = females[i], males[j]
+
+        if j + 1 < len(males):
+            heapq.heappush(heap, (-(weight(female) + weight(males[j + 1])), i, j + 1))
+        if j == 0 and i + 1 < len(females):
+            heapq.heappush(heap, (-(weight(females[i + 1]) + weight(males[0])), i + 1, 0))
+
+        if (female['id'], male['id']) in blocked:
+            continue
+
+        pair = {
+            'female_id': female['id'],
+            'female_tag': female['unique_tag'],
+            'male_id': male['id'],
+            'male_tag': male['unique_tag'],
+            'combined_weight_kg': -neg_score,
+            'reason': PAIRING_REASON,
+        }
+        if pedigree is not None:
+            kinship = as_coefficient(pedigree.coancestry(female['id'], male['id'], generations))
+            if max_kinship is not None and kinship > max_kinship:
+                continue
+            pair['coefficient_of_kinship'] = kinship
+        yield pair
+
+
+def ranked_pairs(line_id=None, location_id=None, today=None, generations=DEFAULT_GENERATIONS, max_kinship=None):
+    females, males = load_breeders(line_id=line_id, location_id=location_id, today=today)
+    pedigree = Pedigree.load([row['id'] for row in females + males], generations)
+    return iter_ranked_pairs(
+        females, males, blocked_pairs(females, males),
+        pedigree=pedigree, generations=generations, max_kinship=max_kinship,
+    )
@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Prefetch, Sum
+from core.models import FeedRation, RationComponent
+from .models import DailyFeedRollup
+from .occupancy import occupied_locations
+
+# Days of feeding history used to measure a location's intake per animal
+INTAKE_WINDOW_DAYS = 30
+COST_PLACES = Decimal('0.0001')
+MONEY_PLACES = Decimal('0.01')
+INTAKE_PLACES = Decimal('0.001')
+
+
+def ration_costs():
+    """
+    Cost per kg of every ration, with each component's share, in two queries.
+    A ration whose components do not add up to 100% has no cost but an error.
+    """
+    components = RationComponent.objects.select_related('feed_item').order_by('id')
+    rations = FeedRation.objects.prefetch_related(Prefetch('rationcomponent_set', queryset=components)).order_by('name')
+
+    results = []
+    for ration in rations:
+        rows = [
+            {
+                'feed_item_id': component.feed_item_id,
+                'feed_item_name': component.feed_item.product_name,
+                'percentage': component.percentage,
+                'cost_per_kg': component.feed_item.cost_per_kg,
+                'cost_share': (component.percentage * component.feed_item.cost_per_kg / 100).quantize(COST_PLACES),
+            }
+            for component in ration.rationcomponent_set.all()
+        ]
+        total = sum((row['percentage'] for row in rows), Decimal('0'))
+        result = {
+            'ration_id': ration.id,
+            'ration_name': ration.name,
+            'percentage_total': total,
+            'cost_per_kg': sum((row['cost_share'] for row in rows), Decimal('0')),
+            'components': rows,
+            'error': None,
+        }
+        if total != 100:
+            result['cost_per_kg'] = None
+            result['error'] = f'Components add up to {total}%, not 100%.'
+        results.append(result)
+    return results
+
+
+def location_projections(rations, intake_kg=None, location_id=None, today=None):
+    """
+    Projected daily cost of feeding each location every costed ration in
+    `rations` (from ration_costs()). Daily intake is the current headcount
+    times `intake_kg` per animal or, when not given, the kg per animal fed to
+    the location on an average feeding day of the last INTAKE_WINDOW_DAYS days,
+    so a location fed only recently is not diluted over the whole window.
+    """
+    today = today or date.today()
+    locations = occupied_locations()
+    if location_id:
+        locations = locations.filter(id=location_id)
+    feedings = DailyFeedRollup.objects.filter(date__gt=today - timedelta(days=INTAKE_WINDOW_DAYS), date__lte=today)
+    if location_id:
+        feedings = feedings.filter(location_id=location_id)
+    fed = {
+        row['location']: (row['total'], row['days'])
+        for row in feedings.values('location').annotate(total=Sum('quantity_kg'), days=Count('date', distinct=True))
+    }
+    costed = [ration for ration in rations if ration['cost_per_kg'] is not None]
+
+    results = []
+    for location in locations:
+        headcount = location.current_animals
+        if intake_kg is not None:
+            per_animal, source = intake_kg, 'parameter'
+        elif headcount and location.id in fed:
+            total, days = fed[location.id]
+            per_animal, source = (total / days / headcount).quantize(INTAKE_PLACES), 'feeding_history'
+        else:
+            per_animal, source = None, None
+        daily_intake = per_animal * headcount if per_animal is not None else None
+        results.append({
+            'location_id': location.id,
+            'location_name': location.name,
+            'headcount': headcount,
+            'intake_kg_per_animal': per_animal,
+            'intake_source': source,
+            'daily_intake_kg': daily_intake,
+            'daily_costs': [
+                {
+                    'ration_id': ration['ration_id'],
+                    'ration_name': ration['ration_name'],
+                    'daily_cost': (daily_intake * ration['cost_per_kg']).quantize(MONEY_PLACES) if daily_intake is not None else None,
+                }
+                for ration in costed
+            ],
+        })
+    return results
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from core.models import FeedingLog, FinancialTransaction, WeightLog
+from .models import DailyFeedRollup, DailyFinanceRollup, DailyWeightRollup
+
+
+class Rollup:
+    """
+    A daily rollup of a raw table.
+
+    `dimensions` pairs each rollup key field with the raw field it comes
+    from (the date first); `measures` pairs each rollup total with the raw
+    field it sums, or None for the count of raw rows, which must come last.
+    Totals are maintained with deltas applied under row locks, so concurrent
+    writers to one bucket never lose each other's updates.
+    """
+
+    def __init__(self, model, source, dimensions, measures):
+        self.model = model
+        self.source = source
+        self.dimensions = dimensions
+        self.measures = measures
+        self.count_field = measures[-1][0]
+
+    @property
+    def source_fields(self):
+        return [field for _, field in self.dimensions] + [field for _, field in self.measures if field]
+
+    def key_of(self, values):
+        return tuple(values[field] for _, field in self.dimensions)
+
+    def delta_of(self, values, sign=1):
+        return {
+            rollup_field: sign * (values[field] if field else 1)
+            for rollup_field, field in self.measures
+        }
+
+    def row_values(self, instance):
+        # Values as the database stores them: instances may still hold floats or strings
+        values = {}
+        for field_name in self.source_fields:
+            field = self.source._meta.get_field(field_name)
+            value = field.to_python(getattr(instance, field.attname))
+            if isinstance(field, DecimalField) and value is not None:
+                value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+            values[field_name] = value
+        return values
+
+    def saved_values(self, pk):
+        return self.source.objects.filter(pk=pk).values(*self.source_fields).first()
+
+    def changes(self, added=(), removed=()):
+        """Sums the deltas of added and removed raw rows (as value dicts) per bucket."""
+        deltas = defaultdict(lambda: defaultdict(int))
+        for rows, sign in ((added, 1), (removed, -1)):
+            for values in rows:
+                for rollup_field, value in self.delta_of(values, sign).items():
+                    deltas[self.key_of(values)][rollup_field] += value
+        return {key: dict(change) for key, change in deltas.items() if any(change.values())}
+
+    def bucket_filter(self, keys):
+        # Superset of the buckets in `keys`, one IN per dimension
+        conditions = Q()
+        for position, (rollup_field, _) in enumerate(self.dimensions):
+            values = {key[position] for key in keys}
+            condition = Q(**{f'{rollup_field}__in': values - {None}})
+            if None in values:
+                condition |= Q(**{f'{rollup_field}__isnull': True})
+            conditions &= condition
+        return conditions
+
+    def apply(self, deltas, attempts=3):
+        if not deltas:
+            return
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    self._apply(deltas)
+                return
+            except IntegrityError:
+                # Another writer created one of the buckets first; it is locked on retry.
+                if attempt == attempts - 1:
+                    raise
+
+    def _apply(self, deltas):
+        key_fields = [rollup_field for rollup_field, _ in self.dimensions]
+        existing = {
+            tuple(getattr(row, field) for field in key_fields): row
+            for row in self.model.objects.select_for_update().filter(self.bucket_filter(deltas))
+        }
+        to_create, to_update, to_delete = [], [], []
+        for key, change in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                # Removing rows from a bucket that is already gone, e.g. during a cascade delete
+                if change.get(self.count_field, 0) > 0:
+                    to_create.append(self.model(**dict(zip(key_fields, key)), **change))
+                continue
+            for rollup_field, value in change.items():
+                setattr(row, rollup_field, getattr(row, rollup_field) + value)
+            (to_delete if getattr(row, self.count_field) <= 0 else to_update).append(row)
+
+        if to_delete:
+            self.model.objects.filter(pk__in=[row.pk for row in to_delete]).delete()
+        if to_update:
+            self.model.objects.bulk_update(to_update, [rollup_field for rollup_field, _ in self.measures], batch_size=1000)
+        if to_create:
+            self.model.objects.bulk_create(to_create, batch_size=1000)
+
+    def totals(self, source_queryset=None):
+        """Grouped totals of the raw table, as rollup instances."""
+        source_queryset = self.source.objects.all() if source_queryset is None else source_queryset
+        aggregates = {
+            rollup_field: Sum(field) if field else Count('id')
+            for rollup_field, field in self.measures
+        }
+        rows = source_queryset.order_by().values(*[field for _, field in self.dimensions]).annotate(**aggregates)
+        for row in rows.iterator():
+            yield self.model(
+                **{rollup_field: row[field] for rollup_field, field in self.dimensions},
+                **{rollup_field: row[rollup_field] for rollup_field, _ in self.measures},
+            )
+
+    def rebuild(self, batch_size=5000):
+        with transaction.atomic():
+            self.model.objects.all().delete()
+            created = 0
+            batch = []
+            for row in self.totals():
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    created += len(self.model.objects.bulk_create(batch))
+                    batch = []
+            created += len(self.model.objects.bulk_create(batch))
+        return created
+
+
+FEED_ROLLUP = Rollup(
+    DailyFeedRollup, FeedingLog,
+    dimensions=(('date', 'log_date'), ('location_id', 'location_id'), ('feed_type', 'feed_type')),
+    measures=(('quantity_kg', 'quantity_kg'), ('num_logs', None)),
+)
+
+WEIGHT_ROLLUP = Rollup(
+    DailyWeightRollup, WeightLog,
+    dimensions=(('date', 'log_date'), ('animal_id', 'animal_id')),
+    measures=(('weight_kg', 'weight_kg'), ('num_logs', None)),
+)
+
+FINANCE_ROLLUP = Rollup(
+    DailyFinanceRollup, FinancialTransaction,
+    dimensions=(('date', 'transaction_date'), ('type', 'type'), ('related_entity_id', 'related_entity_id')),
+    measures=(('amount', 'amount'), ('num_transactions', None)),
+)
+
+ROLLUPS = {rollup.source: rollup for rollup in (FEED_ROLLUP, WEIGHT_ROLLUP, FINANCE_ROLLUP)}
+
+
+def rebuild_rollups(batch_size=5000):
+    """Recomputes every rollup table from the raw logs. Returns {table: rows}."""
+    return {rollup.model._meta.db_table: rollup.rebuild(batch_size) for rollup in ROLLUPS.values()}
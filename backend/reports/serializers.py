@@ -1,4 +1,6 @@
+from django.urls import reverse
 from rest_framework import serializers
+from .models import Alert, ReportJob
 
 class ICAReportSerializer(serializers.Serializer):
     total_feed_consumed_kg = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -30,6 +32,21 @@ class GDPReportSerializer(serializers.Serializer):
     num_days = serializers.IntegerField()
     gdp = serializers.DecimalField(max_digits=10, decimal_places=2)
 
+class HerdGDPRowSerializer(serializers.Serializer):
+    animal_id = serializers.IntegerField()
+    animal_tag = serializers.CharField(max_length=100)
+    sex = serializers.CharField(max_length=1)
+    line_id = serializers.IntegerField(allow_null=True)
+    line_name = serializers.CharField(max_length=100, allow_null=True)
+    location_id = serializers.IntegerField(allow_null=True)
+    location_name = serializers.CharField(max_length=100, allow_null=True)
+    age_band = serializers.CharField(max_length=10)
+    initial_weight_kg = serializers.DecimalField(max_digits=5, decimal_places=2)
+    final_weight_kg = serializers.DecimalField(max_digits=5, decimal_places=2)
+    weight_gain_kg = serializers.DecimalField(max_digits=5, decimal_places=2)
+    num_days = serializers.IntegerField()
+    gdp = serializers.DecimalField(max_digits=10, decimal_places=2)
+
 class FertilityRateReportSerializer(serializers.Serializer):
     total_females_breeding = serializers.IntegerField()
     total_females_pregnant = serializers.IntegerField()
@@ -66,7 +83,10 @@ class IneffectiveTreatmentAlertSerializer(serializers.Serializer):
 class LowStockAlertSerializer(serializers.Serializer):
     product_name = serializers.CharField(max_length=100)
     current_stock_kg = serializers.DecimalField(max_digits=10, decimal_places=2)
-    threshold_kg = serializers.DecimalField(max_digits=10, decimal_places=2)
+    daily_consumption_kg = serializers.DecimalField(max_digits=10, decimal_places=3)
+    days_to_stockout = serializers.DecimalField(max_digits=10, decimal_places=1)
+    reorder_date = serializers.DateField()
+    lead_time_days = serializers.IntegerField()
     message = serializers.CharField(max_length=255)
 
 class ReproductiveRankingSerializer(serializers.Serializer):
@@ -83,9 +103,44 @@ class DensityReportSerializer(serializers.Serializer):
     density_percentage = serializers.DecimalField(max_digits=5, decimal_places=2)
     alert = serializers.CharField(max_length=255, allow_null=True)
 
+class DensityHistorySerializer(serializers.Serializer):
+    location_id = serializers.IntegerField()
+    location_name = serializers.CharField(max_length=100)
+    location_type = serializers.CharField(max_length=10)
+    date = serializers.DateField()
+    capacity = serializers.IntegerField()
+    animal_count = serializers.IntegerField()
+    density_percentage = serializers.DecimalField(max_digits=5, decimal_places=2)
+
 class OptimalBreedingPairingSerializer(serializers.Serializer):
     female_id = serializers.IntegerField()
     female_tag = serializers.CharField(max_length=100)
     male_id = serializers.IntegerField()
     male_tag = serializers.CharField(max_length=100)
+    combined_weight_kg = serializers.DecimalField(max_digits=6, decimal_places=2)
+    coefficient_of_kinship = serializers.DecimalField(max_digits=7, decimal_places=6)
     reason = serializers.CharField(max_length=255)
+
+class PairKinshipSerializer(serializers.Serializer):
+    female_id = serializers.IntegerField()
+    female_tag = serializers.CharField(max_length=100)
+    male_id = serializers.IntegerField()
+    male_tag = serializers.CharField(max_length=100)
+    female_inbreeding_coefficient = serializers.DecimalField(max_digits=7, decimal_places=6, allow_null=True)
+    male_inbreeding_coefficient = serializers.DecimalField(max_digits=7, decimal_places=6, allow_null=True)
+    coefficient_of_kinship = serializers.DecimalField(max_digits=7, decimal_places=6)
+
+class AlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Alert
+        fields = ['id', 'type', 'severity', 'subject', 'message', 'data', 'created_at', 'updated_at', 'acknowledged_at']
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'view', 'status', 'progress', 'error', 'created_at', 'started_at', 'finished_at', 'result_url']
+
+    def get_result_url(self, obj):
+        return reverse('report-job-result', args=[obj.pk])
@@ -0,0 +1,153 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from core.models import Animal, FeedInventory, FeedStockMovement, HealthLog, Location, Treatment, WeightLog
+from core.signals import data_changed
+from .alerts import ANIMAL_RULES, DENSITY, LOW_STOCK, sync_after_commit
+from .growth import mark_stale_after_commit
+from .rollups import ROLLUPS
+
+
+def remember_saved_values(sender, instance, raw=False, **kwargs):
+    # The bucket and totals the row counted towards before this save
+    if raw or not instance.pk:
+        instance._rollup_saved_values = None
+        return
+    instance._rollup_saved_values = ROLLUPS[sender].saved_values(instance.pk)
+
+
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rollup = ROLLUPS[sender]
+    previous = None if created else getattr(instance, '_rollup_saved_values', None)
+    rollup.apply(rollup.changes(added=[rollup.row_values(instance)], removed=[previous] if previous else []))
+
+
+def update_rollup_on_delete(sender, instance, **kwargs):
+    rollup = ROLLUPS[sender]
+    rollup.apply(rollup.changes(removed=[rollup.row_values(instance)]))
+
+
+for model in ROLLUPS:
+    pre_save.connect(remember_saved_values, sender=model, dispatch_uid=f'rollup_pre_save_{model.__name__}')
+    post_save.connect(update_rollup_on_save, sender=model, dispatch_uid=f'rollup_save_{model.__name__}')
+    post_delete.connect(update_rollup_on_delete, sender=model, dispatch_uid=f'rollup_delete_{model.__name__}')
+
+
+@receiver(data_changed, dispatch_uid='rollup_bulk_create')
+def update_rollup_on_bulk_create(sender, created=None, **kwargs):
+    # bulk_create() sends no post_save; the writers pass the new rows along.
+    if sender not in ROLLUPS or not created:
+        return
+    rollup = ROLLUPS[sender]
+    rollup.apply(rollup.changes(added=[rollup.row_values(instance) for instance in created]))
+
+
+# Alerts (reports.alerts) are re-evaluated for the rows a write touches once it
+# commits; conditions that change with time are left to the sweep_alerts command.
+
+def remember_alert_subjects(sender, instance, raw=False, **kwargs):
+    # The location an animal occupied, or the animal a health log belonged to, before this save
+    field = 'location_id' if sender is Animal else 'animal_id'
+    instance._alert_saved_subject = None
+    if not raw and instance.pk:
+        instance._alert_saved_subject = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def sync_animal_alerts(animal_ids):
+    for rule in ANIMAL_RULES:
+        sync_after_commit(rule, animal_ids)
+
+
+@receiver(post_save, sender=Animal, dispatch_uid='alerts_animal_save')
+@receiver(post_delete, sender=Animal, dispatch_uid='alerts_animal_delete')
+def update_alerts_on_animal_write(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync_animal_alerts([instance.pk])
+    sync_after_commit(DENSITY, [instance.location_id, getattr(instance, '_alert_saved_subject', None)])
+
+
+@receiver(post_save, sender=HealthLog, dispatch_uid='alerts_healthlog_save')
+@receiver(post_delete, sender=HealthLog, dispatch_uid='alerts_healthlog_delete')
+def update_alerts_on_health_log_write(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_animal_alerts([instance.animal_id, getattr(instance, '_alert_saved_subject', None)])
+
+
+@receiver(post_save, sender=Treatment, dispatch_uid='alerts_treatment_save')
+@receiver(post_delete, sender=Treatment, dispatch_uid='alerts_treatment_delete')
+def update_alerts_on_treatment_write(sender, instance, raw=False, **kwargs):
+    # Looked up now: when the health log is being deleted too it is gone by commit time,
+    # and its own post_delete covers the animal.
+    if not raw:
+        sync_animal_alerts(HealthLog.objects.filter(pk=instance.health_log_id).values_list('animal_id', flat=True))
+
+
+@receiver(post_save, sender=Location, dispatch_uid='alerts_location_save')
+@receiver(post_delete, sender=Location, dispatch_uid='alerts_location_delete')
+def update_alerts_on_location_write(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_after_commit(DENSITY, [instance.pk])
+
+
+@receiver(post_save, sender=FeedInventory, dispatch_uid='alerts_feed_item_save')
+@receiver(post_delete, sender=FeedInventory, dispatch_uid='alerts_feed_item_delete')
+@receiver(post_save, sender=FeedStockMovement, dispatch_uid='alerts_feed_movement_save')
+@receiver(post_delete, sender=FeedStockMovement, dispatch_uid='alerts_feed_movement_delete')
+def update_alerts_on_stock_write(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_after_commit(LOW_STOCK, [instance.pk if sender is FeedInventory else instance.feed_item_id])
+
+
+@receiver(data_changed, dispatch_uid='alerts_bulk_write')
+def update_alerts_on_bulk_write(sender, created=None, **kwargs):
+    if sender is FeedStockMovement:
+        # Without the new rows (e.g. ledger compaction), every item is checked; there are few.
+        sync_after_commit(LOW_STOCK, {movement.feed_item_id for movement in created} if created else None)
+    elif sender is Animal and created:
+        # Other bulk animal writes (current weights, pedigree) don't move animals
+        sync_after_commit(DENSITY, {animal.location_id for animal in created})
+    elif sender is HealthLog and created:
+        sync_animal_alerts({health_log.animal_id for health_log in created})
+    elif sender is Treatment and created:
+        sync_animal_alerts(HealthLog.objects.filter(pk__in={treatment.health_log_id for treatment in created}).values_list('animal_id', flat=True))
+
+
+pre_save.connect(remember_alert_subjects, sender=Animal, dispatch_uid='alerts_animal_pre_save')
+pre_save.connect(remember_alert_subjects, sender=HealthLog, dispatch_uid='alerts_healthlog_pre_save')
+
+
+# Growth curves (reports.growth) are refitted by the fit_growth_curves command
+# for the animals marked stale here, so the market forecast only reads them.
+
+def remember_birth_date(sender, instance, raw=False, **kwargs):
+    instance._growth_saved_birth_date = None
+    if not raw and instance.pk:
+        instance._growth_saved_birth_date = Animal.objects.filter(pk=instance.pk).values_list('birth_date', flat=True).first()
+
+
+@receiver(post_save, sender=Animal, dispatch_uid='growth_animal_save')
+def mark_growth_fit_on_birth_date_change(sender, instance, created, raw=False, **kwargs):
+    # Weighing ages count from the birth date
+    saved = getattr(instance, '_growth_saved_birth_date', None)
+    if not raw and not created and saved is not None and saved != instance.birth_date:
+        mark_stale_after_commit([instance.pk])
+
+
+@receiver(post_save, sender=WeightLog, dispatch_uid='growth_weightlog_save')
+@receiver(post_delete, sender=WeightLog, dispatch_uid='growth_weightlog_delete')
+def mark_growth_fit_on_weighing(sender, instance, raw=False, **kwargs):
+    # The animal a re-assigned weighing was saved under before, from the rollup's pre_save
+    saved = getattr(instance, '_rollup_saved_values', None)
+    if not raw:
+        mark_stale_after_commit([instance.animal_id, saved['animal_id'] if saved else None])
+
+
+@receiver(data_changed, dispatch_uid='growth_bulk_write')
+def mark_growth_fits_on_bulk_write(sender, created=None, **kwargs):
+    if sender is WeightLog and created:
+        mark_stale_after_commit({weight_log.animal_id for weight_log in created})
+
+
+pre_save.connect(remember_birth_date, sender=Animal, dispatch_uid='growth_animal_pre_save')
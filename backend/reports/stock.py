@@ -0,0 +1,104 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Min, Sum
+from core.models import FeedingLog, FeedInventory
+
+# Days of feeding history averaged into each product's consumption rate
+FORECAST_WINDOW_DAYS = getattr(settings, 'FEED_FORECAST_WINDOW_DAYS', 28)
+# Days of stock kept on top of a product's lead time when reordering
+REORDER_SAFETY_DAYS = getattr(settings, 'FEED_REORDER_SAFETY_DAYS', 3)
+RATE_PLACES = Decimal('0.001')
+DAYS_PLACES = Decimal('0.1')
+
+
+def consumption_rates(today, window_days, item_ids=None):
+    """
+    Kg per day eaten of each product at each location over the `window_days`
+    days up to `today` (a trailing moving average), as
+    {feed_item_id: [(location_id, location_name, kg_per_day)]}. A product
+    first fed at a location within the window is averaged over the days since
+    then. The history is summed by the database in one grouped query, however
+    long it is.
+    """
+    feedings = FeedingLog.objects.filter(
+        log_date__gt=today - timedelta(days=window_days), log_date__lte=today, feed_item__isnull=False,
+    )
+    if item_ids is not None:
+        feedings = feedings.filter(feed_item_id__in=item_ids)
+    totals = feedings.values('feed_item', 'location', 'location__name').annotate(
+        total=Sum('quantity_kg'), first_fed=Min('log_date'),
+    ).order_by('location__name')
+
+    rates = defaultdict(list)
+    for row in totals:
+        days = min(window_days, (today - row['first_fed']).days + 1)
+        rates[row['feed_item']].append((row['location'], row['location__name'], (row['total'] / days).quantize(RATE_PLACES)))
+    return rates
+
+
+def forecast(balance, daily_kg, lead_time_days, today):
+    """
+    (days_to_stockout, stockout_date, reorder_date, severity) for a product
+    with `balance` kg left eaten at `daily_kg` per day. The reorder date leaves
+    the lead time plus REORDER_SAFETY_DAYS of stock; severity is 'critical'
+    once an order placed today would arrive after the stock runs out, and
+    'warning' within the safety margin.
+    """
+    if balance <= 0:
+        return Decimal('0'), today, today, 'critical'
+    if not daily_kg:
+        return None, None, None, None
+    days = (balance / daily_kg).quantize(DAYS_PLACES)
+    stockout_date = today + timedelta(days=int(days))
+    reorder_date = stockout_date - timedelta(days=lead_time_days + REORDER_SAFETY_DAYS)
+    if days <= lead_time_days:
+        severity = 'critical'
+    elif days <= lead_time_days + REORDER_SAFETY_DAYS:
+        severity = 'warning'
+    else:
+        severity = None
+    return days, stockout_date, reorder_date, severity
+
+
+def stock_forecasts(today=None, item_ids=None, window_days=FORECAST_WINDOW_DAYS):
+    """
+    Days to stock-out and reorder date of every feed product (those in
+    `item_ids` when given), from its live balance and the consumption of the
+    last `window_days` days, with that consumption broken down by location.
+    """
+    today = today or date.today()
+    items = FeedInventory.objects.with_balance().order_by('product_name')
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+    rates = consumption_rates(today, window_days, item_ids)
+
+    results = []
+    for item in items:
+        locations = rates.get(item.id, [])
+        daily_kg = sum((kg for _, _, kg in locations), Decimal('0'))
+        days, stockout_date, reorder_date, severity = forecast(item.balance_kg, daily_kg, item.lead_time_days, today)
+        results.append({
+            'feed_item_id': item.id,
+            'product_name': item.product_name,
+            'current_stock_kg': item.balance_kg,
+            'daily_consumption_kg': daily_kg,
+            'lead_time_days': item.lead_time_days,
+            'days_to_stockout': days,
+            'stockout_date': stockout_date,
+            'reorder_date': reorder_date,
+            'severity': severity,
+            'locations': [
+                {
+                    'location_id': location_id,
+                    'location_name': location_name,
+                    'daily_consumption_kg': kg,
+                    # Days the stock would last this location alone
+                    'days_of_stock': (item.balance_kg / kg).quantize(DAYS_PLACES) if kg and item.balance_kg > 0 else None,
+                }
+                for location_id, location_name, kg in locations
+            ],
+        })
+    return results
@@ -1,3 +1,790 @@
-from django.test import TestCase
+import json
+import os
+import re
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core import urls as core_urls
+from core.models import (
+    Animal, FeedInventory, FeedingLog, FeedRation, FinancialTransaction, HealthLog, Line, Location, Medication, RationComponent,
+    ReproductionEvent, Treatment, User, WeightLog,
+)
+from core.seeding import gompertz_weight, seed_herd
+from core.urls import router as core_router
+from . import urls as reports_urls
+from .alerts import sweep_alerts
+from .cache import report_cache
+from .growth import fit_gompertz, refresh_fits
+from .jobs import claim_next_job, run_job
+from .models import Alert
+from .rollups import ROLLUPS, rebuild_rollups
+
+
+@tag('queryplan')
+class ReportQueryPlanTests(TestCase):
+    """
+    Runs the reports against a seeded herd and fails when one of their
+    queries reads a hot table with a sequential scan instead of an index.
+
+    On PostgreSQL, sequential scans are disabled for the test transaction so
+    the planner only falls back to one when no usable index exists; on SQLite
+    the plan of an unindexed filter is a bare "SCAN <table>".
+    """
+    num_locations = 20
+    num_animals = 400
+    weighings_per_animal = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date(2024, 1, 1)
+        locations = Location.objects.bulk_create([
+            Location(name=f'Poza {number}', capacity=50) for number in range(cls.num_locations)
+        ])
+        animals = Animal.objects.bulk_create([
+            Animal(
+                unique_tag=f'C-{number:05d}', birth_date=start - timedelta(days=number % 200),
+                sex='F' if number % 2 else 'M', status=('Active', 'Pregnant', 'In Quarantine')[number % 3],
+                location=locations[number % cls.num_locations],
+            )
+            for number in range(cls.num_animals)
+        ])
+        WeightLog.objects.bulk_create([
+            WeightLog(animal=animal, log_date=start + timedelta(days=15 * week), weight_kg=0.5 + 0.1 * week)
+            for animal in animals
+            for week in range(cls.weighings_per_animal)
+        ])
+        FeedingLog.objects.bulk_create([
+            FeedingLog(location=location, log_date=start + timedelta(days=day), feed_type='Forraje', quantity_kg=12)
+            for location in locations
+            for day in range(90)
+        ])
+        FinancialTransaction.objects.bulk_create([
+            FinancialTransaction(
+                transaction_date=start + timedelta(days=number % 90), type=('Costo', 'Ingreso')[number % 2],
+                amount=10, related_entity_id=animals[number % cls.num_animals].id if number % 4 == 0 else None,
+            )
+            for number in range(2000)
+        ])
+        females = [animal for animal in animals if animal.sex == 'F']
+        ReproductionEvent.objects.bulk_create([
+            ReproductionEvent(
+                female=female, mating_date=start, expected_birth_date=start + timedelta(days=67),
+                actual_birth_date=start + timedelta(days=68) if number % 5 == 0 else None, live_births=3,
+            )
+            for number, female in enumerate(females)
+        ])
+        medication = Medication.objects.create(name='Enrofloxacino', withdrawal_period_days=10)
+        health_logs = HealthLog.objects.bulk_create([
+            HealthLog(animal=animal, log_date=start + timedelta(days=number % 90), diagnosis='Diarrea')
+            for number, animal in enumerate(animals)
+        ])
+        Treatment.objects.bulk_create([
+            Treatment(
+                health_log=health_log, medication=medication, dosage='0.1 ml',
+                withdrawal_end_date=health_log.log_date + timedelta(days=10) if number % 10 == 0 else None,
+            )
+            for number, health_log in enumerate(health_logs)
+        ])
+        # Resolved history outweighs the open alerts, which the alert reads must not scan
+        resolved_at = timezone.now()
+        Alert.objects.bulk_create([
+            Alert(
+                type=('withdrawal', 'ineffective_treatment', 'low_stock', 'density')[number % 4], severity='warning',
+                subject=f'animal:{number}', message='Resolved', resolved_at=resolved_at,
+            )
+            for number in range(4000)
+        ])
+        sweep_alerts(today=start + timedelta(days=120))
+        rebuild_rollups()
+        cls.animal = animals[7]
+        cls.location = locations[3]
+
+    def setUp(self):
+        # Cached reports would not run any query
+        report_cache().clear()
+        self.client = APIClient()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN {sql}')
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def sequential_scans(self, plan):
+        if connection.vendor == 'postgresql':
+            return set(re.findall(r'Seq Scan on (\w+)', plan))
+        return set(re.findall(r'\bSCAN (\w+)(?! USING)(?:\s|$)', plan + '\n'))
+
+    def assertIndexedPlan(self, url, tables):
+        """Requests `url` and checks that no query scans any of `tables` sequentially."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+
+        plans = []
+        for query in captured.captured_queries:
+            if not query['sql'].lstrip().upper().startswith('SELECT'):
+                continue
+            plan = self.explain(query['sql'])
+            plans.append(plan)
+            scanned = self.sequential_scans(plan) & set(tables)
+            self.assertFalse(scanned, f"{url} scans {', '.join(sorted(scanned))} sequentially:\n{query['sql']}\n{plan}")
+        self.assertTrue(plans, f'{url} ran no query')
+
+    def test_ica_report_by_animal(self):
+        self.assertIndexedPlan(
+            f'/api/reports/ica-report/?animal_id={self.animal.id}&start_date=2024-01-01&end_date=2024-02-01',
+            ['reports_dailyweightrollup', 'reports_dailyfeedrollup'],
+        )
+
+    def test_ica_report_by_location(self):
+        self.assertIndexedPlan(
+            f'/api/reports/ica-report/?location_id={self.location.id}&start_date=2024-01-01&end_date=2024-02-01',
+            ['reports_dailyfeedrollup', 'reports_dailyweightrollup'],
+        )
+
+    def test_cost_per_kg_gained_report(self):
+        self.assertIndexedPlan(
+            f'/api/reports/cost-per-kg-gained-report/?animal_id={self.animal.id}&start_date=2024-01-01&end_date=2024-02-01',
+            ['reports_dailyfinancerollup', 'reports_dailyweightrollup'],
+        )
+
+    def test_profit_and_loss_report(self):
+        self.assertIndexedPlan(
+            '/api/reports/profit-and-loss-report/?start_date=2024-01-01&end_date=2024-01-07',
+            ['reports_dailyfinancerollup'],
+        )
+
+    def test_batch_profitability_report(self):
+        self.assertIndexedPlan(
+            f'/api/reports/batch-profitability-report/?animal_id={self.animal.id}',
+            ['core_financialtransaction', 'core_animal'],
+        )
+
+    def test_gdp_report(self):
+        self.assertIndexedPlan(f'/api/reports/gdp-report/?animal_id={self.animal.id}', ['core_weightlog'])
+
+    def test_herd_gdp_report_by_period(self):
+        self.assertIndexedPlan(
+            '/api/reports/herd-gdp-report/?start_date=2024-01-01&end_date=2024-01-20',
+            ['core_weightlog'],
+        )
+
+    def test_fertility_rate_report(self):
+        self.assertIndexedPlan('/api/reports/fertility-rate-report/', ['core_animal', 'core_reproductionevent'])
+
+    def test_parturition_rate_report(self):
+        self.assertIndexedPlan('/api/reports/parturition-rate-report/', ['core_animal', 'core_reproductionevent'])
+
+    def test_withdrawal_alerts(self):
+        self.assertIndexedPlan('/api/reports/withdrawal-alerts/', ['reports_alert'])
+
+    def test_ineffective_treatment_alerts(self):
+        self.assertIndexedPlan('/api/reports/ineffective-treatment-alerts/', ['reports_alert'])
+
+    def test_open_alerts_by_type(self):
+        self.assertIndexedPlan('/api/reports/alerts/?type=withdrawal,density&acknowledged=false', ['reports_alert'])
+
+
+class PairingTests(TestCase):
+    def breeder(self, tag, sex, weight_kg=None, sire=None, dam=None):
+        return Animal.objects.create(
+            unique_tag=tag, birth_date=date.today() - timedelta(days=300), sex=sex, sire=sire, dam=dam, current_weight_kg=weight_kg,
+        )
+
+    def test_pairs_are_ranked_and_family_blocked(self):
+        # Grandsire of F2 (through D), father of F1
+        m1 = self.breeder('M1', 'M', '1.50')
+        sire, dam = self.breeder('S', 'M'), self.breeder('D', 'F', sire=m1)
+        f1 = self.breeder('F1', 'F', '1.20', sire=m1)
+        self.breeder('F2', 'F', '1.00', sire=sire, dam=dam)
+        # Full sibling of F2
+        self.breeder('M2', 'M', '1.10', sire=sire, dam=dam)
+        # Not breeding ready: too light, too young
+        self.breeder('F3', 'F', '0.50')
+        Animal.objects.create(unique_tag='F4', birth_date=date.today() - timedelta(days=30), sex='F', current_weight_kg='1.30')
+
+        client = APIClient()
+        response = client.get('/api/reports/optimal-breeding-pairing/')
+        self.assertEqual(response.status_code, 200)
+        # F1 x M1 (parent) and F2 x M2 (full siblings) are left out
+        self.assertEqual(
+            [(row['female_tag'], row['male_tag'], row['combined_weight_kg'], row['coefficient_of_kinship']) for row in response.data],
+            [('F2', 'M1', Decimal('2.50'), Decimal('0.125000')), ('F1', 'M2', Decimal('2.30'), Decimal('0.062500'))],
+        )
+        response = client.get('/api/reports/optimal-breeding-pairing/?limit=1&offset=1')
+        self.assertEqual([(row['female_id'], row['male_tag']) for row in response.data], [(f1.id, 'M2')])
+        response = client.get('/api/reports/optimal-breeding-pairing/?max_inbreeding=0.1')
+        self.assertEqual([(row['female_tag'], row['male_tag']) for row in response.data], [('F1', 'M2')])
+        self.assertEqual(client.get('/api/reports/optimal-breeding-pairing/?limit=0').status_code, 400)
+
+
+class HerdGDPTests(TestCase):
+    def setUp(self):
+        start = date(2024, 1, 1)
+        peru, andina = Line.objects.create(name='Peru'), Line.objects.create(name='Andina')
+        weights = {
+            ('C-001', 'F', peru): ['0.40', '0.55', '0.72', '0.90'],
+            ('C-002', 'M', peru): ['0.45', '0.52', '0.80', '1.05'],
+            ('C-003', 'M', andina): ['0.50', '0.61', '0.66', '0.70'],
+            # A single weighing has no gain
+            ('C-004', 'F', andina): ['0.50'],
+        }
+        for (unique_tag, sex, line), series in weights.items():
+            animal = Animal.objects.create(unique_tag=unique_tag, birth_date=start - timedelta(days=20), sex=sex, line=line)
+            for week, weight in enumerate(series):
+                WeightLog.objects.create(animal=animal, log_date=start + timedelta(days=10 * week), weight_kg=weight)
+
+    def test_herd_rows_match_the_gdp_report(self):
+        client = APIClient()
+        fields = ('animal_tag', 'initial_weight_kg', 'final_weight_kg', 'num_days', 'gdp')
+        for period in ('', '&start_date=2024-01-05&end_date=2024-01-25'):
+            response = client.get(f'/api/reports/herd-gdp-report/?ordering=animal_tag{period}')
+            self.assertEqual(response.data['count'], 3)
+            for row in response.data['results']:
+                single = client.get(f"/api/reports/gdp-report/?animal_id={row['animal_id']}{period}").data
+                self.assertEqual([row[field] for field in fields], [single[field] for field in fields])
+
+        response = client.get('/api/reports/herd-gdp-report/?group_by=line&ordering=-average_gdp')
+        self.assertEqual(
+            [(row['line_name'], row['animal_count'], row['average_gdp'], row['total_weight_gain_kg']) for row in response.data['results']],
+            [('Peru', 2, Decimal('0.02'), Decimal('1.10')), ('Andina', 1, Decimal('0.01'), Decimal('0.20'))],
+        )
+        self.assertEqual(client.get('/api/reports/herd-gdp-report/?group_by=color').status_code, 400)
+
+
+class ReportCacheTests(TestCase):
+    url = '/api/reports/profit-and-loss-report/'
+
+    def setUp(self):
+        report_cache().clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            FinancialTransaction.objects.create(transaction_date=date(2024, 1, 10), type='Ingreso', amount=100)
+
+    def get(self, query):
+        response = self.client.get(self.url + query)
+        return response['X-Report-Cache'] if response.has_header('X-Report-Cache') else None, response.data
+
+    def test_hits_misses_and_invalidation(self):
+        self.assertEqual(self.get('?start_date=2024-01-01&end_date=2024-01-31'), ('MISS', {'total_income': 100, 'total_cost': 0, 'profit_loss': 100}))
+        # Parameter order and blank parameters do not change the key
+        self.assertEqual(self.get('?end_date=2024-01-31&start_date=2024-01-01&line=')[0], 'HIT')
+        self.assertEqual(self.get('?start_date=2024-01-01&end_date=2024-02-29')[0], 'MISS')
+
+        # A write to an unrelated table keeps the entry, one to a source table invalidates it
+        with self.captureOnCommitCallbacks(execute=True):
+            Line.objects.create(name='Peru')
+        self.assertEqual(self.get('?start_date=2024-01-01&end_date=2024-01-31')[0], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/financialtransactions/', {'transaction_date': '2024-01-20', 'type': 'Costo', 'amount': '30.00'}, format='json')
+        self.assertEqual(self.get('?start_date=2024-01-01&end_date=2024-01-31'), ('MISS', {'total_income': 100, 'total_cost': 30, 'profit_loss': 70}))
+
+        # Errors are not cached
+        self.assertEqual(self.get('?start_date=January&end_date=2024-01-31')[0], None)
+        stats = self.client.get('/api/reports/cache-stats/').data
+        self.assertEqual(stats['ProfitAndLossReportView'], {'hits': 2, 'misses': 3, 'hit_ratio': 0.4})
+
+
+class RollupTests(TestCase):
+    """The incrementally maintained rollups must match a rebuild from the raw logs."""
+
+    def assertRollupsMatchRawLogs(self):
+        for rollup in ROLLUPS.values():
+            fields = [field for field, _ in rollup.dimensions + rollup.measures]
+            maintained = sorted(rollup.model.objects.values_list(*fields))
+            rebuilt = sorted(tuple(getattr(row, field) for field in fields) for row in rollup.totals())
+            self.assertEqual(maintained, rebuilt, rollup.model.__name__)
+
+    def test_rollups_follow_writes(self):
+        client = APIClient()
+        location = Location.objects.create(name='Poza 1', capacity=20)
+        other_location = Location.objects.create(name='Poza 2', capacity=20)
+        animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', location=location)
+        other_animal = Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='M', location=location)
+
+        first = WeightLog.objects.create(animal=animal, log_date=date(2024, 3, 1), weight_kg=0.8)
+        WeightLog.objects.create(animal=other_animal, log_date=date(2024, 3, 1), weight_kg='0.95')
+        first.weight_kg = Decimal('0.85')
+        first.log_date = date(2024, 3, 2)
+        first.save()
+        client.post('/api/weightlogs/weighing-session/', {
+            'log_date': '2024-04-01', 'entries': [{'unique_tag': 'C-001', 'weight_kg': '1.1'}, {'unique_tag': 'C-002', 'weight_kg': '1.2'}],
+        }, format='json')
+
+        feeding = FeedingLog.objects.create(location=location, log_date=date(2024, 3, 1), feed_type='Forraje', quantity_kg=5)
+        FeedingLog.objects.create(location=location, log_date=date(2024, 3, 1), feed_type='Forraje', quantity_kg=3)
+        feeding.location = other_location
+        feeding.save()
+        client.post('/api/feedinglogs/bulk/', {
+            'log_date': '2024-03-01', 'entries': [{'location': location.id, 'feed_type': 'Forraje', 'quantity_kg': '2.5'}],
+        }, format='json')
+
+        FinancialTransaction.objects.create(transaction_date=date(2024, 3, 1), type='Costo', amount=20)
+        FinancialTransaction.objects.create(transaction_date=date(2024, 3, 1), type='Costo', amount=5)
+        sale = FinancialTransaction.objects.create(transaction_date=date(2024, 3, 1), type='Ingreso', amount=40, related_entity_id=animal.id)
+        sale.delete()
+        self.assertRollupsMatchRawLogs()
+
+        # Cascades remove the raw logs along with their buckets
+        other_animal.delete()
+        other_location.delete()
+        self.assertRollupsMatchRawLogs()
+
+    def test_reports_match_raw_totals(self):
+        location = Location.objects.create(name='Poza 1', capacity=20)
+        animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', location=location)
+        for day in range(1, 29):
+            WeightLog.objects.create(animal=animal, log_date=date(2024, 2, day), weight_kg=Decimal('0.50') + Decimal(day) / 100)
+            FeedingLog.objects.create(location=location, log_date=date(2024, 2, day), feed_type='Forraje', quantity_kg=Decimal('1.25'))
+            FinancialTransaction.objects.create(transaction_date=date(2024, 2, day), type=('Costo', 'Ingreso')[day % 2], amount=day, related_entity_id=animal.id)
+
+        response = APIClient().get(f'/api/reports/ica-report/?location_id={location.id}&start_date=2024-02-03&end_date=2024-02-20')
+        self.assertEqual(response.data['total_feed_consumed_kg'], FeedingLog.objects.filter(log_date__range=[date(2024, 2, 3), date(2024, 2, 20)]).aggregate(total=Sum('quantity_kg'))['total'])
+        self.assertEqual(response.data['total_weight_gained_kg'], WeightLog.objects.filter(log_date__range=[date(2024, 2, 3), date(2024, 2, 20)]).aggregate(total=Sum('weight_kg'))['total'])
+
+        response = APIClient().get(f'/api/reports/profit-and-loss-report/?animal_id={animal.id}&start_date=2024-02-01&end_date=2024-02-10')
+        transactions = FinancialTransaction.objects.filter(transaction_date__range=[date(2024, 2, 1), date(2024, 2, 10)])
+        self.assertEqual(response.data['total_income'], transactions.filter(type='Ingreso').aggregate(total=Sum('amount'))['total'])
+        self.assertEqual(response.data['total_cost'], transactions.filter(type='Costo').aggregate(total=Sum('amount'))['total'])
+
+
+class DashboardTests(TestCase):
+    def test_sections_match_the_individual_reports(self):
+        client = APIClient()
+        location = Location.objects.create(name='Poza 1', capacity=2)
+        animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', status='Pregnant', location=location)
+        WeightLog.objects.create(animal=animal, log_date=date(2024, 3, 1), weight_kg='0.80')
+        FeedingLog.objects.create(location=location, log_date=date(2024, 3, 1), feed_type='Forraje', quantity_kg='2.40')
+        FinancialTransaction.objects.create(transaction_date=date(2024, 3, 1), type='Costo', amount=12)
+        ReproductionEvent.objects.create(female=animal, mating_date=date(2024, 1, 1), actual_birth_date=date(2024, 3, 8), live_births=3)
+
+        params = 'start_date=2024-01-01&end_date=2024-12-31'
+        dashboard = client.get(f'/api/reports/dashboard/?{params}').data
+        self.assertEqual(dashboard['errors'], {})
+        for section, url in (
+            ('ica', 'ica-report'), ('cost_per_kg_gained', 'cost-per-kg-gained-report'),
+            ('profit_and_loss', 'profit-and-loss-report'), ('fertility_rate', 'fertility-rate-report'),
+            ('prolificacy', 'prolificacy-report'), ('density', 'density-report'),
+        ):
+            self.assertEqual(dashboard['sections'][section], client.get(f'/api/reports/{url}/?{params}').data, section)
+
+    def test_include_and_section_errors(self):
+        client = APIClient()
+        response = client.get('/api/reports/dashboard/?include=ica,cost_per_kg_gained&location_id=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['sections']), {'ica'})
+        self.assertIn('cost_per_kg_gained', response.data['errors'])
+        self.assertEqual(client.get('/api/reports/dashboard/?include=unknown').status_code, 400)
+
+
+class AlertTests(TestCase):
+    def open_alerts(self):
+        return sorted(Alert.objects.open().values_list('type', 'subject', 'severity'))
+
+    def test_alerts_follow_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            location = Location.objects.create(name='Poza 1', capacity=2)
+            animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', status='In Quarantine', location=location)
+            other_animal = Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='F', location=location)
+            medication = Medication.objects.create(name='Ivermectina', withdrawal_period_days=0)
+            for _ in range(3):
+                health_log = HealthLog.objects.create(animal=animal, log_date=date.today(), diagnosis='Sarna')
+                treatment = Treatment.objects.create(health_log=health_log, medication=medication, dosage='0.2 ml')
+        self.assertEqual(Alert.objects.open().filter(type='withdrawal').count(), 3)
+        self.assertIn(('density', f'location:{location.id}', 'warning'), self.open_alerts())
+        self.assertIn(('ineffective_treatment', f'animal:{animal.id}', 'warning'), self.open_alerts())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            animal.status = 'Active'
+            animal.save()
+            other_animal.location = Location.objects.create(name='Poza 2', capacity=10)
+            other_animal.save()
+            treatment.delete()
+        self.assertEqual(self.open_alerts(), [])
+        # Resolved alerts are kept as history
+        self.assertEqual(Alert.objects.filter(resolved_at__isnull=False).count(), 5)
+
+    def test_sweep_opens_time_based_alerts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            animal = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', status='In Quarantine')
+            health_log = HealthLog.objects.create(animal=animal, log_date=date.today(), diagnosis='Tos')
+            Treatment.objects.create(health_log=health_log, medication=Medication.objects.create(name='Oxitetraciclina', withdrawal_period_days=5), dosage='1 ml')
+        self.assertEqual(self.open_alerts(), [])
+
+        sweep_alerts(today=date.today() + timedelta(days=5))
+        self.assertEqual(self.open_alerts(), [('withdrawal', f'animal:{animal.id}', 'warning')])
+        client = APIClient()
+        alert = client.get('/api/reports/alerts/?type=withdrawal&acknowledged=false').data[0]
+        self.assertEqual(client.get('/api/reports/withdrawal-alerts/').data, [alert['data']])
+
+        self.assertEqual(client.post(f"/api/reports/alerts/{alert['id']}/acknowledge/").status_code, 200)
+        self.assertEqual(client.get('/api/reports/alerts/?acknowledged=false').data, [])
+        self.assertEqual(client.get('/api/reports/alerts/?severity=urgent').status_code, 400)
+
+
+class StockForecastTests(TestCase):
+    def test_forecast_and_lead_time_alerts(self):
+        today = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            alfalfa = FeedInventory.objects.create(product_name='Alfalfa', quantity_kg=300, cost_per_kg='1.20', lead_time_days=20)
+            idle = FeedInventory.objects.create(product_name='Heno', quantity_kg=5, cost_per_kg='0.80')
+            pozas = [Location.objects.create(name=f'Poza {number}', capacity=10) for number in (1, 2)]
+            # 5 kg a day over the forecast window, split 3/2 between the pozas; older feedings are left out
+            for day in range(28):
+                for location, quantity in zip(pozas, (3, 2)):
+                    FeedingLog.objects.create(location=location, log_date=today - timedelta(days=day), feed_type='Alfalfa', feed_item=alfalfa, quantity_kg=quantity)
+            FeedingLog.objects.create(location=pozas[0], log_date=today - timedelta(days=60), feed_type='Alfalfa', feed_item=alfalfa, quantity_kg=10)
+
+        response = APIClient().get('/api/reports/stock-forecast/')
+        self.assertEqual(response.status_code, 200)
+        forecast, idle_forecast = response.data
+        # 300 - 140 - 10 kg left at 5 kg a day
+        self.assertEqual((forecast['current_stock_kg'], forecast['daily_consumption_kg'], forecast['days_to_stockout']), (Decimal('150'), Decimal('5'), Decimal('30')))
+        self.assertEqual(forecast['reorder_date'], today + timedelta(days=30 - 20 - 3))
+        self.assertEqual([location['daily_consumption_kg'] for location in forecast['locations']], [Decimal('3'), Decimal('2')])
+        self.assertIsNone(forecast['severity'])
+        # Stock that is not being eaten never runs out, however little is left
+        self.assertEqual((idle_forecast['feed_item_id'], idle_forecast['days_to_stockout']), (idle.id, None))
+        self.assertEqual(Alert.objects.open().filter(type='low_stock').count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alfalfa.lead_time_days = 28
+            alfalfa.save()
+        self.assertEqual(list(Alert.objects.open().values_list('subject', 'severity')), [(f'feed_item:{alfalfa.id}', 'warning')])
+        # An order placed now would arrive after the stock runs out
+        with self.captureOnCommitCallbacks(execute=True):
+            alfalfa.lead_time_days = 30
+            alfalfa.save()
+        self.assertEqual(list(Alert.objects.open().values_list('subject', 'severity')), [(f'feed_item:{alfalfa.id}', 'critical')])
+        self.assertEqual(APIClient().get('/api/reports/stock-forecast/?window_days=0').status_code, 400)
+
+    def test_short_history_is_averaged_over_the_days_fed(self):
+        today = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            concentrate = FeedInventory.objects.create(product_name='Concentrado', quantity_kg=120, cost_per_kg='2.50', lead_time_days=30)
+            location = Location.objects.create(name='Poza 1', capacity=10)
+            # First fed 5 days ago: 4 kg a day, not 20 kg over the 28-day window
+            for day in range(5):
+                FeedingLog.objects.create(location=location, log_date=today - timedelta(days=day), feed_type='Concentrado', feed_item=concentrate, quantity_kg=4)
+
+        forecast, = APIClient().get('/api/reports/stock-forecast/').data
+        self.assertEqual((forecast['daily_consumption_kg'], forecast['days_to_stockout'], forecast['severity']), (Decimal('4'), Decimal('25'), 'critical'))
+        self.assertEqual(list(Alert.objects.open().values_list('subject', 'severity')), [(f'feed_item:{concentrate.id}', 'critical')])
+
+
+class MarketForecastTests(TestCase):
+    def test_fit_recovers_the_curve(self):
+        points = [(age, gompertz_weight(1.55, age)) for age in range(0, 400, 14)]
+        asymptote, b, k, rmse = fit_gompertz(points)
+        self.assertAlmostEqual(asymptote, 1.55, places=2)
+        self.assertAlmostEqual(k, 0.025, places=3)
+        self.assertLess(rmse, 0.001)
+        self.assertIsNone(fit_gompertz(points[:2]))
+
+    def test_predictions_and_refits(self):
+        today = date.today()
+        line = Line.objects.create(name='Peru')
+        with self.captureOnCommitCallbacks(execute=True):
+            # Weighed fortnightly from birth, 70 days old today
+            young = [
+                Animal.objects.create(unique_tag=f'C-00{number}', birth_date=today - timedelta(days=70), sex='M', line=line)
+                for number in range(3)
+            ]
+            for animal in young:
+                for age in range(0, 71, 14):
+                    WeightLog.objects.create(animal=animal, log_date=animal.birth_date + timedelta(days=age), weight_kg=round(gompertz_weight(1.55, age), 2))
+            # Too few weighings for a curve of its own: the line's, scaled to its weighing
+            sparse = Animal.objects.create(unique_tag='C-100', birth_date=today - timedelta(days=40), sex='M', line=line)
+            WeightLog.objects.create(animal=sparse, log_date=today, weight_kg=round(gompertz_weight(1.55, 40), 2))
+        client = APIClient()
+        # The forecast only reads the fits: nothing is predicted until they are refitted
+        self.assertEqual(client.get('/api/reports/market-forecast/').data, [])
+        self.assertEqual(refresh_fits(), (4, 0))
+        self.assertEqual(refresh_fits(), (0, 0))
+
+        # The curve reaches 1.1 kg at about 80 days
+        response = client.get(f'/api/reports/market-forecast/?target_kg=1.1&start_date={today}&end_date={today + timedelta(days=20)}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['animal_tag'] for row in response.data], ['C-000', 'C-001', 'C-002'])
+        self.assertTrue(all(abs(row['predicted_age_days'] - 80) <= 2 for row in response.data))
+        response = client.get(f'/api/reports/market-forecast/?target_kg=1.1&start_date={today}&end_date={today + timedelta(days=60)}')
+        sparse_row = response.data[-1]
+        self.assertEqual((sparse_row['animal_tag'], sparse_row['fitted']), ('C-100', False))
+        self.assertLessEqual(abs(sparse_row['predicted_age_days'] - 80), 3)
+
+        # Only the animal weighed again is refitted, and its fit dropped once it has no weighings
+        with self.captureOnCommitCallbacks(execute=True):
+            WeightLog.objects.create(animal=sparse, log_date=today, weight_kg='0.75')
+        self.assertEqual(refresh_fits(), (1, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            WeightLog.objects.filter(animal=sparse).first().delete()
+            WeightLog.objects.filter(animal=sparse).get().delete()
+        self.assertEqual(refresh_fits(), (0, 1))
+        # A new birth date shifts the ages of every weighing
+        with self.captureOnCommitCallbacks(execute=True):
+            young[0].birth_date -= timedelta(days=7)
+            young[0].save()
+        self.assertEqual(refresh_fits(), (1, 0))
+        self.assertEqual(refresh_fits(refit_all=True), (3, 0))
+        self.assertEqual(client.get('/api/reports/market-forecast/?target_kg=0').status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location = Location.objects.create(name='Poza 1', capacity=10)
+            Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F', location=self.location)
+
+    def assert_revalidates(self, url, write):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        # Only the table versions are read
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_report(self):
+        self.assert_revalidates('/api/reports/density-report/', lambda: Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='M', location=self.location))
+
+
+# Herd sizes benchmarked, e.g. BENCHMARK_SCALES=1000,10000; results are written
+# to BENCHMARK_OUTPUT when set. Run with: manage.py test reports --tag benchmark
+BENCHMARK_SCALES = [int(scale) for scale in os.environ.get('BENCHMARK_SCALES', '60').split(',')]
+BENCHMARK_OUTPUT = os.environ.get('BENCHMARK_OUTPUT')
+BENCHMARK_RUNS = int(os.environ.get('BENCHMARK_RUNS', '3'))
+# Last day of the seeded history, pinned so every run benchmarks the same herd
+BENCHMARK_TODAY = date.fromisoformat(os.environ.get('BENCHMARK_TODAY', '2025-06-01'))
+
+
+@tag('benchmark')
+class EndpointBenchmarkTests(TestCase):
+    """
+    Times every read endpoint of core and reports against herds seeded with
+    core.seeding at each of BENCHMARK_SCALES, and fails when an endpoint runs
+    more queries than its budget or when its query count grows with the herd.
+    """
+    # Report query strings, filled from the seeded herd
+    REPORTS = {
+        'ica-report': '?animal_id={animal}&start_date={start}&end_date={end}',
+        'cost-per-kg-gained-report': '?animal_id={animal}&start_date={start}&end_date={end}',
+        'profit-and-loss-report': '?start_date={start}&end_date={end}',
+        'batch-profitability-report': '?animal_id={animal}',
+        'gdp-report': '?animal_id={animal}',
+        'herd-gdp-report': '?start_date={start}&end_date={end}&group_by=line',
+        'fertility-rate-report': '',
+        'parturition-rate-report': '',
+        'prolificacy-report': '',
+        'wpi-report': '',
+        'withdrawal-alerts': '',
+        'ineffective-treatment-alerts': '',
+        'low-stock-alerts': '',
+        'stock-forecast': '',
+        'market-forecast': '?target_kg=1.0',
+        'reproductive-ranking-report': '',
+        'density-report': '',
+        'density-history': '?start_date={start}&end_date={end}',
+        'dashboard': '?start_date={start}&end_date={end}',
+        'ration-cost-report': '',
+        'optimal-breeding-pairing': '?line={line}',
+        'alerts': '',
+        'report-cache-stats': '',
+    }
+    # Endpoints that only write, and the service ones
+    SKIPPED = {
+        'alert-acknowledge', 'herd-import', 'api-root', 'metrics', 'report-job', 'report-job-result',
+        'weightlog-weighing-session', 'treatment-batch', 'feedinglog-bulk',
+    }
+    DEFAULT_QUERY_BUDGET = 4
+    QUERY_BUDGETS = {
+        'dashboard': 12,
+        'gdp-report': 8,
+        # Versions, rations, their components, feeding rollups and locations
+        'ration-cost-report': 5,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if BENCHMARK_OUTPUT and cls.results:
+            with open(BENCHMARK_OUTPUT, 'w') as output:
+                json.dump({'vendor': connection.vendor, 'runs': BENCHMARK_RUNS, 'today': BENCHMARK_TODAY.isoformat(), 'scales': cls.results}, output, indent=2, sort_keys=True)
+
+    def endpoints(self):
+        """(name, method, url, body) of every benchmarked endpoint, for the current herd."""
+        animal = Animal.objects.filter(children_dam__isnull=False).order_by('id').first()
+        female, male = animal, Animal.objects.filter(sex='M', status='Active').order_by('id').first()
+        values = {
+            'animal': animal.id, 'line': animal.line_id,
+            'start': (BENCHMARK_TODAY - timedelta(days=90)).isoformat(), 'end': BENCHMARK_TODAY.isoformat(),
+        }
+        endpoints = [
+            (name, 'get', reverse(name) + query.format(**values), None)
+            for name, query in self.REPORTS.items()
+        ]
+        endpoints.append(('pair-kinship', 'post', reverse('pair-kinship'), {'pairs': [{'female_id': female.id, 'male_id': male.id}]}))
+        for prefix, viewset, basename in core_router.registry:
+            model = viewset.queryset.model
+            middle = model.objects.order_by('pk').values_list('pk', flat=True)[model.objects.count() // 2]
+            endpoints.append((f'{basename}-list', 'get', reverse(f'{basename}-list') + '?page_size=100', None))
+            endpoints.append((f'{basename}-detail', 'get', reverse(f'{basename}-detail', args=[middle]), None))
+            if hasattr(viewset, 'export_spec'):
+                endpoints.append((f'{basename}-export', 'get', reverse(f'{basename}-export') + f"?start_date={values['start']}", None))
+        return endpoints
+
+    def measure(self, client, method, url, body):
+        timings = []
+        for _ in range(BENCHMARK_RUNS):
+            report_cache().clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, body, format='json') if body else getattr(client, method)(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append(time.perf_counter() - started)
+        return response, len(captured), timings
+
+    def test_every_endpoint_is_benchmarked(self):
+        names = {pattern.name for pattern in reports_urls.urlpatterns + core_urls.urlpatterns[:-1] + core_router.urls}
+        User.objects.create(username='benchmark')
+        seed_herd(animals=40, generations=2, years=1, seed=2, today=BENCHMARK_TODAY)
+        benchmarked = {name for name, _, _, _ in self.endpoints()}
+        self.assertEqual(names - self.SKIPPED - benchmarked, set())
+
+    def test_query_budgets_across_scales(self):
+        query_counts = {}
+        for scale in BENCHMARK_SCALES:
+            with transaction.atomic():
+                started = time.perf_counter()
+                User.objects.create(username='benchmark')
+                with self.captureOnCommitCallbacks(execute=True):
+                    rows = seed_herd(animals=scale, generations=min(4, max(1, scale // 40)), years=2, today=BENCHMARK_TODAY)
+                # As fit_growth_curves --watch would
+                refresh_fits()
+                results = {'seed_seconds': round(time.perf_counter() - started, 3), 'rows': rows, 'endpoints': {}}
+
+                client = APIClient()
+                for name, method, url, body in self.endpoints():
+                    response, queries, timings = self.measure(client, method, url, body)
+                    self.assertEqual(response.status_code, 200, f'{url}: {getattr(response, "data", "")}')
+                    budget = self.QUERY_BUDGETS.get(name, self.DEFAULT_QUERY_BUDGET)
+                    self.assertLessEqual(queries, budget, f'{name} ran {queries} queries at {scale} animals')
+                    query_counts.setdefault(name, set()).add(queries)
+                    results['endpoints'][name] = {
+                        'queries': queries,
+                        'median_ms': round(statistics.median(timings) * 1000, 2),
+                        'max_ms': round(max(timings) * 1000, 2),
+                    }
+                self.results[str(scale)] = results
+                transaction.set_rollback(True)
+
+        growing = {name: sorted(counts) for name, counts in query_counts.items() if len(counts) > 1}
+        self.assertEqual(growing, {}, 'Query counts depend on the herd size')
+
+
+class ReportJobTests(TestCase):
+    def test_async_reports_are_coalesced_and_stored(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            female = Animal.objects.create(unique_tag='C-001', birth_date=date(2024, 1, 1), sex='F')
+            Animal.objects.create(unique_tag='C-002', birth_date=date(2024, 1, 1), sex='M')
+            WeightLog.objects.create(animal=female, log_date=date(2024, 3, 1), weight_kg='0.80')
+
+        response = client.get('/api/reports/optimal-breeding-pairing/?async=1&limit=5')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(response['Location'], f'/api/reports/jobs/{job_id}/')
+        # Same parameters, in another order: the job in flight is reused
+        self.assertEqual(client.get('/api/reports/optimal-breeding-pairing/?limit=5&async=1').data['id'], job_id)
+        self.assertEqual(client.get(f'/api/reports/jobs/{job_id}/result/').status_code, 202)
+
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.status), (job_id, 'running'))
+        self.assertIsNone(claim_next_job())
+        run_job(job)
+
+        response = client.get(f'/api/reports/jobs/{job_id}/')
+        self.assertEqual((response.data['status'], response.data['progress']), ('done', 100))
+        result = client.get(f'/api/reports/jobs/{job_id}/result/')
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json(), client.get('/api/reports/optimal-breeding-pairing/?limit=5').json())
+        # Finished jobs are not reused
+        self.assertNotEqual(client.get('/api/reports/optimal-breeding-pairing/?limit=5&async=1').data['id'], job_id)
+
+    def test_report_errors_are_results(self):
+        client = APIClient()
+        job_id = client.get('/api/reports/gdp-report/?async=1').data['id']
+        run_job(claim_next_job())
+        response = client.get(f'/api/reports/jobs/{job_id}/result/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'animal_id is required.'})
+        self.assertEqual(client.get('/api/reports/jobs/999/').status_code, 404)
+
+
+class RationCostTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alfalfa = FeedInventory.objects.create(product_name='Alfalfa', quantity_kg=500, cost_per_kg='1.20')
+            self.concentrate = FeedInventory.objects.create(product_name='Concentrado', quantity_kg=200, cost_per_kg='2.50')
+            self.ration = FeedRation.objects.create(name='Engorde')
+            RationComponent.objects.create(feed_ration=self.ration, feed_item=self.alfalfa, percentage=80)
+            RationComponent.objects.create(feed_ration=self.ration, feed_item=self.concentrate, percentage=20)
+            self.partial = FeedRation.objects.create(name='Prueba')
+            RationComponent.objects.create(feed_ration=self.partial, feed_item=self.alfalfa, percentage=60)
+            self.location = Location.objects.create(name='Poza 1', capacity=10)
+            for number in range(4):
+                Animal.objects.create(unique_tag=f'C-00{number}', birth_date=date(2024, 1, 1), sex='M', location=self.location)
+
+    def test_costs_and_projection(self):
+        response = self.client.get('/api/reports/ration-cost-report/?intake_kg=0.25')
+        self.assertEqual(response.status_code, 200)
+        engorde, prueba = response.data['rations']
+        # 0.8 * 1.20 + 0.2 * 2.50
+        self.assertEqual(engorde['cost_per_kg'], Decimal('1.46'))
+        self.assertIsNone(prueba['cost_per_kg'])
+        self.assertEqual(prueba['error'], 'Components add up to 60.00%, not 100%.')
+
+        location, = response.data['locations']
+        self.assertEqual((location['headcount'], location['daily_intake_kg'], location['intake_source']), (4, Decimal('1.00'), 'parameter'))
+        self.assertEqual(location['daily_costs'], [{'ration_id': self.ration.id, 'ration_name': 'Engorde', 'daily_cost': Decimal('1.46')}])
+        self.assertEqual(self.client.get('/api/reports/ration-cost-report/?intake_kg=-1').status_code, 400)
+
+    def test_intake_is_averaged_over_the_days_fed(self):
+        # Fed 2 kg on each of the last 5 days only: 0.5 kg per animal, not 10 kg over 30 days
+        with self.captureOnCommitCallbacks(execute=True):
+            for days_ago in range(5):
+                FeedingLog.objects.create(location=self.location, log_date=date.today() - timedelta(days=days_ago), feed_type='Forraje', quantity_kg=2)
+        location, = self.client.get('/api/reports/ration-cost-report/').data['locations']
+        self.assertEqual((location['daily_intake_kg'], location['intake_source']), (Decimal('2.00'), 'feeding_history'))
+        self.assertEqual(location['daily_costs'][0]['daily_cost'], Decimal('2.92'))
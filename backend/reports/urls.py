@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ICAReportView, CostPerKgGainedReportView, ProfitAndLossReportView, BatchProfitabilityReportView, GDPReportView, FertilityRateReportView, ParturitionRateReportView, ProlificacyReportView, WPIReportView, WithdrawalAlertsView, IneffectiveTreatmentAlertsView, LowStockAlertsView, ReproductiveRankingReportView, DensityReportView, OptimalBreedingPairingView
+from .views import ICAReportView, CostPerKgGainedReportView, ProfitAndLossReportView, BatchProfitabilityReportView, GDPReportView, HerdGDPReportView, FertilityRateReportView, ParturitionRateReportView, ProlificacyReportView, WPIReportView, WithdrawalAlertsView, IneffectiveTreatmentAlertsView, LowStockAlertsView, ReproductiveRankingReportView, DensityReportView, DensityHistoryView, RationCostReportView, StockForecastView, MarketForecastView, DashboardView, OptimalBreedingPairingView, PairKinshipView, ReportCacheStatsView, AlertListView, AlertAcknowledgeView, ReportJobView, ReportJobResultView
 
 urlpatterns = [
     path('ica-report/', ICAReportView.as_view(), name='ica-report'),
@@ -7,6 +7,7 @@ urlpatterns = [
     path('profit-and-loss-report/', ProfitAndLossReportView.as_view(), name='profit-and-loss-report'),
     path('batch-profitability-report/', BatchProfitabilityReportView.as_view(), name='batch-profitability-report'),
     path('gdp-report/', GDPReportView.as_view(), name='gdp-report'),
+    path('herd-gdp-report/', HerdGDPReportView.as_view(), name='herd-gdp-report'),
     path('fertility-rate-report/', FertilityRateReportView.as_view(), name='fertility-rate-report'),
     path('parturition-rate-report/', ParturitionRateReportView.as_view(), name='parturition-rate-report'),
     path('prolificacy-report/', ProlificacyReportView.as_view(), name='prolificacy-report'),
@@ -16,5 +17,16 @@ urlpatterns = [
     path('low-stock-alerts/', LowStockAlertsView.as_view(), name='low-stock-alerts'),
     path('reproductive-ranking-report/', ReproductiveRankingReportView.as_view(), name='reproductive-ranking-report'),
     path('density-report/', DensityReportView.as_view(), name='density-report'),
+    path('density-history/', DensityHistoryView.as_view(), name='density-history'),
+    path('market-forecast/', MarketForecastView.as_view(), name='market-forecast'),
+    path('stock-forecast/', StockForecastView.as_view(), name='stock-forecast'),
+    path('ration-cost-report/', RationCostReportView.as_view(), name='ration-cost-report'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('optimal-breeding-pairing/', OptimalBreedingPairingView.as_view(), name='optimal-breeding-pairing'),
+    path('pair-kinship/', PairKinshipView.as_view(), name='pair-kinship'),
+    path('alerts/', AlertListView.as_view(), name='alerts'),
+    path('alerts/<int:pk>/acknowledge/', AlertAcknowledgeView.as_view(), name='alert-acknowledge'),
+    path('jobs/<int:pk>/', ReportJobView.as_view(), name='report-job'),
+    path('jobs/<int:pk>/result/', ReportJobResultView.as_view(), name='report-job-result'),
+    path('cache-stats/', ReportCacheStatsView.as_view(), name='report-cache-stats'),
 ]
\ No newline at end of file
@@ -1,128 +1,43 @@
+import logging
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Sum, F, Count, Avg
-from core.models import Animal, WeightLog, FeedingLog, FinancialTransaction, ReproductionEvent, Treatment, HealthLog, FeedInventory
+from django.db.models import Sum
+from django.utils import timezone
+from core.models import Animal, AnimalAncestor, Line, Location, WeightLog, FeedingLog, FinancialTransaction, FeedInventory, FeedRation, RationComponent, FeedStockMovement
 from datetime import datetime, timedelta, date
-
-class ICAReportView(APIView):
-    def get(self, request, format=None):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-        animal_id = request.query_params.get('animal_id')
-        location_id = request.query_params.get('location_id')
-
-        weight_logs = WeightLog.objects.all()
-        feeding_logs = FeedingLog.objects.all()
-
-        if animal_id:
-            weight_logs = weight_logs.filter(animal_id=animal_id)
-            feeding_logs = feeding_logs.filter(location__animal__id=animal_id) # Assuming feeding logs are related to animals via location
-        
-        if location_id:
-            feeding_logs = feeding_logs.filter(location_id=location_id)
-            weight_logs = weight_logs.filter(animal__location_id=location_id) # Assuming animals are related to locations
-
-        if start_date_str and end_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                weight_logs = weight_logs.filter(log_date__range=[start_date, end_date])
-                feeding_logs = feeding_logs.filter(log_date__range=[start_date, end_date])
-            except ValueError:
-                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_feed_consumed = feeding_logs.aggregate(Sum('quantity_kg'))['quantity_kg__sum'] or 0
-        total_weight_gained = weight_logs.aggregate(Sum('weight_kg'))['weight_kg__sum'] or 0
-
-        ica = total_feed_consumed / total_weight_gained if total_weight_gained > 0 else 0
-
-        return Response({
-            'total_feed_consumed_kg': total_feed_consumed,
-            'total_weight_gained_kg': total_weight_gained,
-            'ica': round(ica, 2)
-        }, status=status.HTTP_200_OK)
-
-class CostPerKgGainedReportView(APIView):
-    def get(self, request, format=None):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-        animal_id = request.query_params.get('animal_id')
-        location_id = request.query_params.get('location_id')
-
-        financial_transactions = FinancialTransaction.objects.all()
-        weight_logs = WeightLog.objects.all()
-
-        if animal_id:
-            financial_transactions = financial_transactions.filter(related_entity_id=animal_id) # Assuming related_entity_id can be animal_id
-            weight_logs = weight_logs.filter(animal_id=animal_id)
-        
-        if location_id:
-            # This would require a more complex join or assumption about related_entity_id for locations
-            return Response({'error': 'Filtering by location_id for CostPerKgGained is not yet fully implemented.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if start_date_str and end_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                financial_transactions = financial_transactions.filter(transaction_date__range=[start_date, end_date])
-                weight_logs = weight_logs.filter(log_date__range=[start_date, end_date])
-            except ValueError:
-                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_feed_cost = financial_transactions.filter(type='Costo').aggregate(Sum('amount'))['amount__sum'] or 0
-        total_weight_gained = weight_logs.aggregate(Sum('weight_kg'))['weight_kg__sum'] or 0
-
-        cost_per_kg_gained = total_feed_cost / total_weight_gained if total_weight_gained > 0 else 0
-
-        return Response({
-            'total_feed_cost': total_feed_cost,
-            'total_weight_gained_kg': total_weight_gained,
-            'cost_per_kg_gained': round(cost_per_kg_gained, 2)
-        }, status=status.HTTP_200_OK)
-
-class ProfitAndLossReportView(APIView):
-    def get(self, request, format=None):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-        animal_id = request.query_params.get('animal_id')
-        location_id = request.query_params.get('location_id')
-
-        transactions = FinancialTransaction.objects.all()
-
-        if start_date_str and end_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                transactions = transactions.filter(transaction_date__range=[start_date, end_date])
-            except ValueError:
-                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if animal_id:
-            transactions = transactions.filter(related_entity_id=animal_id, type__in=['Costo', 'Ingreso']) # Assuming related_entity_id can be animal_id
-        
-        if location_id:
-            # Filter financial transactions related to animals in a specific location
-            # This assumes that FinancialTransaction.related_entity_id can refer to an Animal ID,
-            # and that Animal has a location_id field.
-            # This is a simplified approach and might need more robust handling depending on how
-            # financial transactions are truly linked to locations/batches.
-            animals_in_location = Animal.objects.filter(location_id=location_id)
-            transactions = transactions.filter(related_entity_id__in=animals_in_location.values_list('id', flat=True))
-
-        total_income = transactions.filter(type='Ingreso').aggregate(Sum('amount'))['amount__sum'] or 0
-        total_cost = transactions.filter(type='Costo').aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        profit_loss = total_income - total_cost
-
-        return Response({
-            'total_income': total_income,
-            'total_cost': total_cost,
-            'profit_loss': profit_loss
-        }, status=status.HTTP_200_OK)
-
-class BatchProfitabilityReportView(APIView):
-    def get(self, request, format=None):
+from itertools import islice
+from decimal import Decimal, InvalidOperation
+from core.pedigree import DEFAULT_GENERATIONS, MAX_GENERATIONS, Pedigree, as_coefficient
+from core.signals import notify_bulk_write
+from .base import REPORT_VIEWS, KPIReportView, ReportView
+from .cache import cache_stats
+from .kpis import SECTIONS as KPI_SECTIONS, KPIContext, SectionError, parse_filters
+from .gdp import GROUP_FIELDS as GDP_GROUP_FIELDS, SORT_FIELDS as GDP_SORT_FIELDS, group_gdp, herd_gdp
+from .models import Alert, GrowthCurveFit, LocationOccupancy, ReportJob
+from .occupancy import density_percentage as location_density
+from .serializers import AlertSerializer, ReportJobSerializer
+from .pairing import ranked_pairs
+from .growth import MARKET_WEIGHT_KG, market_predictions
+from .rations import location_projections, ration_costs
+from .stock import FORECAST_WINDOW_DAYS, stock_forecasts
+
+logger = logging.getLogger(__name__)
+
+class ICAReportView(KPIReportView):
+    section = 'ica'
+
+class CostPerKgGainedReportView(KPIReportView):
+    section = 'cost_per_kg_gained'
+
+class ProfitAndLossReportView(KPIReportView):
+    section = 'profit_and_loss'
+
+class BatchProfitabilityReportView(ReportView):
+    source_models = (FinancialTransaction, Animal)
+
+    def get_report(self, request):
         animal_id = request.query_params.get('animal_id')
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
@@ -159,8 +74,10 @@ class BatchProfitabilityReportView(APIView):
             'profit_loss': profit_loss
         }, status=status.HTTP_200_OK)
 
-class GDPReportView(APIView):
-    def get(self, request, format=None):
+class GDPReportView(ReportView):
+    source_models = (WeightLog, Animal)
+
+    def get_report(self, request):
         animal_id = request.query_params.get('animal_id')
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
@@ -203,206 +120,355 @@ class GDPReportView(APIView):
             'gdp': round(gdp, 2)
         }, status=status.HTTP_200_OK)
 
-class FertilityRateReportView(APIView):
-    def get(self, request, format=None):
-        # Total females put to breeding
-        total_females_breeding = Animal.objects.filter(sex='F', status='Pregnant').count() # Simplified
-        
-        # Total females that became pregnant
-        total_females_pregnant = ReproductionEvent.objects.filter(actual_birth_date__isnull=False).values('female').distinct().count()
+class HerdGDPReportView(ReportView):
+    source_models = (WeightLog, Animal, Line, Location)
+    default_limit = 100
+    max_limit = 10000
+    group_sort_fields = ('average_gdp', 'animal_count', 'total_weight_gain_kg')
+
+    def get_report(self, request):
+        # GDP for the whole herd in one pass; ?group_by=line,location,sex,age_band aggregates it
+        params = request.query_params
+        start_date = end_date = None
+        if params.get('start_date') and params.get('end_date'):
+            try:
+                start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+                end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+            except ValueError:
+                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        group_by = [group for group in params.get('group_by', '').split(',') if group]
+        unknown = [group for group in group_by if group not in GDP_GROUP_FIELDS]
+        if unknown:
+            return Response({'error': f"Invalid group_by. Choose from: {', '.join(GDP_GROUP_FIELDS)}."}, status=status.HTTP_400_BAD_REQUEST)
 
-        fertility_rate = (total_females_pregnant / total_females_breeding) * 100 if total_females_breeding > 0 else 0
+        ordering = params.get('ordering', '-average_gdp' if group_by else '-gdp')
+        sort_field = ordering.lstrip('-')
+        if sort_field not in (self.group_sort_fields if group_by else GDP_SORT_FIELDS):
+            return Response({'error': 'Invalid ordering field.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(int(params.get('limit', self.default_limit)), self.max_limit)
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({'error': 'limit must be positive and offset non-negative.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = herd_gdp(
+            start_date=start_date,
+            end_date=end_date,
+            line_id=params.get('line_id'),
+            location_id=params.get('location_id'),
+            sex=params.get('sex'),
+        )
+        if group_by:
+            rows = group_gdp(rows, group_by)
+        rows.sort(key=lambda row: row[sort_field], reverse=ordering.startswith('-'))
 
         return Response({
-            'total_females_breeding': total_females_breeding,
-            'total_females_pregnant': total_females_pregnant,
-            'fertility_rate': round(fertility_rate, 2)
+            'count': len(rows),
+            'results': rows[offset:offset + limit],
         }, status=status.HTTP_200_OK)
 
-class ParturitionRateReportView(APIView):
-    def get(self, request, format=None):
-        # Total females that gave birth
-        total_females_gave_birth = ReproductionEvent.objects.filter(actual_birth_date__isnull=False).values('female').distinct().count()
-        
-        # Total females that were pregnant (simplified, could be more complex)
-        total_females_pregnant = Animal.objects.filter(sex='F', status='Pregnant').count()
+class FertilityRateReportView(KPIReportView):
+    section = 'fertility_rate'
 
-        parturition_rate = (total_females_gave_birth / total_females_pregnant) * 100 if total_females_pregnant > 0 else 0
+class ParturitionRateReportView(KPIReportView):
+    section = 'parturition_rate'
 
-        return Response({
-            'total_females_gave_birth': total_females_gave_birth,
-            'total_females_pregnant': total_females_pregnant,
-            'parturition_rate': round(parturition_rate, 2)
-        }, status=status.HTTP_200_OK)
+class ProlificacyReportView(KPIReportView):
+    section = 'prolificacy'
 
-class ProlificacyReportView(APIView):
-    def get(self, request, format=None):
-        # Total live births
-        total_live_births = ReproductionEvent.objects.aggregate(Sum('live_births'))['live_births__sum'] or 0
-        
-        # Total reproduction events with actual birth date
-        total_reproduction_events_with_birth = ReproductionEvent.objects.filter(actual_birth_date__isnull=False).count()
+class WPIReportView(KPIReportView):
+    section = 'wpi'
 
-        prolificacy = total_live_births / total_reproduction_events_with_birth if total_reproduction_events_with_birth > 0 else 0
+class WithdrawalAlertsView(KPIReportView):
+    section = 'withdrawal_alerts'
 
-        return Response({
-            'total_live_births': total_live_births,
-            'total_reproduction_events_with_birth': total_reproduction_events_with_birth,
-            'prolificacy': round(prolificacy, 2)
-        }, status=status.HTTP_200_OK)
+class IneffectiveTreatmentAlertsView(KPIReportView):
+    section = 'ineffective_treatment_alerts'
 
-class WPIReportView(APIView):
-    def get(self, request, format=None):
-        # Weaning Productive Index (WPI) is complex and requires more data (e.g., number of weaned animals).
-        # For now, a placeholder.
-        return Response({
-            'message': 'WPI calculation is complex and requires more data.',
-            'wpi': 0.0
-        }, status=status.HTTP_200_OK)
+class LowStockAlertsView(KPIReportView):
+    section = 'low_stock_alerts'
 
-class WithdrawalAlertsView(APIView):
-    def get(self, request, format=None):
-        today = date.today()
-        alerts = []
-        
-        # Find treatments where withdrawal period has ended but animal is still marked as 'In Quarantine'
-        # or any other status that implies it's not ready for sale/consumption
-        overdue_treatments = Treatment.objects.filter(
-            withdrawal_end_date__lte=today,
-            health_log__animal__status='In Quarantine' # Assuming 'In Quarantine' means not ready
-        ).select_related('health_log__animal', 'medication')
-
-        for treatment in overdue_treatments:
-            alerts.append({
-                'animal_id': treatment.health_log.animal.id,
-                'animal_tag': treatment.health_log.animal.unique_tag,
-                'medication': treatment.medication.name if treatment.medication else 'N/A',
-                'withdrawal_end_date': treatment.withdrawal_end_date,
-                'message': f"Animal {treatment.health_log.animal.unique_tag} has completed its withdrawal period for {treatment.medication.name if treatment.medication else 'N/A'} and is still in quarantine."
-            })
-        
-        return Response(alerts, status=status.HTTP_200_OK)
+class ReproductiveRankingReportView(KPIReportView):
+    section = 'reproductive_ranking'
 
-class IneffectiveTreatmentAlertsView(APIView):
-    def get(self, request, format=None):
-        alerts = []
-        # This is a simplified example. A real implementation would involve more sophisticated logic.
-        # For instance, looking for multiple treatments for the same diagnosis within a short period.
-        
-        # Example: Find animals with more than 2 treatments for the same diagnosis in the last 30 days
-        thirty_days_ago = date.today() - timedelta(days=30)
-        
-        # Group health logs by animal and diagnosis
-        health_logs_grouped = HealthLog.objects.filter(log_date__gte=thirty_days_ago).values('animal', 'diagnosis').annotate(treatment_count=Count('treatment'))
-
-        for entry in health_logs_grouped:
-            if entry['treatment_count'] > 2:
-                animal = Animal.objects.get(id=entry['animal'])
-                alerts.append({
-                    'animal_id': animal.id,
-                    'animal_tag': animal.unique_tag,
-                    'diagnosis': entry['diagnosis'],
-                    'treatment_count': entry['treatment_count'],
-                    'message': f"Animal {animal.unique_tag} has received {entry['treatment_count']} treatments for {entry['diagnosis']} in the last 30 days, suggesting potential ineffectiveness."
-                })
-
-        return Response(alerts, status=status.HTTP_200_OK)
-
-class LowStockAlertsView(APIView):
-    def get(self, request, format=None):
-        alerts = []
-        # Define a low stock threshold (e.g., 10 kg or a configurable value)
-        low_stock_threshold = 10.0
-
-        low_stock_items = FeedInventory.objects.filter(quantity_kg__lt=low_stock_threshold)
-
-        for item in low_stock_items:
-            alerts.append({
-                'product_name': item.product_name,
-                'current_stock_kg': item.quantity_kg,
-                'threshold_kg': low_stock_threshold,
-                'message': f"Low stock alert: {item.product_name} is below {low_stock_threshold} kg. Current stock: {item.quantity_kg} kg."
-            })
-        return Response(alerts, status=status.HTTP_200_OK)
+class DensityReportView(KPIReportView):
+    section = 'density'
 
-class ReproductiveRankingReportView(APIView):
-    def get(self, request, format=None):
-        # This is a simplified example. A real ranking would involve more complex metrics.
-        # For demonstration, let's rank by total live births.
-        ranked_animals = Animal.objects.filter(sex='F').annotate(total_live_births=Sum('reproduction_events_female__live_births')).order_by('-total_live_births')
+class DashboardView(ReportView):
+    source_models = tuple({model for _, models in KPI_SECTIONS.values() for model in models})
+
+    def get_report(self, request):
+        # Every dashboard KPI for one filter set (start_date, end_date, animal_id, location_id).
+        # ?include=ica,profit_and_loss selects sections; aggregates shared by several
+        # sections are computed once, and a failing section does not fail the others.
+        include = request.query_params.get('include')
+        names = [name.strip() for name in include.split(',') if name.strip()] if include else list(KPI_SECTIONS)
+        unknown = [name for name in names if name not in KPI_SECTIONS]
+        if unknown:
+            return Response({'error': f"Unknown sections: {', '.join(unknown)}. Choose from: {', '.join(KPI_SECTIONS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            context = KPIContext(parse_filters(request.query_params))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        sections, errors = {}, {}
+        for done, name in enumerate(names):
+            self.report_progress(done, len(names))
+            compute, _ = KPI_SECTIONS[name]
+            try:
+                sections[name] = compute(context)
+            except SectionError as e:
+                errors[name] = str(e)
+            except Exception:
+                logger.exception('Dashboard section %s failed', name)
+                errors[name] = 'This section could not be computed.'
+        return Response({'sections': sections, 'errors': errors}, status=status.HTTP_200_OK)
+
+    def should_cache(self, response):
+        # Keep retrying sections that failed instead of serving the failure
+        return super().should_cache(response) and not response.data['errors']
+
+class DensityHistoryView(ReportView):
+    source_models = (LocationOccupancy, Location)
+
+    def get_report(self, request):
+        # Daily occupancy trend per location from the snapshot_occupancy history
+        start_date_str = request.query_params.get('start_date')
+        end_date_str = request.query_params.get('end_date')
+        location_id = request.query_params.get('location_id')
+        location_type = request.query_params.get('location_type')
+
+        history = LocationOccupancy.objects.select_related('location')
+        if location_id:
+            history = history.filter(location_id=location_id)
+        if location_type:
+            history = history.filter(location__type=location_type)
+
+        if start_date_str and end_date_str:
+            try:
+                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+                history = history.filter(date__range=[start_date, end_date])
+            except ValueError:
+                return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
 
         data = []
-        for animal in ranked_animals:
+        for entry in history:
             data.append({
-                'animal_id': animal.id,
-                'animal_tag': animal.unique_tag,
-                'total_live_births': animal.total_live_births or 0
+                'location_id': entry.location_id,
+                'location_name': entry.location.name,
+                'location_type': entry.location.type,
+                'date': entry.date,
+                'capacity': entry.capacity,
+                'animal_count': entry.animal_count,
+                'density_percentage': location_density(entry.animal_count, entry.capacity),
             })
         return Response(data, status=status.HTTP_200_OK)
 
-class DensityReportView(APIView):
-    def get(self, request, format=None):
-        # This is a simplified example. Real density management would involve
-        # calculating current density vs. capacity for each location.
-        
-        locations_data = []
-        for location in Location.objects.all():
-            current_animals = Animal.objects.filter(location=location).count()
-            density_percentage = (current_animals / location.capacity) * 100 if location.capacity > 0 else 0
-            
-            alert = None
-            if density_percentage > 100:
-                alert = f"Location {location.name} is over capacity! ({density_percentage:.2f}%)"
-            elif density_percentage > 80:
-                alert = f"Location {location.name} is nearing capacity. ({density_percentage:.2f}%)"
-
-            locations_data.append({
-                'location_id': location.id,
-                'location_name': location.name,
-                'location_type': location.type,
-                'capacity': location.capacity,
-                'current_animals': current_animals,
-                'density_percentage': round(density_percentage, 2),
-                'alert': alert
-            })
-        return Response(locations_data, status=status.HTTP_200_OK)
+class RationCostReportView(ReportView):
+    source_models = (FeedRation, RationComponent, FeedInventory, Location, Animal, FeedingLog)
+    max_intake_kg = Decimal('10')
 
-class OptimalBreedingPairingView(APIView):
-    def get(self, request, format=None):
-        # Simplified logic for optimal breeding pairing
-        # Criteria: 
+    def get_report(self, request):
+        # Cost per kg of every ration, and the daily cost of feeding each one to each location:
+        # ?intake_kg=0.4 (per animal and day; measured from recent feedings by default)&location_id=
+        intake_kg = None
+        if request.query_params.get('intake_kg'):
+            try:
+                intake_kg = Decimal(request.query_params['intake_kg'])
+            except InvalidOperation:
+                intake_kg = None
+            if intake_kg is None or not 0 < intake_kg <= self.max_intake_kg:
+                return Response({'error': f'intake_kg must be a number above 0 and at most {self.max_intake_kg}.'}, status=status.HTTP_400_BAD_REQUEST)
+        location_id = request.query_params.get('location_id')
+        if location_id and not location_id.isdigit():
+            return Response({'error': 'location_id must be an integer ID.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rations = ration_costs()
+        return Response({
+            'rations': rations,
+            'locations': location_projections(rations, intake_kg=intake_kg, location_id=location_id),
+        }, status=status.HTTP_200_OK)
+
+class StockForecastView(ReportView):
+    source_models = (FeedInventory, FeedStockMovement, FeedingLog, Location)
+    max_window_days = 365
+
+    def get_report(self, request):
+        # Days to stock-out and reorder date of every feed product, from its consumption over the
+        # last ?window_days= days (FEED_FORECAST_WINDOW_DAYS by default), by location
+        window_days = request.query_params.get('window_days', str(FORECAST_WINDOW_DAYS))
+        if not window_days.isdigit() or not 1 <= int(window_days) <= self.max_window_days:
+            return Response({'error': f'window_days must be a whole number of days between 1 and {self.max_window_days}.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stock_forecasts(window_days=int(window_days)), status=status.HTTP_200_OK)
+
+class MarketForecastView(ReportView):
+    source_models = (Animal, GrowthCurveFit, Line)
+    default_window_days = 30
+
+    def get_report(self, request):
+        # Animals expected to reach ?target_kg= (MARKET_WEIGHT_KG by default) between ?start_date= and
+        # ?end_date= (the next 30 days by default), from growth curves fitted to their weighings; &line=
+        try:
+            target_kg = Decimal(request.query_params.get('target_kg', str(MARKET_WEIGHT_KG)))
+        except InvalidOperation:
+            return Response({'error': 'target_kg must be a decimal number.'}, status=status.HTTP_400_BAD_REQUEST)
+        if target_kg <= 0:
+            return Response({'error': 'target_kg must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            filters = parse_filters(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        start_date = filters['start_date'] or date.today()
+        end_date = filters['end_date'] or start_date + timedelta(days=self.default_window_days)
+
+        predictions = market_predictions(target_kg, start_date, end_date, line_id=request.query_params.get('line'))
+        return Response(predictions, status=status.HTTP_200_OK)
+
+class OptimalBreedingPairingView(ReportView):
+    source_models = (Animal, AnimalAncestor)
+    default_limit = 100
+    max_limit = 1000
+
+    def get_report(self, request):
+        # Criteria:
         # 1. Female is breeding ready
         # 2. Male is breeding ready
         # 3. No immediate parent-offspring or sibling relationship
+        # 4. Optionally, coefficient of kinship at most max_inbreeding
+        # Pairs are ranked by combined latest weight and paginated with limit/offset.
+        line_id = request.query_params.get('line')
+        location_id = request.query_params.get('location')
 
-        optimal_pairings = []
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+            offset = int(request.query_params.get('offset', 0))
+            generations = int(request.query_params.get('generations', DEFAULT_GENERATIONS))
+        except ValueError:
+            return Response({'error': 'limit, offset and generations must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({'error': 'limit must be positive and offset non-negative.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= generations <= MAX_GENERATIONS:
+            return Response({'error': f'generations must be between 1 and {MAX_GENERATIONS}.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, self.max_limit)
+
+        max_kinship = None
+        if request.query_params.get('max_inbreeding'):
+            try:
+                max_kinship = Decimal(request.query_params['max_inbreeding'])
+            except InvalidOperation:
+                return Response({'error': 'max_inbreeding must be a decimal number.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        females = Animal.objects.filter(sex='F')
-        males = Animal.objects.filter(sex='M')
+        pairs = ranked_pairs(line_id=line_id, location_id=location_id, generations=generations, max_kinship=max_kinship)
+        optimal_pairings = list(islice(pairs, offset, offset + limit))
 
-        for female in females:
-            if not female.is_breeding_ready():
-                continue
+        return Response(optimal_pairings, status=status.HTTP_200_OK)
 
-            for male in males:
-                if not male.is_breeding_ready():
-                    continue
 
-                # Check for immediate family relationships
-                # Parent-offspring
-                if female.sire == male or female.dam == male or male.sire == female or male.dam == female:
-                    continue
+class PairKinshipView(APIView):
+    max_pairs = 5000
 
-                # Siblings (simplified: same sire and dam)
-                if female.sire and female.dam and female.sire == male.sire and female.dam == male.dam:
-                    continue
+    def post(self, request, format=None):
+        # Scores a batch of candidate pairs: {"pairs": [{"female_id": 1, "male_id": 2}, ...], "generations": 5}
+        pairs = request.data.get('pairs')
+        if not isinstance(pairs, list) or not pairs:
+            return Response({'error': 'pairs must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(pairs) > self.max_pairs:
+            return Response({'error': f'At most {self.max_pairs} pairs can be scored per request.'}, status=status.HTTP_400_BAD_REQUEST)
 
-                optimal_pairings.append({
-                    'female_id': female.id,
-                    'female_tag': female.unique_tag,
-                    'male_id': male.id,
-                    'male_tag': male.unique_tag,
-                    'reason': 'Both breeding ready and no immediate family ties.'
-                })
-        
-        return Response(optimal_pairings, status=status.HTTP_200_OK)
\ No newline at end of file
+        try:
+            generations = int(request.data.get('generations', DEFAULT_GENERATIONS))
+            candidates = [(int(pair['female_id']), int(pair['male_id'])) for pair in pairs]
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Each pair needs integer female_id and male_id.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= generations <= MAX_GENERATIONS:
+            return Response({'error': f'generations must be between 1 and {MAX_GENERATIONS}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        animal_ids = {animal_id for pair in candidates for animal_id in pair}
+        animals = {
+            row['id']: row
+            for row in Animal.objects.filter(id__in=animal_ids).values('id', 'unique_tag', 'inbreeding_coefficient')
+        }
+        missing = sorted(animal_ids - set(animals))
+        if missing:
+            return Response({'error': 'Animal not found.', 'animal_ids': missing}, status=status.HTTP_404_NOT_FOUND)
+
+        pedigree = Pedigree.load(animal_ids, generations)
+        results = []
+        for female_id, male_id in candidates:
+            results.append({
+                'female_id': female_id,
+                'female_tag': animals[female_id]['unique_tag'],
+                'male_id': male_id,
+                'male_tag': animals[male_id]['unique_tag'],
+                'female_inbreeding_coefficient': animals[female_id]['inbreeding_coefficient'],
+                'male_inbreeding_coefficient': animals[male_id]['inbreeding_coefficient'],
+                # The kinship of the parents is the inbreeding coefficient of their offspring
+                'coefficient_of_kinship': as_coefficient(pedigree.coancestry(female_id, male_id, generations)),
+            })
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class AlertListView(ReportView):
+    source_models = (Alert,)
+
+    def get_report(self, request):
+        # Open alerts, newest first: ?type=withdrawal,low_stock&severity=critical&acknowledged=false
+        alerts = Alert.objects.open()
+        for param, choices in (('type', Alert.TYPE_CHOICES), ('severity', Alert.SEVERITY_CHOICES)):
+            if request.query_params.get(param):
+                values = request.query_params[param].split(',')
+                allowed = [value for value, _ in choices]
+                if any(value not in allowed for value in values):
+                    return Response({'error': f"{param} must be one of: {', '.join(allowed)}."}, status=status.HTTP_400_BAD_REQUEST)
+                alerts = alerts.filter(**{f'{param}__in': values})
+
+        acknowledged = request.query_params.get('acknowledged')
+        if acknowledged in ('true', '1'):
+            alerts = alerts.filter(acknowledged_at__isnull=False)
+        elif acknowledged in ('false', '0'):
+            alerts = alerts.filter(acknowledged_at__isnull=True)
+        elif acknowledged:
+            return Response({'error': 'acknowledged must be true or false.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(AlertSerializer(alerts.order_by('-id'), many=True).data, status=status.HTTP_200_OK)
+
+class AlertAcknowledgeView(APIView):
+    def post(self, request, pk, format=None):
+        updated = Alert.objects.open().filter(pk=pk, acknowledged_at__isnull=True).update(acknowledged_at=timezone.now())
+        if not updated and not Alert.objects.open().filter(pk=pk).exists():
+            return Response({'error': 'Open alert not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if updated:
+            notify_bulk_write(Alert)
+        return Response(AlertSerializer(Alert.objects.get(pk=pk)).data, status=status.HTTP_200_OK)
+
+class ReportJobView(APIView):
+    def get(self, request, pk, format=None):
+        # Status and progress of a report submitted with ?async=1
+        try:
+            job = ReportJob.objects.get(pk=pk)
+        except ReportJob.DoesNotExist:
+            return Response({'error': 'Report job not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ReportJobSerializer(job).data, status=status.HTTP_200_OK)
+
+class ReportJobResultView(APIView):
+    def get(self, request, pk, format=None):
+        # The report as its synchronous request would have returned it, once the job is done
+        try:
+            job = ReportJob.objects.get(pk=pk)
+        except ReportJob.DoesNotExist:
+            return Response({'error': 'Report job not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if job.status == 'done':
+            return Response(job.result, status=job.result_status)
+        if job.status == 'failed':
+            return Response({'error': f'The report failed: {job.error}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class ReportCacheStatsView(APIView):
+    def get(self, request, format=None):
+        # Hit/miss counters of the report cache, per report view
+        return Response(cache_stats(REPORT_VIEWS), status=status.HTTP_200_OK)
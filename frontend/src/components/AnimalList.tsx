@@ -12,6 +12,8 @@ interface Animal {
   sire: number | null;
   dam: number | null;
   location: number | null;
+  current_weight_kg: string | null;
+  last_weighed_date: string | null;
 }
 
 interface Line {
@@ -82,7 +84,7 @@ function AnimalList() {
           {animals.map(animal => (
             <li key={animal.id} className="list-group-item d-flex justify-content-between align-items-center">
               <div>
-                {animal.unique_tag} - {animal.sex} - {animal.status} - Line: {getLineName(animal.line)} - Location: {getLocationName(animal.location)}
+                {animal.unique_tag} - {animal.sex} - {animal.status} - Line: {getLineName(animal.line)} - Location: {getLocationName(animal.location)} - Weight: {animal.current_weight_kg ? `${animal.current_weight_kg} kg (${animal.last_weighed_date})` : 'N/A'}
               </div>
               <div>
                 <Link to={`/animals/edit/${animal.id}`} className="btn btn-sm btn-info me-2">Edit</Link>
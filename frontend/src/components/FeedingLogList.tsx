@@ -18,16 +18,18 @@ interface Location {
 function FeedingLogList() {
   const [feedingLogs, setFeedingLogs] = useState<FeedingLog[]>([]);
   const [locations, setLocations] = useState<Location[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
         const [feedingLogsRes, locationsRes] = await Promise.all([
-          axios.get('http://localhost:8000/api/feedinglogs/'),
+          axios.get('http://localhost:8000/api/feedinglogs/?page_size=100'),
           axios.get('http://localhost:8000/api/locations/'),
         ]);
-        setFeedingLogs(feedingLogsRes.data);
+        setFeedingLogs(feedingLogsRes.data.results);
+        setNextPage(feedingLogsRes.data.next);
         setLocations(locationsRes.data);
       } catch (err) {
         console.error('Error fetching data:', err);
@@ -42,6 +44,19 @@ function FeedingLogList() {
     return location ? location.name : 'N/A';
   };
 
+  const loadMore = () => {
+    if (!nextPage) return;
+    axios.get(nextPage)
+      .then(res => {
+        setFeedingLogs([...feedingLogs, ...res.data.results]);
+        setNextPage(res.data.next);
+      })
+      .catch(err => {
+        console.error('Error fetching more feeding logs:', err);
+        setError('Failed to load more feeding logs.');
+      });
+  };
+
   const handleDelete = (id: number) => {
     axios.delete(`http://localhost:8000/api/feedinglogs/${id}/`)
       .then(() => {
@@ -75,6 +90,9 @@ function FeedingLogList() {
           ))}
         </ul>
       )}
+      {nextPage && (
+        <button onClick={loadMore} className="btn btn-secondary mt-3">Load more</button>
+      )}
     </div>
   );
 }
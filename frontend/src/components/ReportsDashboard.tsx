@@ -98,7 +98,10 @@ interface IneffectiveTreatmentAlert {
 interface LowStockAlert {
   product_name: string;
   current_stock_kg: number;
-  threshold_kg: number;
+  daily_consumption_kg: number;
+  days_to_stockout: number;
+  reorder_date: string;
+  lead_time_days: number;
   message: string;
 }
 
@@ -167,18 +170,30 @@ function ReportsDashboard() {
       };
 
       try {
-        const icaRes = await axios.get('http://localhost:8000/api/reports/ica-report/', { params: dateParams });
-        setIcaReport(icaRes.data);
-
-        const costRes = await axios.get('http://localhost:8000/api/reports/cost-per-kg-gained-report/', { params: dateParams });
-        setCostReport(costRes.data);
+        // Every KPI for the selected period in one request; sections that fail are reported individually
+        const dashboardRes = await axios.get('http://localhost:8000/api/reports/dashboard/', { params: dateParams });
+        const { sections, errors } = dashboardRes.data;
+        setIcaReport(sections.ica ?? null);
+        setCostReport(sections.cost_per_kg_gained ?? null);
+        setProfitAndLossReport(sections.profit_and_loss ?? null);
+        setFertilityRateReport(sections.fertility_rate ?? null);
+        setParturitionRateReport(sections.parturition_rate ?? null);
+        setProlificacyReport(sections.prolificacy ?? null);
+        setWpiReport(sections.wpi ?? null);
+        setWithdrawalAlerts(sections.withdrawal_alerts ?? []);
+        setIneffectiveTreatmentAlerts(sections.ineffective_treatment_alerts ?? []);
+        setLowStockAlerts(sections.low_stock_alerts ?? []);
+        setReproductiveRanking(sections.reproductive_ranking ?? []);
+        setDensityReport(sections.density ?? []);
+        if (Object.keys(errors).length > 0) {
+          setError(`Some reports could not be loaded: ${Object.entries(errors).map(([name, message]) => `${name} (${message})`).join(', ')}`);
+        }
 
-        const profitLossParams: any = { ...dateParams };
         if (plAnimalId) {
-          profitLossParams.animal_id = plAnimalId;
+          // The dashboard filters every section alike, so the per-animal P&L is fetched on its own
+          const profitLossRes = await axios.get('http://localhost:8000/api/reports/profit-and-loss-report/', { params: { ...dateParams, animal_id: plAnimalId } });
+          setProfitAndLossReport(profitLossRes.data);
         }
-        const profitLossRes = await axios.get('http://localhost:8000/api/reports/profit-and-loss-report/', { params: profitLossParams });
-        setProfitAndLossReport(profitLossRes.data);
 
         const batchProfitParams: any = { ...dateParams };
         if (batchAnimalId) {
@@ -187,33 +202,6 @@ function ReportsDashboard() {
         const batchProfitRes = await axios.get('http://localhost:8000/api/reports/batch-profitability-report/', { params: batchProfitParams });
         setBatchProfitabilityReport(batchProfitRes.data);
 
-        const fertilityRes = await axios.get('http://localhost:8000/api/reports/fertility-rate-report/');
-        setFertilityRateReport(fertilityRes.data);
-
-        const parturitionRes = await axios.get('http://localhost:8000/api/reports/parturition-rate-report/');
-        setParturitionRateReport(parturitionRes.data);
-
-        const prolificacyRes = await axios.get('http://localhost:8000/api/reports/prolificacy-report/');
-        setProlificacyReport(prolificacyRes.data);
-
-        const wpiRes = await axios.get('http://localhost:8000/api/reports/wpi-report/');
-        setWpiReport(wpiRes.data);
-
-        const withdrawalRes = await axios.get('http://localhost:8000/api/reports/withdrawal-alerts/');
-        setWithdrawalAlerts(withdrawalRes.data);
-
-        const ineffectiveRes = await axios.get('http://localhost:8000/api/reports/ineffective-treatment-alerts/');
-        setIneffectiveTreatmentAlerts(ineffectiveRes.data);
-
-        const lowStockRes = await axios.get('http://localhost:8000/api/reports/low-stock-alerts/');
-        setLowStockAlerts(lowStockRes.data);
-
-        const reproductiveRankingRes = await axios.get('http://localhost:8000/api/reports/reproductive-ranking-report/');
-        setReproductiveRanking(reproductiveRankingRes.data);
-
-        const densityRes = await axios.get('http://localhost:8000/api/reports/density-report/');
-        setDensityReport(densityRes.data);
-
         const optimalPairingRes = await axios.get('http://localhost:8000/api/reports/optimal-breeding-pairing/');
         setOptimalBreedingPairings(optimalPairingRes.data);
 
@@ -553,7 +541,7 @@ function ReportsDashboard() {
                 <ul className="list-group">
                   {lowStockAlerts.map((alert, index) => (
                     <li key={index} className="list-group-item alert-danger">
-                      {alert.message} (Product: {alert.product_name}, Current Stock: {alert.current_stock_kg} kg)
+                      {alert.message} (Product: {alert.product_name}, Current Stock: {alert.current_stock_kg} kg, Reorder By: {alert.reorder_date})
                     </li>
                   ))}
                 </ul>
@@ -17,16 +17,18 @@ interface Animal {
 function WeightLogList() {
   const [weightLogs, setWeightLogs] = useState<WeightLog[]>([]);
   const [animals, setAnimals] = useState<Animal[]>([]);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
         const [weightLogsRes, animalsRes] = await Promise.all([
-          axios.get('http://localhost:8000/api/weightlogs/'),
+          axios.get('http://localhost:8000/api/weightlogs/?page_size=100'),
           axios.get('http://localhost:8000/api/animals/'),
         ]);
-        setWeightLogs(weightLogsRes.data);
+        setWeightLogs(weightLogsRes.data.results);
+        setNextPage(weightLogsRes.data.next);
         setAnimals(animalsRes.data);
       } catch (err) {
         console.error('Error fetching data:', err);
@@ -41,6 +43,19 @@ function WeightLogList() {
     return animal ? animal.unique_tag : 'N/A';
   };
 
+  const loadMore = () => {
+    if (!nextPage) return;
+    axios.get(nextPage)
+      .then(res => {
+        setWeightLogs([...weightLogs, ...res.data.results]);
+        setNextPage(res.data.next);
+      })
+      .catch(err => {
+        console.error('Error fetching more weight logs:', err);
+        setError('Failed to load more weight logs.');
+      });
+  };
+
   const handleDelete = (id: number) => {
     axios.delete(`http://localhost:8000/api/weightlogs/${id}/`)
       .then(() => {
@@ -74,6 +89,9 @@ function WeightLogList() {
           ))}
         </ul>
       )}
+      {nextPage && (
+        <button onClick={loadMore} className="btn btn-secondary mt-3">Load more</button>
+      )}
     </div>
   );
 }